@@ -156,6 +156,9 @@ class _AddRecipePageState extends State<AddRecipePage> {
       "RecipeIngredientParts": ingredientParts,
       "AggregatedRating": 0,
       "ReviewCount": 0,
+      "RatingSum": 0,
+      "RatingSumSquares": 0,
+      "BayesianRating": 4.0,
       "Calories": totalCalories,
       "ProteinContent": totalProtein,
       "CarbohydrateContent": totalCarbs,
@@ -168,6 +171,7 @@ class _AddRecipePageState extends State<AddRecipePage> {
       "RecipeServings": servings,
       "RecipeYield": recipeYield,
       "RecipeInstructions": instructions,
+      "UpdatedAt": FieldValue.serverTimestamp(),
     };
 
     await FirebaseFirestore.instance
@@ -77,6 +77,7 @@ class _EditRecipePageState extends State<EditRecipePage> {
       "RecipeCategory": categoryController.text.trim(),
       "Keywords":
           keywordsController.text.split(',').map((e) => e.trim()).toList(),
+      "UpdatedAt": FieldValue.serverTimestamp(),
     };
 
     await FirebaseFirestore.instance
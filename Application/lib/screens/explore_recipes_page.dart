@@ -13,6 +13,8 @@ class ExploreRecipesPage extends StatefulWidget {
 class _ExploreRecipesPageState extends State<ExploreRecipesPage> {
   final TextEditingController _searchController = TextEditingController();
   List<DocumentSnapshot> _recipes = [];
+  // Missing-ingredient counts from the server-side inventory ranking
+  Map<String, int> _missingCounts = {};
   String userId = FirebaseAuth.instance.currentUser!.uid;
   bool _isSearching = false;
   bool _isFallback = false;
@@ -23,20 +25,41 @@ class _ExploreRecipesPageState extends State<ExploreRecipesPage> {
     _fetchRecommendedRecipes();
   }
 
-  Future<List<String>> _getUserInventoryIngredients() async {
-    final snapshot = await FirebaseFirestore.instance
+  // Ranked on the server by inventory_ranking.py: fewest missing first
+  Future<List<Map<String, dynamic>>> _fetchInventoryRanking() async {
+    final doc = await FirebaseFirestore.instance
         .collection('users')
         .doc(userId)
-        .collection('inventory')
+        .collection('recommendations')
+        .doc('inventory')
         .get();
 
-    return snapshot.docs
-        .map((doc) => (doc.data()['name'] ?? '').toString().toLowerCase())
-        .toList();
+    return List<Map<String, dynamic>>.from(doc.data()?['recipes'] ?? []);
+  }
+
+  Future<List<DocumentSnapshot>> _getRecipes(List<String> recipeIds) async {
+    final Map<String, DocumentSnapshot> found = {};
+    // whereIn takes at most 10 values
+    for (var i = 0; i < recipeIds.length; i += 10) {
+      final chunk = recipeIds.sublist(
+          i, i + 10 > recipeIds.length ? recipeIds.length : i + 10);
+      final snapshot = await FirebaseFirestore.instance
+          .collection('recipes')
+          .where(FieldPath.documentId, whereIn: chunk)
+          .get();
+      for (var doc in snapshot.docs) {
+        found[doc.id] = doc;
+      }
+    }
+    return [
+      for (var id in recipeIds)
+        if (found[id] != null) found[id]!
+    ];
   }
 
   Future<void> _fetchRecommendedRecipes() async {
     try {
+      final ranking = await _fetchInventoryRanking();
       final snapshot = await FirebaseFirestore.instance
           .collection('users')
           .doc(userId)
@@ -45,19 +68,17 @@ class _ExploreRecipesPageState extends State<ExploreRecipesPage> {
           .collection('items')
           .get();
 
-      if (snapshot.docs.isEmpty) {
-        _fetchTopRatedRecipes();
-        return;
-      }
+      // Recipes cookable from the inventory first, then the recommended ones
+      final recipeIds = <String>{
+        for (var entry in ranking) entry['id'] as String,
+        for (var doc in snapshot.docs) doc.id,
+      }.toList();
+      final recipes = await _getRecipes(recipeIds);
 
-      final List<DocumentSnapshot> recipes = [];
-      for (var doc in snapshot.docs) {
-        final recipeDoc = await FirebaseFirestore.instance
-            .collection('recipes')
-            .doc(doc.id)
-            .get();
-        if (recipeDoc.exists) recipes.add(recipeDoc);
-      }
+      _missingCounts = {
+        for (var entry in ranking)
+          entry['id'] as String: (entry['missing'] as num).toInt(),
+      };
 
       if (recipes.isEmpty) {
         _fetchTopRatedRecipes();
@@ -113,15 +134,6 @@ class _ExploreRecipesPageState extends State<ExploreRecipesPage> {
     });
   }
 
-  Future<int> _countMissingIngredients(List<dynamic> ingredients) async {
-    final inventory = await _getUserInventoryIngredients();
-    final missing = ingredients
-        .whereType<String>()
-        .where((ing) => !inventory.contains(ing.toLowerCase()))
-        .length;
-    return missing;
-  }
-
   Future<void> _logInteraction(String recipeId) async {
     final log = {
       'date': DateTime.now(),
@@ -185,111 +197,107 @@ class _ExploreRecipesPageState extends State<ExploreRecipesPage> {
                 final keywords =
                     List<String>.from(data['Keywords'] ?? <String>[]);
 
-                return FutureBuilder<int>(
-                  future: _countMissingIngredients(
-                      data['RecipeIngredientParts'] ?? []),
-                  builder: (context, snapshot) {
-                    final missingCount = snapshot.data ?? 0;
+                final missingCount = _missingCounts[recipeId];
 
-                    return Card(
-                      margin: const EdgeInsets.only(bottom: 16),
-                      shape: RoundedRectangleBorder(
-                        borderRadius: BorderRadius.circular(16),
-                      ),
-                      elevation: 4,
-                      child: InkWell(
-                        onTap: () async {
-                          await _logInteraction(recipeId);
-                          Navigator.push(
-                            context,
-                            MaterialPageRoute(
-                              builder: (_) =>
-                                  RecipeDetailPage(recipeId: recipeId),
+                return Card(
+                  margin: const EdgeInsets.only(bottom: 16),
+                  shape: RoundedRectangleBorder(
+                    borderRadius: BorderRadius.circular(16),
+                  ),
+                  elevation: 4,
+                  child: InkWell(
+                    onTap: () async {
+                      await _logInteraction(recipeId);
+                      Navigator.push(
+                        context,
+                        MaterialPageRoute(
+                          builder: (_) =>
+                              RecipeDetailPage(recipeId: recipeId),
+                        ),
+                      );
+                    },
+                    borderRadius: BorderRadius.circular(16),
+                    child: Column(
+                      crossAxisAlignment: CrossAxisAlignment.start,
+                      children: [
+                        if (imageUrl != null)
+                          ClipRRect(
+                            borderRadius: const BorderRadius.vertical(
+                                top: Radius.circular(16)),
+                            child: Image.network(
+                              imageUrl,
+                              fit: BoxFit.cover,
+                              width: double.infinity,
+                              height: 180,
                             ),
-                          );
-                        },
-                        borderRadius: BorderRadius.circular(16),
-                        child: Column(
-                          crossAxisAlignment: CrossAxisAlignment.start,
-                          children: [
-                            if (imageUrl != null)
-                              ClipRRect(
-                                borderRadius: const BorderRadius.vertical(
-                                    top: Radius.circular(16)),
-                                child: Image.network(
-                                  imageUrl,
-                                  fit: BoxFit.cover,
-                                  width: double.infinity,
-                                  height: 180,
+                          ),
+                        Padding(
+                          padding: const EdgeInsets.all(16),
+                          child: Column(
+                            crossAxisAlignment: CrossAxisAlignment.start,
+                            children: [
+                              Text(
+                                data['Name'] ?? 'Unnamed Recipe',
+                                style: const TextStyle(
+                                  fontSize: 20,
+                                  fontWeight: FontWeight.bold,
                                 ),
                               ),
-                            Padding(
-                              padding: const EdgeInsets.all(16),
-                              child: Column(
-                                crossAxisAlignment: CrossAxisAlignment.start,
+                              const SizedBox(height: 8),
+                              Row(
                                 children: [
+                                  const Icon(Icons.star,
+                                      color: Colors.amber, size: 18),
+                                  const SizedBox(width: 4),
                                   Text(
-                                    data['Name'] ?? 'Unnamed Recipe',
+                                    (data['AggregatedRating'] ?? 0)
+                                        .toStringAsFixed(1),
                                     style: const TextStyle(
-                                      fontSize: 20,
-                                      fontWeight: FontWeight.bold,
-                                    ),
-                                  ),
-                                  const SizedBox(height: 8),
-                                  Row(
-                                    children: [
-                                      const Icon(Icons.star,
-                                          color: Colors.amber, size: 18),
-                                      const SizedBox(width: 4),
-                                      Text(
-                                        (data['AggregatedRating'] ?? 0)
-                                            .toStringAsFixed(1),
-                                        style: const TextStyle(
-                                            fontWeight: FontWeight.bold),
-                                      ),
-                                      const SizedBox(width: 8),
-                                      Text(
-                                        '(${data['ReviewCount'] ?? 0} reviews)',
-                                        style:
-                                            const TextStyle(color: Colors.grey),
-                                      ),
-                                    ],
+                                        fontWeight: FontWeight.bold),
                                   ),
-                                  const SizedBox(height: 8),
-                                  keywords.isNotEmpty
-                                      ? Wrap(
-                                          spacing: 8,
-                                          children: keywords
-                                              .map((tag) => Chip(
-                                                    label: Text(tag),
-                                                    backgroundColor:
-                                                        Colors.blue.shade50,
-                                                  ))
-                                              .toList(),
-                                        )
-                                      : const Text(
-                                          'No tags available.',
-                                          style: TextStyle(color: Colors.grey),
-                                        ),
-                                  const SizedBox(height: 8),
+                                  const SizedBox(width: 8),
                                   Text(
-                                    missingCount == 0
-                                        ? 'All ingredients available'
-                                        : '$missingCount ingredient(s) missing',
-                                    style: TextStyle(
-                                      color: missingCount == 0
-                                          ? Colors.green
-                                          : Colors.red,
-                                    ),
+                                    '(${data['ReviewCount'] ?? 0} reviews)',
+                                    style:
+                                        const TextStyle(color: Colors.grey),
                                   ),
                                 ],
                               ),
-                            ),
-                          ],
+                              const SizedBox(height: 8),
+                              keywords.isNotEmpty
+                                  ? Wrap(
+                                      spacing: 8,
+                                      children: keywords
+                                          .map((tag) => Chip(
+                                                label: Text(tag),
+                                                backgroundColor:
+                                                    Colors.blue.shade50,
+                                              ))
+                                          .toList(),
+                                    )
+                                  : const Text(
+                                      'No tags available.',
+                                      style: TextStyle(color: Colors.grey),
+                                    ),
+                              if (missingCount != null) ...[
+                                const SizedBox(height: 8),
+                                Text(
+                                  missingCount == 0
+                                      ? 'All ingredients available'
+                                      : '$missingCount ingredient(s) missing',
+                                  style: TextStyle(
+                                    color: missingCount == 0
+                                        ? Colors.green
+                                        : Colors.red,
+                                  ),
+                                ),
+                              ],
+                            ],
+                          ),
                         ),
-                      ),
-                    );
-                  },
+                      ],
+                    ),
+                  ),
                 );
               },
             ),
@@ -12,6 +12,11 @@ class RecipeDetailPage extends StatefulWidget {
   _RecipeDetailPageState createState() => _RecipeDetailPageState();
 }
 
+// Bayesian average: every recipe counts as having this many extra reviews of this rating
+// (PRIOR_WEIGHT / PRIOR_MEAN in UploadScript/rating_aggregates.py)
+const double _priorMean = 4.0;
+const int _priorWeight = 5;
+
 class _RecipeDetailPageState extends State<RecipeDetailPage> {
   // REVIEW CONTROLS
   final TextEditingController _reviewController = TextEditingController();
@@ -173,7 +178,7 @@ class _RecipeDetailPageState extends State<RecipeDetailPage> {
     );
   }
 
-  /// 5) Submit or update review and recalc aggregated rating + count
+  /// 5) Submit or update review and adjust the recipe's rating sums in one transaction
   Future<void> _submitReview() async {
     final user = FirebaseAuth.instance.currentUser;
     if (user == null) return;
@@ -184,29 +189,62 @@ class _RecipeDetailPageState extends State<RecipeDetailPage> {
     setState(() => _isSubmittingReview = true);
 
     try {
-      final reviewRef = FirebaseFirestore.instance
-          .collection('recipes')
-          .doc(widget.recipeId)
-          .collection('reviews')
-          .doc(uid);
-
-      final reviewData = {
-        'AuthorName': displayName,
-        'DateModified': FieldValue.serverTimestamp(),
-        'DateSubmitted': FieldValue.serverTimestamp(),
-        'Rating': _rating.toDouble(),
-        'Review': _reviewController.text.trim(),
-      };
-
-      if (_isUserReviewed) {
-        await reviewRef.update(reviewData);
-      } else {
-        await reviewRef.set(reviewData);
-        _isUserReviewed = true;
-      }
-
-      // Recalculate average & count
-      await _updateAggregatedRatingAndCount();
+      final recipeRef =
+          FirebaseFirestore.instance.collection('recipes').doc(widget.recipeId);
+      final reviewRef = recipeRef.collection('reviews').doc(uid);
+      final rating = _rating.toDouble();
+
+      await FirebaseFirestore.instance.runTransaction((tx) async {
+        final recipeSnap = await tx.get(recipeRef);
+        final reviewSnap = await tx.get(reviewRef);
+        final recipe = recipeSnap.data() ?? {};
+
+        var count = (recipe['ReviewCount'] as num? ?? 0).toInt();
+        double total, squares;
+        if (recipe['RatingSum'] != null) {
+          total = (recipe['RatingSum'] as num).toDouble();
+          squares = (recipe['RatingSumSquares'] as num? ?? 0).toDouble();
+        } else {
+          // Recipe from before the sums: seed them from the stored mean
+          final mean = (recipe['AggregatedRating'] as num? ?? 0).toDouble();
+          total = mean * count;
+          squares = mean * mean * count;
+        }
+
+        if (reviewSnap.exists) {
+          final old = (reviewSnap.data()!['Rating'] as num? ?? 0).toDouble();
+          count -= 1;
+          total -= old;
+          squares -= old * old;
+          tx.update(reviewRef, {
+            'AuthorName': displayName,
+            'DateModified': FieldValue.serverTimestamp(),
+            'Rating': rating,
+            'Review': _reviewController.text.trim(),
+          });
+        } else {
+          tx.set(reviewRef, {
+            'AuthorName': displayName,
+            'DateModified': FieldValue.serverTimestamp(),
+            'DateSubmitted': FieldValue.serverTimestamp(),
+            'Rating': rating,
+            'Review': _reviewController.text.trim(),
+          });
+        }
+        count += 1;
+        total += rating;
+        squares += rating * rating;
+
+        tx.update(recipeRef, {
+          'ReviewCount': count,
+          'RatingSum': total,
+          'RatingSumSquares': squares,
+          'AggregatedRating': total / count,
+          'BayesianRating':
+              (total + _priorMean * _priorWeight) / (count + _priorWeight),
+        });
+      });
+      _isUserReviewed = true;
 
       ScaffoldMessenger.of(context).showSnackBar(
         const SnackBar(content: Text('Review submitted successfully!')),
@@ -220,29 +258,6 @@ class _RecipeDetailPageState extends State<RecipeDetailPage> {
     }
   }
 
-  Future<void> _updateAggregatedRatingAndCount() async {
-    final col = FirebaseFirestore.instance
-        .collection('recipes')
-        .doc(widget.recipeId)
-        .collection('reviews');
-
-    final snap = await col.get();
-    final count = snap.docs.length;
-    double total = 0;
-    for (var doc in snap.docs) {
-      total += (doc.data()['Rating'] as num).toDouble();
-    }
-    final avg = count > 0 ? total / count : 0.0;
-
-    await FirebaseFirestore.instance
-        .collection('recipes')
-        .doc(widget.recipeId)
-        .update({
-      'AggregatedRating': avg,
-      'ReviewCount': count,
-    });
-  }
-
   /// 6) Add recipe to meal planner
   Future<void> _addToMealPlanner() async {
     final user = FirebaseAuth.instance.currentUser;
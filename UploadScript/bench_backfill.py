@@ -0,0 +1,150 @@
+"""Benchmark update_recipes.backfill against the loop it replaced.
+
+Seeds an in-memory Firestore with zero-calorie recipes, then recomputes their
+totals with the old loop (one name query per ingredient, 25 updates per
+batch, 2 s sleep after each) on a sample, and with backfill() on all of
+them. Backfill commits take COMMIT_LATENCY on top of the RPC latency, as
+500-write batches do. The second backfill runs against a Firestore that
+rejects commits with ResourceExhausted while more than THROTTLE_AT are in
+flight, to show the adaptive limit backing off. Every RPC sleeps for the
+given latency.
+
+Usage: python bench_backfill.py [recipes] [latency_ms]
+"""
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from google.api_core import exceptions
+
+import update_recipes
+from fake_firestore import FakeFirestore, FakeWriteBatch
+from nutrition import NUTRIENTS, RECIPE_FIELDS, NutritionTable, recipe_fields
+from upload_logging import setup_logging
+
+OLD_SAMPLE = 100
+COMMIT_LATENCY = 1.0
+THROTTLE_AT = 4
+
+class BackendBatch(FakeWriteBatch):
+    def commit(self):
+        client = self._client
+        with client.commit_lock:
+            client.in_flight += 1
+            client.peak = max(client.peak, client.in_flight)
+            over = client.throttle_at is not None and client.in_flight > client.throttle_at
+        try:
+            time.sleep(COMMIT_LATENCY)
+            if over:
+                client._rpc()
+                raise exceptions.ResourceExhausted('Too many concurrent commits')
+            super().commit()
+        finally:
+            with client.commit_lock:
+                client.in_flight -= 1
+
+class BackendFirestore(FakeFirestore):
+    """Slower batch commits, optionally rejected above throttle_at concurrent ones"""
+
+    def __init__(self, latency=0.0, throttle_at=None):
+        super().__init__(latency)
+        self.throttle_at = throttle_at
+        self.in_flight = 0
+        self.peak = 0
+        self.commit_lock = threading.Lock()
+
+    def batch(self):
+        return BackendBatch(self)
+
+def seed(db, num_recipes, seed=19):
+    rng = random.Random(seed)
+    ingredients = {}
+    for i in range(2000):
+        data = {'name': f'Ingredient {i}', 'name_lower': f'ingredient {i}'}
+        data.update({field: round(rng.uniform(0, 400), 2) for field in NUTRIENTS})
+        ingredients[data['name_lower']] = data
+        db._write(f'ingredients_list/ing{i}', data)
+    names = [data['name'] for data in ingredients.values()]
+    for i in range(num_recipes):
+        parts = rng.sample(names, 9)
+        db._write(f'recipes/recipe{i:06d}', {
+            'Name': f'Recipe {i}',
+            'RecipeIngredientParts': parts,
+            'RecipeIngredientQuantities': [rng.randint(5, 300) for _ in parts],
+            **dict.fromkeys(RECIPE_FIELDS, 0.0),
+        })
+    return ingredients
+
+def old_update(db, limit, sleep=2):
+    """update_recipes.update_recipe_nutrition_batch before the backfill, on the first `limit` recipes"""
+    recipe_docs = db.collection('recipes').where('Calories', '==', 0.0).limit(limit).get()
+    table = NutritionTable()
+    for start in range(0, len(recipe_docs), 25):
+        batch_writer = db.batch()
+        resolved = []
+        for doc in recipe_docs[start:start + 25]:
+            recipe = doc.to_dict()
+            rows = []
+            for name, weight in zip(recipe['RecipeIngredientParts'], recipe['RecipeIngredientQuantities']):
+                query = db.collection('ingredients_list').where('name', '==', name).limit(1).get()
+                rows.append((table.row(query[0].id, query[0].to_dict()), weight))
+            resolved.append((doc, rows))
+        for (doc, _), totals in zip(resolved, table.totals([rows for _, rows in resolved])):
+            batch_writer.update(doc.reference, recipe_fields(totals))
+        batch_writer.commit()
+        time.sleep(sleep)
+    return len(recipe_docs)
+
+def wrong_totals(db, ingredients):
+    table = NutritionTable.from_ingredients(ingredients.items())
+    wrong = 0
+    for doc in db.collection('recipes').stream():
+        data = doc.to_dict()
+        rows = [(table.rows[n.lower()], w) for n, w in zip(data['RecipeIngredientParts'],
+                                                             data['RecipeIngredientQuantities'])]
+        expected = recipe_fields(table.recipe_totals(rows))
+        if any(not math.isclose(data[f] or 0, expected[f] or 0, rel_tol=1e-9) for f in RECIPE_FIELDS):
+            wrong += 1
+    return wrong
+
+def run(label, db, job, scale=1):
+    reads, rpcs = db.reads, db.rpcs
+    start = time.perf_counter()
+    count = job()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:34} {elapsed * scale:8.1f} s  {(db.reads - reads) * scale:>9,} reads"
+          f"  {(db.rpcs - rpcs) * scale:>7,} RPCs  ({count * scale:,} recipes"
+          + (f", peak {db.peak} commits in flight)" if isinstance(db, BackendFirestore) else ")"))
+
+def main():
+    num_recipes = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    setup_logging([], level="INFO")
+    os.chdir(tempfile.mkdtemp())  # The document cache lands here, not over the real one
+    print(f"{num_recipes} zero-calorie recipes, {latency * 1000:.0f} ms per RPC")
+
+    db = FakeFirestore(latency)
+    seed(db, OLD_SAMPLE)
+    run(f'old loop (x{num_recipes // OLD_SAMPLE} from {OLD_SAMPLE})', db,
+        lambda: old_update(db, OLD_SAMPLE), scale=num_recipes // OLD_SAMPLE)
+
+    ok = True
+    for label, db in [('backfill', BackendFirestore(latency)),
+                      (f'backfill, throttled above {THROTTLE_AT}', BackendFirestore(latency, THROTTLE_AT))]:
+        ingredients = seed(db, num_recipes)
+        run(label, db, lambda: update_recipes.backfill(db))
+        wrong = wrong_totals(db, ingredients)
+        ok = ok and not wrong
+        if wrong:
+            print(f"    ❌ {wrong} recipes have wrong totals")
+    if ok:
+        print("Backfilled totals ✅ match a recompute from ingredients_list")
+    else:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
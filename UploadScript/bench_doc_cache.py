@@ -0,0 +1,119 @@
+"""Benchmark recipe lookups through the DocumentCache against one get() per recipe.
+
+Seeds an in-memory Firestore with recipes and runs test_rec's lookup for a
+set of users: the keywords of every recipe each user interacted with, the
+popular recipes shared by many users. Every RPC sleeps for the given latency.
+The lookup runs uncached (one get() per recipe, as before), through a
+cold cache holding test_rec's field mask, again warm, then through a new DocumentCache on the same file, as
+after a worker restart, and through one whose memory tier is too small for
+the catalog. Then it checks coherence: a rewrite through a BatchWriter must
+be invalidated once committed, and an older copy of a document must never
+replace a newer one.
+
+Usage: python bench_doc_cache.py [recipes] [users] [latency_ms]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from doc_cache import DocumentCache
+from fake_firestore import FakeFirestore, FakeSnapshot
+from ingest_pipeline import BatchWriter
+
+INTERACTIONS = 30           # Recipes per user
+FIELDS = ['Keywords', 'RecipeIngredientParts']     # test_rec's field mask
+
+def seeded_db(num_recipes, rng):
+    db = FakeFirestore()
+    for i in range(num_recipes):
+        db._write(f'recipes/r{i}', {'Id': f'r{i}', 'Name': f'Recipe {i}',
+                                    'Keywords': rng.sample(['Easy', 'Dinner', 'Vegan', 'Quick', 'Dessert'], 2)})
+    return db
+
+def interactions(num_recipes, num_users, rng):
+    # Half from a few popular recipes (a Zipf-like skew), half from anywhere in the catalog
+    def recipe():
+        if rng.random() < 0.5:
+            return rng.randrange(num_recipes)
+        return min(int(rng.paretovariate(0.8)) - 1, num_recipes - 1)
+    return [{f'r{recipe()}' for _ in range(INTERACTIONS)} for _ in range(num_users)]
+
+def keywords_uncached(db, users):
+    for recipe_ids in users:
+        counts = defaultdict(int)
+        for recipe_id in recipe_ids:
+            doc = db.collection('recipes').document(recipe_id).get()
+            for kw in (doc.to_dict() or {}).get('Keywords', []):
+                counts[kw] += 1
+
+def keywords_cached(cache, users):
+    for recipe_ids in users:
+        counts = defaultdict(int)
+        for data in cache.get_many(recipe_ids).values():
+            for kw in data.get('Keywords', []):
+                counts[kw] += 1
+
+def run(label, db, job, cache=None):
+    reads, rpcs = db.reads, db.rpcs
+    start = time.perf_counter()
+    job()
+    elapsed = time.perf_counter() - start
+    text = f"  {label:28} {elapsed:7.2f} s  {db.reads - reads:>7,} reads  {db.rpcs - rpcs:>6,} RPCs"
+    if cache is not None:
+        text += f"  hit rate {cache.hit_rate():4.0%}  {dict(cache.stats)}"
+    print(text)
+
+def check_coherence(db, path):
+    cache = DocumentCache(db, 'recipes', path)
+    cache.get_many(['r0', 'r1'])
+    with BatchWriter(db) as writer:
+        cache.invalidate_after(writer.set(db.collection('recipes').document('r0'), {'Name': 'Renamed'}, merge=True),
+                               'r0')
+    rewritten = cache.get('r0')['Name'] == 'Renamed'
+    newer = db.collection('recipes').document('r1').get()
+    older = FakeSnapshot(newer.reference, {'Name': 'Stale'},
+                         newer.update_time.replace(year=newer.update_time.year - 1))
+    cache.put([older])
+    kept = cache.get('r1')['Name'] == newer.to_dict()['Name']
+    cache.close()
+    return rewritten, kept
+
+def main():
+    num_recipes = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    num_users = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 20) / 1000
+    rng = random.Random(24)
+    db = seeded_db(num_recipes, rng)
+    users = interactions(num_recipes, num_users, rng)
+    path = os.path.join(tempfile.mkdtemp(), 'doc_cache.db')
+    distinct = len(set().union(*users))
+    print(f"{num_users} users x {INTERACTIONS} interactions over {distinct:,} distinct recipes, "
+          f"{latency * 1000:.0f} ms per RPC")
+
+    db.reads = db.writes = db.rpcs = 0
+    db.latency = latency
+    run('one get() per recipe', db, lambda: keywords_uncached(db, users))
+    cache = DocumentCache(db, 'recipes', path, field_paths=FIELDS)
+    run('cache, cold', db, lambda: keywords_cached(cache, users), cache)
+    cache.stats.clear()
+    run('cache, warm', db, lambda: keywords_cached(cache, users), cache)
+    cache.close()
+    restarted = DocumentCache(db, 'recipes', path, field_paths=FIELDS)
+    run('cache, after a restart', db, lambda: keywords_cached(restarted, users), restarted)
+    restarted.close()
+    small = DocumentCache(db, 'recipes', path, capacity=distinct // 10, field_paths=FIELDS)
+    run(f'cache, memory for {distinct // 10:,}', db, lambda: keywords_cached(small, users), small)
+    small.close()
+
+    db.latency = 0
+    rewritten, kept = check_coherence(db, path)
+    print(f"{'✅' if rewritten else '❌'} A committed rewrite is re-read; "
+          f"{'✅' if kept else '❌'} an older copy doesn't replace a newer one")
+    if not (rewritten and kept):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
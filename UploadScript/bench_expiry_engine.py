@@ -0,0 +1,64 @@
+"""Benchmark the expiry engine on a large simulated household base.
+
+Loads users x items inventory documents into the engine the way the
+inventory listener would, then times a tick with a day's worth of items
+coming due and an incremental tick after a small batch of changes.
+
+Usage: python bench_expiry_engine.py [users] [items_per_user] [recipes]
+"""
+import datetime
+import random
+import sys
+import time
+
+from bench_scoring import synthetic_catalog
+from expiry_engine import DAY, ExpiryEngine
+from fake_firestore import FakeFirestore
+from inventory_ranking import InventoryRanker
+from recipe_index import RecipeIndex
+
+def main():
+    num_users = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    items_per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    num_recipes = int(sys.argv[3]) if len(sys.argv) > 3 else 5_000
+
+    index = RecipeIndex()
+    for rid, data in synthetic_catalog(num_recipes).items():
+        index.upsert(rid, dict(data, ExpiryDate=random.randint(1, 5)), 1.0)
+    db = FakeFirestore()
+    engine = ExpiryEngine(db, InventoryRanker(index, {}), sent_path=None)
+
+    rng = random.Random(3)
+    now = time.time()
+    start = time.perf_counter()
+    for u in range(num_users):
+        uid = f'user{u}'
+        for i in range(items_per_user):
+            added = datetime.datetime.fromtimestamp(now - rng.uniform(0, 30) * DAY, datetime.timezone.utc)
+            engine.apply(uid, f'{i}_10', {'name': f'ingredient {rng.randrange(300)}', 'date_added': added})
+    elapsed = time.perf_counter() - start
+    total = num_users * items_per_user
+    print(f"initial projection: {total} items in {elapsed:.2f}s ({total / elapsed:,.0f} items/s, "
+          f"{db.reads} preference reads)")
+
+    # Everything already past its alert time comes due on the first tick
+    start = time.perf_counter()
+    alerted = engine.tick(now)
+    elapsed = time.perf_counter() - start
+    print(f"first tick: {alerted} alerts for {num_users} users in {elapsed:.2f}s ({db.writes} writes)")
+
+    # Steady state: one day later, plus 1% of items re-added
+    writes = db.writes
+    start = time.perf_counter()
+    for u in rng.sample(range(num_users), num_users // 100):
+        for i in rng.sample(range(items_per_user), items_per_user // 10):
+            engine.apply(f'user{u}', f'{i}_10', {
+                'name': f'ingredient {rng.randrange(300)}',
+                'date_added': datetime.datetime.fromtimestamp(now, datetime.timezone.utc)})
+    alerted = engine.tick(now + DAY)
+    elapsed = time.perf_counter() - start
+    print(f"next-day tick with {num_users // 100 * (items_per_user // 10)} changed items: "
+          f"{alerted} alerts in {elapsed:.2f}s ({db.writes - writes} writes)")
+
+if __name__ == '__main__':
+    main()
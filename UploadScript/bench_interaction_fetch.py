@@ -0,0 +1,105 @@
+"""Benchmark batched, concurrent, field-masked reads of interacted recipes and refreshes.
+
+The in-memory Firestore charges every RPC the given latency. get_all also
+pays for streaming its documents back: DOC_TIME per whole recipe,
+MASKED_DOC_TIME per recipe cut down to a field mask. (Those two figures are
+assumptions, set to roughly the size of a recipe with its instructions
+against just its keywords and ingredients.)
+
+1. One user's 300 interacted recipes: one get() each against
+   fetch_documents as one get_all call, chunked, then masked and concurrent.
+   The masked keywords and ingredients must match the get() results.
+2. Refreshing a batch of users whose interactions include recipes the index
+   hasn't seen: the old serial read of each user's interactions against
+   read_interactions. That reads the users concurrently and fetches the
+   unseen recipes into the index. The interactions must be the same, and
+   afterwards the index must cover them all.
+
+Usage: python bench_interaction_fetch.py [users] [latency_ms]
+"""
+import random
+import sys
+import time
+
+import recommendation_system
+from doc_cache import fetch_documents
+from fake_firestore import FakeFirestore
+from recipe_index import INDEXED_FIELDS, RecipeIndex
+
+NUM_RECIPES = 20_000
+DOC_TIME = 0.0005           # Seconds to stream one whole recipe
+MASKED_DOC_TIME = 0.0001    # ... and one recipe cut down to INDEXED_FIELDS
+VIEWED = 300
+UNINDEXED = 0.1             # Recipes added after the index was last saved
+KEYWORDS = ['Easy', 'Vegan', 'Dessert', 'Chicken', 'Breakfast', 'Healthy', 'Spicy', 'Baking']
+
+class StreamingFirestore(FakeFirestore):
+    def get_all(self, references, field_paths=None):
+        references = list(references)
+        time.sleep(len(references) * (MASKED_DOC_TIME if field_paths else DOC_TIME))
+        return super().get_all(references, field_paths)
+
+def seeded_db(num_users, rng):
+    db = StreamingFirestore()
+    for i in range(NUM_RECIPES):
+        db._write(f'recipes/r{i}', {'Id': f'r{i}', 'Name': f'Recipe {i}', 'Keywords': rng.sample(KEYWORDS, 3),
+                                    'RecipeIngredientParts': [f'ingredient {rng.randrange(500)}' for _ in range(8)],
+                                    'RecipeInstructions': 'Stir well and simmer. ' * 40, 'ExpiryDate': 3})
+    for u in range(num_users):
+        for i in rng.sample(range(NUM_RECIPES), VIEWED):
+            db._write(f'users/user{u}/recipes/viewed/items/r{i}', {'recipeId': f'r{i}'})
+        for i in rng.sample(range(NUM_RECIPES), 10):
+            db._write(f'users/user{u}/recipes/reviewed/items/r{i}', {'recipeId': f'r{i}'})
+        db._write(f'users/user{u}/recipes/saved/collection/favourites',
+                  {'recipes': [f'r{i}' for i in rng.sample(range(NUM_RECIPES), 20)]})
+    return db
+
+def timed(label, db, job):
+    rpcs = db.rpcs
+    start = time.perf_counter()
+    result = job()
+    print(f"  {label:36} {time.perf_counter() - start:7.3f} s  {db.rpcs - rpcs:>5,} RPCs")
+    return result
+
+def main():
+    num_users = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    rng = random.Random(25)
+    db = seeded_db(num_users, rng)
+    print(f"{NUM_RECIPES:,} recipes, {num_users} users with {VIEWED} viewed recipes each, "
+          f"{latency * 1000:.0f} ms per RPC")
+    db.latency = latency
+
+    recipe_ids = sorted(recommendation_system.get_user_interactions(db, 'user0'))
+    print(f"One user's {len(recipe_ids)} interacted recipes:")
+    serial = timed('one get() per recipe', db, lambda: {
+        rid: db.collection('recipes').document(rid).get().to_dict() for rid in recipe_ids})
+    timed('one get_all', db, lambda: fetch_documents(db, 'recipes', recipe_ids, chunk_size=len(recipe_ids)))
+    timed('get_all chunks, serial', db, lambda: fetch_documents(db, 'recipes', recipe_ids, concurrency=1))
+    masked = timed('get_all chunks, concurrent, masked', db,
+                   lambda: fetch_documents(db, 'recipes', recipe_ids, field_paths=INDEXED_FIELDS))
+    same = all(snapshot.to_dict() == {field: serial[snapshot.id][field] for field in INDEXED_FIELDS}
+               for snapshot in masked) and len(masked) == len(serial)
+
+    db.latency = 0
+    users = [f'user{u}' for u in range(num_users)]
+    interacted = set().union(*(recommendation_system.get_user_interactions(db, uid) for uid in users))
+    unseen = set(rng.sample(sorted(interacted), int(len(interacted) * UNINDEXED)))
+    index = RecipeIndex()
+    for rid in range(NUM_RECIPES):
+        if f'r{rid}' not in unseen:
+            index.upsert(f'r{rid}', db._docs('recipes')[f'r{rid}'][0])
+    db.latency = latency
+    print(f"Refreshing {num_users} users, {len(unseen):,} of their recipes not yet indexed:")
+    old = timed('serial interactions (unseen skipped)', db,
+                lambda: {uid: recommendation_system.get_user_interactions(db, uid) for uid in users})
+    new = timed('read_interactions', db, lambda: recommendation_system.read_interactions(db, users, index))
+    covered = all(rid in index.rows for rids in new.values() for rid in rids)
+    ok = same and new == old and covered
+    print(f"{'✅' if same else '❌'} masked fields match get(); {'✅' if new == old else '❌'} same interactions; "
+          f"{'✅' if covered else '❌'} index covers every interacted recipe")
+    if not ok:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
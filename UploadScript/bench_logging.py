@@ -0,0 +1,77 @@
+"""Benchmark new.upload_recipes with debug logging on and off.
+
+Writes a synthetic Food.com-shaped dataset, then runs new.upload_recipes
+against an in-memory Firestore with no latency, so the difference between
+runs is the logging itself. Output goes to a stream that only counts lines,
+which understates the cost of a real terminal.
+
+Usage: python bench_logging.py [recipes]
+"""
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+import new
+from fake_firestore import FakeFirestore
+from ingredient_resolver import IngredientResolver
+from record_stream import write_json_array
+from upload_logging import setup_logging
+
+PARTS = ['eggplants', 'tomatoes', 'onion', 'red bell pepper', 'dry red wine', 'fresh basil', 'garlic cloves',
+         'salt', 'olive oil', 'paprika', 'butter', 'flour', 'milk', 'egg', 'sugar', 'baking soda']
+QUANTITIES = ['1', '2', '1/2', '1/4', '3', '1 1/2', 'NA', '10']
+
+class LineCounter:
+    def __init__(self):
+        self.lines = 0
+
+    def write(self, text):
+        self.lines += text.count('\n')
+
+    def flush(self):
+        pass
+
+def synthetic_recipe(i, rng):
+    n = rng.randint(5, 12)
+    parts = [f'{rng.choice(PARTS)} {rng.randrange(300)}' for _ in range(n)]
+    quantities = [rng.choice(QUANTITIES) for _ in range(n)]
+    return {
+        'Id': i, 'Name': f'Recipe {i}', 'CookTime': 'PT20M', 'PrepTime': 'PT30M', 'TotalTime': 'PT50M',
+        'Images': '"https://img.example.com/recipe.jpg"', 'ExpiryDate': 4, 'RecipeCategory': 'Dinner',
+        'Keywords': 'c("Easy", "< 60 Mins", "Healthy")',
+        'RecipeIngredientQuantities': 'c(' + ', '.join(q if q == 'NA' else f'"{q}"' for q in quantities) + ')',
+        'RecipeIngredientParts': 'c(' + ', '.join(f'"{p}"' for p in parts) + ')',
+        'AggregatedRating': 4.5, 'ReviewCount': 3.0, 'RecipeServings': 4.0, 'RecipeYield': None,
+        'RecipeInstructions': 'c("Combine everything.", "Simmer for 10 minutes.", "Serve.")',
+    }
+
+def run(path, level, json_output):
+    stream = LineCounter()
+    setup_logging([], level=level, json_output=json_output, stream=stream)
+    new.db = FakeFirestore()
+    new.resolver = IngredientResolver()
+    start = time.perf_counter()
+    new.upload_recipes(path)
+    return time.perf_counter() - start, stream.lines
+
+def main():
+    num_recipes = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rng = random.Random(4)
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)  # The document cache and dedup keys land here, not over the real ones
+        path = os.path.join(directory, 'recipes.json')
+        write_json_array(path, (synthetic_recipe(i, rng) for i in range(num_recipes)))
+        print(f"{num_recipes} recipes")
+        baseline = None
+        for label, level, json_output in [('INFO (debug off)', logging.INFO, False),
+                                          ('DEBUG', logging.DEBUG, False),
+                                          ('DEBUG, JSON lines', logging.DEBUG, True)]:
+            elapsed, lines = run(path, level, json_output)
+            baseline = baseline or elapsed
+            print(f"  {label:18} {elapsed:6.2f} s  {elapsed / baseline:5.1f}x  {lines:>9,} lines")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""Check the nutrition engine against the functions it replaced, and time it.
+
+The old per-recipe loops are reproduced below. On the fixtures every total
+must match them, except CholesterolContent for the three copies that never
+summed cholesterol (they always returned None for it). The timing run
+computes totals for synthetic recipes with the old loop and as one matrix
+product.
+
+Usage: python bench_nutrition.py [recipes]
+"""
+import json
+import math
+import random
+import sys
+import time
+
+from nutrition import NUTRIENTS, RECIPE_FIELDS, NutritionTable, recipe_fields
+
+def new_calculate_nutrition(ingredient_data):
+    """new.calculate_nutrition plus the None step process_recipe ran after it"""
+    nutrition = dict.fromkeys(RECIPE_FIELDS, 0)
+    for ing in ingredient_data:
+        factor = ing['weight'] / 100.0
+        nut = ing['nutrition']
+        nutrition['Calories'] += nut['calories'] * factor
+        nutrition['ProteinContent'] += nut['protein'] * factor
+        nutrition['CarbohydrateContent'] += nut['carbohydrate'] * factor
+        nutrition['FatContent'] += nut['fat'] * factor
+        nutrition['SaturatedFatContent'] += nut['saturatedfat'] * factor
+        nutrition['CholesterolContent'] += nut['cholesterol'] * factor
+        nutrition['SodiumContent'] += nut['sodium'] * factor
+        nutrition['FiberContent'] += nut['fiber'] * factor
+        nutrition['SugarContent'] += nut['sugar'] * factor
+    for field in ['CholesterolContent', 'SodiumContent']:
+        if nutrition[field] == 0:
+            nutrition[field] = None
+    return nutrition
+
+def batch_calculate_nutrition(ingredients, key='nutrition'):
+    """upload_recipes_batch / upload_recipes(3) calculate_nutrition and update_recipes.calculate_totals"""
+    totals = dict.fromkeys(RECIPE_FIELDS, 0.0)
+    for ingredient in ingredients:
+        factor = ingredient["weight"] / 100.0
+        nutrition = ingredient[key]
+        totals["Calories"] += (nutrition.get("calories") or 0) * factor
+        totals["ProteinContent"] += (nutrition.get("protein") or 0) * factor
+        totals["CarbohydrateContent"] += (nutrition.get("carbohydrate") or 0) * factor
+        totals["FatContent"] += (nutrition.get("fat") or 0) * factor
+        totals["SaturatedFatContent"] += (nutrition.get("saturatedfat") or 0) * factor
+        totals["SodiumContent"] += (nutrition.get("sodium") or 0) * factor
+        totals["FiberContent"] += (nutrition.get("fiber") or 0) * factor
+        totals["SugarContent"] += (nutrition.get("sugar") or 0) * factor
+    if totals["CholesterolContent"] == 0:
+        totals["CholesterolContent"] = None
+    if totals["SodiumContent"] == 0:
+        totals["SodiumContent"] = None
+    return totals
+
+def update_recipes_calculate_totals(ingredients):
+    return batch_calculate_nutrition([{'weight': i['weight'], 'data': i['nutrition']} for i in ingredients], 'data')
+
+OLD_FUNCTIONS = {
+    'new.calculate_nutrition': (new_calculate_nutrition, False),
+    'upload_recipes_batch.calculate_nutrition': (batch_calculate_nutrition, True),
+    'upload_recipes(3).calculate_nutrition': (batch_calculate_nutrition, True),
+    'update_recipes.calculate_totals': (update_recipes_calculate_totals, True),
+}
+
+def fixture_ingredients(rng, count):
+    with open('ingredient.json') as f:
+        butter = json.load(f)
+    ingredients = [('butter', butter)]
+    for i in range(count):
+        data = {field: round(rng.uniform(0, 400), 3) for field in NUTRIENTS}
+        if i % 7 == 0:
+            data['cholesterol'] = None     # Stored as None by the uploaders
+        if i % 11 == 0:
+            data['sodium'] = 0.0
+        ingredients.append((f'ing{i}', data))
+    # Every nutrient zero: cholesterol and sodium totals become None
+    ingredients.append(('zero', dict.fromkeys(NUTRIENTS, 0.0)))
+    return ingredients
+
+def fixture_recipes(rng, ingredients, count):
+    recipes = [[('zero', 100.0)], [], [('butter', 14.2), ('zero', 50.0)]]
+    for _ in range(count):
+        recipes.append([(ing_id, round(rng.uniform(1, 400), 2))
+                        for ing_id, _ in rng.sample(ingredients, rng.randint(1, 15))])
+    return recipes
+
+def same(a, b):
+    if a is None or b is None:
+        return a is b
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+
+def check(ingredients, recipes):
+    data = dict(ingredients)
+    table = NutritionTable.from_ingredients(ingredients)
+    totals = [recipe_fields(t) for t in table.totals([[(table.rows[i], w) for i, w in r] for r in recipes])]
+    ok = True
+    for name, (old, skips_cholesterol) in OLD_FUNCTIONS.items():
+        mismatched = {}
+        for recipe, new in zip(recipes, totals):
+            # new.py used .get(field, 0), which fails on a stored None, so give it zeros instead
+            old_input = [{'weight': w, 'nutrition': ({k: data[i].get(k) or 0 for k in NUTRIENTS}
+                                                     if not skips_cholesterol else data[i])}
+                         for i, w in recipe]
+            expected = old(old_input)
+            for field in RECIPE_FIELDS:
+                if field == 'CholesterolContent' and skips_cholesterol:
+                    continue
+                if not same(new[field], expected[field]):
+                    mismatched[field] = mismatched.get(field, 0) + 1
+        note = ' (CholesterolContent not compared: never summed)' if skips_cholesterol else ''
+        print(f"  {name:42} {'✅ matches' if not mismatched else f'❌ {mismatched}'} on {len(recipes)} recipes{note}")
+        ok = ok and not mismatched
+    single = [recipe_fields(table.recipe_totals([(table.rows[i], w) for i, w in r])) for r in recipes]
+    single_ok = all(same(a[f], b[f]) for a, b in zip(single, totals) for f in RECIPE_FIELDS)
+    print(f"  {'NutritionTable.recipe_totals':42} {'✅ matches' if single_ok else '❌ differs from'} totals()")
+    return ok and single_ok
+
+def main():
+    num_recipes = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(8)
+    ingredients = fixture_ingredients(rng, 3000)
+    print("Fixtures against the old functions:")
+    ok = check(ingredients, fixture_recipes(rng, ingredients, 2000))
+
+    recipes = fixture_recipes(rng, ingredients, num_recipes)
+    data = dict(ingredients)
+    old_input = [[{'weight': w, 'nutrition': data[i]} for i, w in r] for r in recipes]
+    print(f"\n{len(recipes)} recipes")
+    start = time.perf_counter()
+    for ingredient_list in old_input:
+        batch_calculate_nutrition(ingredient_list)
+    print(f"  {'old loop':24} {time.perf_counter() - start:6.2f} s")
+
+    table = NutritionTable.from_ingredients(ingredients)
+    pairs = [[(table.rows[i], w) for i, w in r] for r in recipes]
+    start = time.perf_counter()
+    totals = table.totals(pairs)
+    fields = [recipe_fields(t) for t in totals]
+    elapsed = time.perf_counter() - start
+    print(f"  {'NutritionTable.totals':24} {elapsed:6.2f} s  (matrix product plus {len(fields)} field dicts)")
+    if not ok:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Compare the nutrition delta job with recomputing every recipe after ingredient edits.
+
+Seeds an in-memory Firestore with recipes whose totals match their
+ingredients, edits a few ingredients, then brings the totals up to date two
+ways on identical copies: reading every recipe and rewriting all the totals,
+and nutrition_delta.apply_changes from a reverse index built beforehand.
+Afterwards every recipe's totals must equal a recompute from the edited
+ingredients.
+
+Usage: python bench_nutrition_delta.py [recipes] [changed ingredients]
+"""
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+from fake_firestore import FakeFirestore
+from ingest_pipeline import BatchWriter
+from nutrition import NUTRIENTS, RECIPE_FIELDS, NutritionTable, recipe_fields
+from nutrition_delta import IngredientUsage, apply_changes, ingredient_names
+
+LATENCY = 0.01
+NUM_INGREDIENTS = 3000
+
+def seed(db, rng, num_recipes):
+    ingredients = {}
+    for i in range(NUM_INGREDIENTS):
+        data = {'name': f'Ingredient {i}', 'name_lower': f'ingredient {i}'}
+        data.update({field: round(rng.uniform(0, 400), 2) for field in NUTRIENTS})
+        if i % 7 == 0:
+            data['cholesterol'] = None
+        ingredients[f'ing{i}'] = data
+    # Common ingredients show up in many recipes, like salt and butter do
+    popular = [f'ing{i}' for i in range(50)]
+    recipes = {}
+    for i in range(num_recipes):
+        ids = rng.sample(popular, 2) + rng.sample(list(ingredients), rng.randint(3, 10))
+        recipes[f'recipe{i}'] = [(ingredients[ing_id]['name'], round(rng.uniform(1, 400), 2)) for ing_id in ids]
+    load(db, ingredients, recipes)
+    return ingredients, recipes
+
+def load(db, ingredients, recipes):
+    table = NutritionTable.from_ingredients((d['name_lower'], d) for d in ingredients.values())
+    totals = table.totals([[(table.rows[name.lower()], grams) for name, grams in parts]
+                           for parts in recipes.values()])
+    with BatchWriter(db) as writer:
+        for ing_id, data in ingredients.items():
+            writer.set(db.collection('ingredients_list').document(ing_id), data)
+        for (recipe_id, parts), recipe_totals in zip(recipes.items(), totals):
+            writer.set(db.collection('recipes').document(recipe_id), {
+                'Name': recipe_id,
+                'RecipeIngredientParts': [name for name, _ in parts],
+                'RecipeIngredientQuantities': [grams for _, grams in parts],
+                **recipe_fields(recipe_totals),
+            })
+
+def edit(db, ingredients, rng, count):
+    """Changes a few ingredients, a popular one included; returns {name_lower: new data}"""
+    changes = {}
+    for ing_id in ['ing3'] + rng.sample(list(ingredients)[50:], count - 1):
+        data = dict(ingredients[ing_id])
+        for field in rng.sample(list(NUTRIENTS), 3):
+            data[field] = round(rng.uniform(10, 50), 2)
+        db.collection('ingredients_list').document(ing_id).set(data)
+        changes.update(dict.fromkeys(ingredient_names(data), data))
+    return changes
+
+def full_recompute(db):
+    ingredients = [(doc.to_dict()['name_lower'], doc.to_dict()) for doc in db.collection('ingredients_list').stream()]
+    table = NutritionTable.from_ingredients(ingredients)
+    docs = list(db.collection('recipes').stream())
+    totals = table.totals([[(table.rows[name.lower()], grams) for name, grams in
+                            zip(doc.get('RecipeIngredientParts'), doc.get('RecipeIngredientQuantities'))]
+                           for doc in docs])
+    with BatchWriter(db) as writer:
+        for doc, recipe_totals in zip(docs, totals):
+            writer.set(doc.reference, recipe_fields(recipe_totals), merge=True)
+    return len(docs)
+
+def mismatches(db, expected):
+    wrong = 0
+    for doc in db.collection('recipes').stream():
+        data = doc.to_dict()
+        for field in RECIPE_FIELDS:
+            if not math.isclose(data[field] or 0, expected[doc.id][field] or 0, rel_tol=1e-9, abs_tol=1e-6):
+                wrong += 1
+                break
+    return wrong
+
+def run(label, db, job):
+    reads, writes, rpcs = db.reads, db.writes, db.rpcs
+    db.latency = LATENCY
+    start = time.perf_counter()
+    touched = job()
+    elapsed = time.perf_counter() - start
+    db.latency = 0.0
+    print(f"  {label:26} {elapsed:6.2f} s  {db.reads - reads:>7,} reads  {db.writes - writes:>7,} writes"
+          f"  {db.rpcs - rpcs:>5,} RPCs  ({touched:,} recipes)")
+
+def main():
+    num_recipes = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    num_changes = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    full_db, delta_db = FakeFirestore(), FakeFirestore()
+    ingredients, recipes = seed(full_db, random.Random(18), num_recipes)
+    seed(delta_db, random.Random(18), num_recipes)
+
+    start = time.perf_counter()
+    usage = IngredientUsage.from_firestore(delta_db)
+    print(f"{num_recipes} recipes, {num_changes} ingredients edited "
+          f"(index built in {time.perf_counter() - start:.2f} s, once, before the edits)")
+    edit(full_db, ingredients, random.Random(5), num_changes)
+    changes = edit(delta_db, ingredients, random.Random(5), num_changes)
+
+    with tempfile.TemporaryDirectory() as directory:
+        run('full recompute', full_db, lambda: full_recompute(full_db))
+        run('delta job', delta_db,
+            lambda: apply_changes(delta_db, usage, changes, failed_path=os.path.join(directory, 'failed.json')))
+
+    expected = {doc.id: doc.to_dict() for doc in full_db.collection('recipes').stream()}
+    wrong = mismatches(delta_db, expected)
+    print(f"Delta totals {'✅ match' if not wrong else f'❌ differ on {wrong} recipes from'} the full recompute")
+    if wrong:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Compare the quantity parser with the eval() and print-per-call parsers it replaced.
+
+Checks that parse_quantity agrees with the old new.parse_quantity wherever
+the old one produced a number, then times all of them over a Food.com-shaped
+quantity column. The old parser's prints go to /dev/null here; on a terminal
+they cost far more.
+
+Usage: python bench_quantities.py [rows]
+"""
+import contextlib
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+from quantities import parse_amount, parse_quantities, parse_quantity, to_grams
+
+def eval_quantity(qty):
+    """json2json.convert_recipe_data before the shared parser"""
+    try:
+        return float(eval(qty))
+    except:
+        return 1
+
+def old_parse_quantity(qty_str):
+    """new.parse_quantity before the shared parser"""
+    print(f"\nAttempting to parse quantity: {qty_str} (type: {type(qty_str)})")
+    if pd.isna(qty_str) or qty_str in ["NA", "na", "None", None, ""]:
+        print("Returning 0 (NA/None case)")
+        return 0
+    if not isinstance(qty_str, str):
+        try:
+            result = float(qty_str)
+            print(f"Returning {result} (non-string numeric case)")
+            return result
+        except:
+            print("Returning 0 (non-string numeric parse failed)")
+            return 0
+    qty_str = qty_str.strip()
+    print(f"After strip: '{qty_str}'")
+    if ' ' in qty_str and '/' in qty_str:
+        print("Mixed number case")
+        parts = qty_str.split(' ')
+        whole_num = float(parts[0]) if parts[0] else 0
+        fraction_part = parts[1]
+        try:
+            numerator, denominator = map(float, fraction_part.split('/'))
+            result = whole_num + (numerator / denominator)
+            print(f"Returning {result} (mixed number case)")
+            return result
+        except Exception as e:
+            print(f"Mixed number parse failed: {str(e)}")
+            return whole_num
+    if '/' in qty_str:
+        print("Fraction case")
+        try:
+            numerator, denominator = map(float, qty_str.split('/'))
+            result = numerator / denominator
+            print(f"Returning {result} (fraction case)")
+            return result
+        except Exception as e:
+            print(f"Fraction parse failed: {str(e)}")
+            return 0
+    if '-' in qty_str and qty_str.count('-') == 1 and not qty_str.startswith('-'):
+        print("Range case")
+        try:
+            low, high = map(float, qty_str.split('-'))
+            result = (low + high) / 2
+            print(f"Returning {result} (range case)")
+            return result
+        except Exception as e:
+            print(f"Range parse failed: {str(e)}")
+    try:
+        result = float(qty_str)
+        print(f"Returning {result} (simple float case)")
+        return result
+    except ValueError as e:
+        print(f"Float parse failed: {str(e)}")
+        return 0
+
+QUANTITIES = ['1', '2', '1/2', '1/4', '3', '3/4', '1 1/2', '1/3', '4', '2/3', '1 1/4', '1-2', '1 -2',
+              '6', '8', '1/8', '2 1/2', '10', '12', '1.5', '0.5', None]
+EXTRA = ['½', '1½', '2 to 3', '2 cups', '1 tbsp.', '8 fl oz', '3 Tablespoons', '1 (8 oz) can',
+         '2-3 lbs', 'about 1/2', '1/0', '__import__("os")', 'to taste']
+PARTS = ['salt', 'onion', 'milk', 'garlic cloves', 'olive oil', 'butter', 'flour', 'egg', 'sugar',
+         'water', 'black pepper', 'lemon juice', 'baking soda', 'tomatoes', 'vanilla extract']
+
+def check():
+    mismatches = 0
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        expected = {q: old_parse_quantity(q) for q in QUANTITIES}
+    for q, old in expected.items():
+        new = parse_quantity(q)
+        if (new or 0) != old:
+            mismatches += 1
+            print(f"  ❌ {q!r}: old {old!r}, new {new!r}")
+    print(f"parse_quantity agrees with the old parser on {len(QUANTITIES) - mismatches}/{len(QUANTITIES)} inputs")
+    for q in EXTRA:
+        print(f"  {q!r:22} -> {parse_amount(q)}")
+    return mismatches == 0
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    ok = check()
+
+    rng = random.Random(3)
+    quantities = [rng.choice(QUANTITIES) for _ in range(rows)]
+    parts = [rng.choice(PARTS) for _ in range(rows)]
+    print(f"\n{rows} quantities")
+
+    start = time.perf_counter()
+    for q in quantities:
+        eval_quantity(q)
+    print(f"  {'eval':30} {time.perf_counter() - start:6.2f} s")
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        for q in quantities:
+            old_parse_quantity(q)
+        elapsed = time.perf_counter() - start
+    print(f"  {'old parse_quantity (>/dev/null)':30} {elapsed:6.2f} s")
+
+    parse_amount.cache_clear()
+    start = time.perf_counter()
+    for q in quantities:
+        parse_quantity(q)
+    print(f"  {'parse_quantity':30} {time.perf_counter() - start:6.2f} s")
+
+    parse_amount.cache_clear()
+    start = time.perf_counter()
+    values, units = parse_quantities(quantities)
+    grams = to_grams(values, units, parts)
+    print(f"  {'parse_quantities + to_grams':30} {time.perf_counter() - start:6.2f} s"
+          f"  ({pd.Series(grams).sum() / rows:.1f} g per ingredient on average)")
+    if not ok:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Check the R vector parser against its corpus and benchmark it.
+
+Every case in r_vector_corpus.json must pass; the three parsers it replaced
+are scored on the same corpus for comparison. The throughput run parses a
+Food.com-shaped column set (Keywords repeat a lot, instructions are long)
+row by row and column-wise.
+
+Usage: python bench_r_vectors.py [rows]
+"""
+import ast
+import json
+import random
+import re
+import sys
+import time
+
+import pandas as pd
+
+from r_vectors import parse_r_column, parse_r_vector
+
+CORPUS_FILE = 'r_vector_corpus.json'
+REPEATS = 3
+
+def new_parse_r_list(r_string):
+    """new.parse_r_list before the shared parser"""
+    if pd.isna(r_string) or r_string == "character(0)":
+        return []
+    if not isinstance(r_string, str):
+        return r_string if isinstance(r_string, list) else []
+    if r_string.startswith('c('):
+        content = r_string[3:-2]
+        return [item.replace('\\"', '"') for item in content.split('", "')]
+    return [r_string]
+
+def json2json_parse_r_list(r_string):
+    """json2json.parse_r_list before the shared parser"""
+    if isinstance(r_string, str) and r_string.startswith("c("):
+        return re.findall(r'"(.*?)"', r_string)
+    return []
+
+def upload_recipes_parse_column(value):
+    """upload_recipes.parse_column before the shared parser"""
+    try:
+        if isinstance(value, str) and value.startswith('c('):
+            return ast.literal_eval(value[1:].replace('c', '').strip())
+        elif isinstance(value, str):
+            return ast.literal_eval(value)
+        else:
+            return value
+    except Exception:
+        return []
+
+OLD_PARSERS = {
+    'new.parse_r_list': new_parse_r_list,
+    'json2json.parse_r_list': json2json_parse_r_list,
+    'upload_recipes.parse_column': upload_recipes_parse_column,
+}
+
+def check_corpus():
+    with open(CORPUS_FILE, encoding='utf-8') as f:
+        corpus = json.load(f)
+    failures = 0
+    for case in corpus:
+        value = float('nan') if case.get('input_is_nan') else case['input']
+        try:
+            got = parse_r_vector(value, case.get('drop_na', False), case.get('strict', False))
+            ok = not case.get('error') and got == case['expected']
+        except ValueError as e:
+            got, ok = e, case.get('error', False)
+        if not ok:
+            failures += 1
+            print(f"  ❌ {value!r}: got {got!r}, expected {case.get('expected', 'ValueError')!r}")
+    print(f"parse_r_vector: {len(corpus) - failures}/{len(corpus)} corpus cases pass")
+
+    plain = [case for case in corpus if not case.get('strict') and not case.get('drop_na')]
+    for name, parser in OLD_PARSERS.items():
+        passed = 0
+        for case in plain:
+            value = float('nan') if case.get('input_is_nan') else case['input']
+            try:
+                passed += parser(value) == case['expected']
+            except Exception:
+                pass
+        print(f"  old {name:28} {passed}/{len(plain)}")
+    return failures == 0
+
+def synthetic_columns(rows, seed=9):
+    rng = random.Random(seed)
+    keywords = ['"Easy"', '"< 60 Mins"', '"Vegan"', '"Dessert"', '"Beginner Cook"', '"Healthy"']
+    columns = {'Keywords': [], 'RecipeIngredientParts': [], 'RecipeIngredientQuantities': [],
+               'RecipeInstructions': []}
+    for _ in range(rows):
+        columns['Keywords'].append('c(' + ', '.join(rng.sample(keywords, 3)) + ')')
+        n = rng.randint(4, 12)
+        columns['RecipeIngredientParts'].append(
+            'c(' + ', '.join(f'"ingredient {rng.randrange(3000)}"' for _ in range(n)) + ')')
+        columns['RecipeIngredientQuantities'].append(
+            'c(' + ', '.join(rng.choice(['"1"', '"1/2"', '"2"', 'NA', '"1 1/2"']) for _ in range(n)) + ')')
+        columns['RecipeInstructions'].append(
+            'c(' + ', '.join(f'"Step {s}: stir the \\"mix\\" well, then rest."' for s in range(rng.randint(3, 9))) + ')')
+    return {name: pd.Series(values) for name, values in columns.items()}
+
+def best_of(run, repeats=REPEATS):
+    """Fastest of several runs, so a busy machine doesn't decide the ranking"""
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    ok = check_corpus()
+
+    columns = synthetic_columns(rows)
+    cells = rows * len(columns)
+    print(f"\n{rows} rows x {len(columns)} columns")
+    timings = dict(OLD_PARSERS, parse_r_vector=parse_r_vector)
+    for name, parser in timings.items():
+        elapsed = best_of(lambda: [parser(value) for column in columns.values() for value in column])
+        print(f"  {name:28} {elapsed:6.2f} s  {cells / elapsed / 1000:7.0f}k cells/s")
+    elapsed = best_of(lambda: [parse_r_column(column) for column in columns.values()])
+    print(f"  {'parse_r_column':28} {elapsed:6.2f} s  {cells / elapsed / 1000:7.0f}k cells/s")
+    if not ok:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
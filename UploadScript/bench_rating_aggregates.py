@@ -0,0 +1,126 @@
+"""Benchmark rating aggregates kept by transaction against recounting every review.
+
+Seeds an in-memory Firestore with recipes holding anywhere from a handful to
+thousands of reviews. The recount is what the app did on every review: read
+the whole reviews subcollection, then write the mean and count. The
+transaction reads the recipe and the one review it changes. Then several
+threads run random inserts, edits and deletes, a few recipes taking most of
+them so transactions collide and retry. A transaction that still collides
+after its last attempt gives up without writing, as the app would report a
+failed submit. Afterwards reconcile must find no drift. Finally some recipes get corrupted aggregates and one loses its sums,
+and reconcile must find exactly those, fix them, and find nothing on a
+second pass.
+
+Usage: python bench_rating_aggregates.py [recipes] [operations] [latency_ms]
+"""
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import rating_aggregates
+from fake_firestore import FakeFirestore
+from rating_aggregates import delete_review, rating_fields, submit_review
+from upload_logging import setup_logging
+
+THREADS = 8
+HOT_RECIPES = 20            # Recipes taking half of the random operations
+
+def review(rating):
+    return {'AuthorName': 'cook', 'Rating': float(rating), 'Review': 'Nice.'}
+
+def seeded_db(num_recipes, rng):
+    db = FakeFirestore()
+    for i in range(num_recipes):
+        ratings = [rng.randint(0, 5) for _ in range(int(rng.paretovariate(1.2) * 5))]
+        for author, rating in enumerate(ratings):
+            db._write(f'recipes/r{i}/reviews/a{author}', review(rating))
+        db._write(f'recipes/r{i}', {'Name': f'Recipe {i}', **rating_fields(
+            len(ratings), float(sum(ratings)), float(sum(r * r for r in ratings)))})
+    db.reads = db.writes = db.rpcs = 0
+    return db
+
+def recount(db, recipe_id, author_id, data):
+    """The old client path: write the review, then average every review of the recipe"""
+    recipe_ref = db.collection('recipes').document(recipe_id)
+    recipe_ref.collection('reviews').document(author_id).set(data)
+    ratings = [doc.get('Rating') for doc in recipe_ref.collection('reviews').stream()]
+    recipe_ref.update({'AggregatedRating': sum(ratings) / len(ratings), 'ReviewCount': len(ratings)})
+
+def per_update(label, db, update, recipe_ids, rng):
+    reads, rpcs = db.reads, db.rpcs
+    start = time.perf_counter()
+    for recipe_id in recipe_ids:
+        update(db, recipe_id, f'a{rng.randrange(10)}', review(rng.randint(0, 5)))
+    elapsed = (time.perf_counter() - start) / len(recipe_ids)
+    print(f"  {label:14} {(db.reads - reads) / len(recipe_ids):9,.1f} reads  "
+          f"{(db.rpcs - rpcs) / len(recipe_ids):4.1f} RPCs  {elapsed * 1000:7.1f} ms per update")
+
+def random_operations(db, num_recipes, count, seed):
+    """Runs count random changes; returns how many gave up after colliding on every attempt"""
+    rng = random.Random(seed)
+    gave_up = 0
+    for _ in range(count):
+        hot = rng.random() < 0.5
+        recipe_id = f'r{rng.randrange(HOT_RECIPES if hot else num_recipes)}'
+        author_id = f'a{rng.randrange(40)}'
+        try:
+            if rng.random() < 0.3:
+                delete_review(db, recipe_id, author_id)
+            else:
+                submit_review(db, recipe_id, author_id, review(rng.randint(0, 5)))
+        except ValueError:
+            gave_up += 1
+    return gave_up
+
+def main():
+    num_recipes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    num_operations = int(sys.argv[2]) if len(sys.argv) > 2 else 4000
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 1) / 1000
+    setup_logging([], level='WARNING')
+    rng = random.Random(22)
+    db = seeded_db(num_recipes, rng)
+    sizes = sorted(((len(db._docs(f'recipes/{recipe_id}/reviews')), recipe_id) for recipe_id in db._docs('recipes')),
+                   reverse=True)
+    print(f"{num_recipes} recipes, {sum(size for size, _ in sizes):,} reviews, the largest {sizes[0][0]:,}; "
+          f"{latency * 1000:.0f} ms per RPC")
+
+    db.latency = latency
+    for label, recipe_ids in [('typical recipe', [sizes[len(sizes) // 2][1]] * 50),
+                              ('top 1% recipes', [recipe_id for _, recipe_id in sizes[:max(1, len(sizes) // 100)]])]:
+        print(f"Per update, {label}:")
+        per_update('recount', db, recount, recipe_ids, rng)
+        per_update('transaction', db, submit_review, recipe_ids, rng)
+
+    # The recount path leaves no sums behind; put them back before the random run
+    rating_aggregates.reconcile(db)
+    rpcs = db.rpcs
+    start = time.perf_counter()
+    with ThreadPoolExecutor(THREADS) as pool:
+        gave_up = sum(pool.map(lambda seed: random_operations(db, num_recipes, num_operations // THREADS, seed),
+                               range(THREADS)))
+    elapsed = time.perf_counter() - start
+    print(f"{num_operations:,} random inserts, edits and deletes on {THREADS} threads: {elapsed:.1f} s, "
+          f"{(db.rpcs - rpcs) / num_operations:.2f} RPCs each (retries included), {gave_up} gave up")
+    db.latency = 0
+    drift = rating_aggregates.reconcile(db, fix=False)
+    ok = not drift
+    print(f"  {'✅' if ok else '❌'} {len(drift)} recipes drifted from a full recount")
+
+    corrupted = sorted(rng.sample(sorted(db._docs('recipes')), 50))
+    for recipe_id in corrupted[1:]:
+        db._write(f'recipes/{recipe_id}', {'ReviewCount': rng.randint(0, 99)}, merge=True)
+    legacy = db._docs('recipes')[corrupted[0]][0]
+    del legacy['RatingSum'], legacy['RatingSumSquares'], legacy['BayesianRating']
+    start = time.perf_counter()
+    found = rating_aggregates.reconcile(db)
+    elapsed = time.perf_counter() - start
+    after = rating_aggregates.reconcile(db, fix=False)
+    fixed = found == corrupted and not after
+    print(f"Reconcile found {len(found)} of {len(corrupted)} corrupted recipes in {elapsed:.2f} s: "
+          f"{'✅ all fixed' if fixed else f'❌ {len(after)} still drifted'}")
+    if not (ok and fixed):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""Benchmark the pre-upload duplicate check.
+
+Compares one Name query per input recipe (the old loop) with RecipeKeys
+built from one read of the collection and with RecipeKeys loaded from the
+local cache, which costs one count aggregation to revalidate. Half of the
+input recipes already exist. A second run, without
+Firestore, times the in-memory check at Food.com scale.
+
+Usage: python bench_recipe_dedup.py [existing] [input] [latency_ms]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from fake_firestore import FakeFirestore
+from recipe_dedup import RecipeKeys, recipe_key
+
+def names(count, seed):
+    rng = random.Random(seed)
+    words = ['chicken', 'bread', 'banana', 'easy', 'spicy', 'creamy', 'soup', 'cake', 'salad',
+             'grandma\'s', 'baked', 'pasta', 'lemon', 'garlic', 'quick', 'vegan']
+    return [f"{' '.join(rng.sample(words, 3)).title()} {i}" for i in range(count)]
+
+def main():
+    num_existing = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    num_input = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 20) / 1000
+
+    existing = names(num_existing, 1)
+    db = FakeFirestore(latency=latency)
+    for i, name in enumerate(existing):
+        db._write(f'recipes/{i}', {'Name': name, 'RecipeIngredientParts': ['salt', 'butter']})
+    # Half already uploaded, in a different case and spacing
+    recipes = [{'name': '  ' + name.upper(), 'ingredients': []} for name in existing[:num_input // 2]]
+    recipes += [{'name': name, 'ingredients': []} for name in names(num_input - len(recipes), 2)]
+    cache = os.path.join(tempfile.mkdtemp(), 'keys.npz')
+    print(f"{num_input} input recipes against {num_existing} existing, {latency * 1000:.0f} ms per RPC")
+
+    db.rpcs = 0
+    start = time.perf_counter()
+    fresh = [r for r in recipes if not db.collection('recipes').where('Name', '==', r['name']).limit(1).get()]
+    print(f"  query per recipe: {time.perf_counter() - start:7.2f} s  {db.rpcs:6d} RPCs  "
+          f"{len(recipes) - len(fresh)} duplicates (exact Name only)")
+
+    for label in ('cold cache', 'warm cache'):
+        db.rpcs = 0
+        start = time.perf_counter()
+        keys = RecipeKeys.load(db, path=cache)
+        fresh = list(keys.filter(recipes))
+        print(f"  {label + ':':17} {time.perf_counter() - start:7.2f} s  {db.rpcs:6d} RPCs  "
+              f"{len(recipes) - len(fresh)} duplicates")
+        if label == 'cold cache':
+            os.utime(cache)
+
+    scale = 500_000
+    start = time.perf_counter()
+    keys = RecipeKeys(recipe_key(name) for name in names(scale, 3))
+    keys.save(cache)
+    built = time.perf_counter() - start
+    start = time.perf_counter()
+    keys = RecipeKeys.read(cache)
+    loaded = time.perf_counter() - start
+    incoming = [{'name': name} for name in names(scale, 4)]
+    start = time.perf_counter()
+    fresh = sum(1 for _ in keys.filter(incoming))
+    checked = time.perf_counter() - start
+    print(f"  {scale} keys: build {built:.2f} s, cache load {loaded:.2f} s, "
+          f"check {scale} inputs {checked:.2f} s ({os.path.getsize(cache) / 1e6:.1f} MB cache)")
+    os.remove(cache)
+
+if __name__ == '__main__':
+    main()
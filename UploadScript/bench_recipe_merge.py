@@ -0,0 +1,121 @@
+"""Benchmark the keyed field merge of update_reco[es_complete.py against the old loop.
+
+Seeds an in-memory Firestore with recipes, most under the ids
+upload_recipes_batch derives and some under older random ids, and writes a
+cleaned_recipes.json for them. In that file some recipes have changed
+fields, their nutrition among them, and a few name recipes that were never
+uploaded. The old loop (one
+name query, one update and a 50 ms sleep per recipe) runs on a sample and is
+extrapolated. The merge runs as a dry run, then for real, then again. The
+dry run must write nothing and predict exactly the changed recipes. The real
+run must leave every matched recipe holding its cleaned fields and its
+nutrition totals as they were. The rerun must find nothing to write.
+
+Usage: python bench_recipe_merge.py [recipes] [latency_ms]
+"""
+import importlib
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+from bench_upload_pipeline import synthetic_recipes
+from fake_firestore import FakeFirestore
+from nutrition import RECIPE_FIELDS
+from upload_logging import setup_logging
+from upload_recipes_batch import recipe_doc_id
+
+merge = importlib.import_module('update_reco[es_complete')
+
+SERIAL_SAMPLE = 200
+LEGACY = 0.2                # Recipes stored under random ids from before recipe_doc_id
+CHANGED = 0.3               # Recipes whose cleaned fields differ from what is stored
+MISSING = 0.01              # Cleaned recipes that were never uploaded
+
+def cleaned_recipes(count, rng):
+    recipes = synthetic_recipes(count)
+    for recipe in recipes:
+        recipe['images'] = [f'https://img.example/{recipe["name"]}.jpg']
+        for field in RECIPE_FIELDS:
+            recipe[field[0].lower() + field[1:]] = round(rng.uniform(0, 800), 1)
+    return recipes
+
+def seeded_db(recipes, rng):
+    """(store, ids of the recipes whose cleaned fields will differ); recipes are edited in place to differ"""
+    db = FakeFirestore()
+    changed = set()
+    for recipe in recipes:
+        if rng.random() < MISSING:
+            recipe['name'] += ' (new)'
+            continue
+        recipe_id = recipe_doc_id(recipe) if rng.random() > LEGACY else uuid.uuid4().hex[:20]
+        db._write(f'recipes/{recipe_id}', {'Id': recipe_id, 'Name': recipe['name'],
+                                           **merge.recipe_update(recipe), 'Calories': recipe['calories']})
+        if rng.random() < CHANGED:
+            recipe['calories'] += 10
+            recipe['instructions'] = recipe['instructions'] + ['Serve warm.']
+            changed.add(recipe_id)
+    db.reads = db.writes = db.rpcs = 0
+    return db, changed
+
+def old_loop(db, recipes):
+    """The per-recipe loop the script ran before: one name query, one update and a pause each"""
+    for recipe in recipes:
+        docs = list(db.collection('recipes').where('Name', '==', recipe['name']).limit(1).stream())
+        if docs:
+            docs[0].reference.update(merge.recipe_update(recipe))
+        time.sleep(0.05)
+
+def wrong_recipes(db, recipes, changed):
+    """Recipes whose merged fields differ from the file, or whose Calories the merge overwrote"""
+    wrong = 0
+    for data, _ in db._docs('recipes').values():
+        recipe = recipes[data['Name']]
+        calories = recipe['calories'] - 10 if data['Id'] in changed else recipe['calories']
+        wrong += bool(merge.field_diff(data, merge.recipe_update(recipe))) or not math.isclose(data['Calories'], calories)
+    return wrong
+
+def main():
+    num_recipes = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    setup_logging([], level='WARNING')
+    rng = random.Random(23)
+    recipes = cleaned_recipes(num_recipes, rng)
+    db, changed = seeded_db(recipes, rng)
+    path = os.path.join(tempfile.mkdtemp(), 'cleaned_recipes.json')
+    with open(path, 'w') as f:
+        json.dump(recipes, f)
+    print(f"{num_recipes} recipes, {len(changed)} changed, {latency * 1000:.0f} ms per RPC")
+
+    sample_db, _ = seeded_db(cleaned_recipes(SERIAL_SAMPLE, random.Random(23)), random.Random(23))
+    sample_db.latency = latency
+    start = time.perf_counter()
+    old_loop(sample_db, recipes[:SERIAL_SAMPLE])
+    scale = num_recipes / SERIAL_SAMPLE
+    print(f"  {f'old loop (x{scale:.0f} from {SERIAL_SAMPLE})':30} {(time.perf_counter() - start) * scale:8.1f} s  "
+          f"{int(sample_db.writes * scale):>7,} writes  {int(sample_db.rpcs * scale):>7,} RPCs")
+
+    db.latency = latency
+    ok = True
+    for label, dry_run in [('merge --dry-run', True), ('merge', False), ('merge again', False)]:
+        writes, rpcs = db.writes, db.rpcs
+        start = time.perf_counter()
+        fields = merge.merge_recipes(db, path, dry_run=dry_run)
+        elapsed = time.perf_counter() - start
+        print(f"  {label:30} {elapsed:8.1f} s  {db.writes - writes:>7,} writes  {db.rpcs - rpcs:>7,} RPCs  "
+              f"{sum(fields.values()):,} fields changed")
+        expected = {} if label == 'merge again' else {'RecipeInstructions': len(changed)}
+        ok = ok and dict(fields) == expected and db.writes - writes == (0 if dry_run else sum(expected.values()))
+    wrong = wrong_recipes(db, {recipe['name']: recipe for recipe in recipes}, changed)
+    ok = ok and not wrong
+    print(f"{'✅' if ok else '❌'} Dry run predicted the writes, the merge wrote only changed recipes, "
+          f"{wrong} recipes differ from the file")
+    if not ok:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
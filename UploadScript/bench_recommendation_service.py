@@ -0,0 +1,72 @@
+"""Benchmark the multi-tenant recommendation scheduler against an in-memory Firestore.
+
+Usage: python bench_recommendation_service.py [users] [recipes] [latency_ms]
+"""
+import random
+import sys
+import time
+
+import recommendation_system
+from fake_firestore import FakeFirestore
+from recipe_index import RecipeIndex
+from recipe_scoring import ScoringEngine
+
+KEYWORDS = ['Easy', '< 60 Mins', 'Vegan', 'Dessert', 'Chicken', 'Breakfast', 'Low Protein',
+            'Beginner Cook', 'Healthy', 'Kid Friendly', 'Spicy', 'Asian', 'Mexican', 'Baking']
+INGREDIENTS = [f'ingredient {i}' for i in range(500)]
+
+def seed(db, num_users, num_recipes):
+    rng = random.Random(42)
+    for i in range(num_recipes):
+        rid = str(i)
+        db._write(f'recipes/{rid}', {
+            'Id': rid,
+            'Keywords': rng.sample(KEYWORDS, 3),
+            'RecipeIngredientParts': rng.sample(INGREDIENTS, 8),
+        })
+    for u in range(num_users):
+        uid = f'user{u}'
+        for rid in rng.sample(range(num_recipes), 10):
+            db._write(f'users/{uid}/recipes/viewed/items/{rid}', {'recipeId': str(rid)})
+    db.reads = db.writes = db.rpcs = 0
+
+def quiet_refresh(db, user_ids, engine):
+    interactions = recommendation_system.read_interactions(db, user_ids, engine.index)
+    recommendations = recommendation_system.generate_recommendations(engine, interactions)
+    batch = db.batch()
+    for user_id, recipe_ids in recommendations.items():
+        batch.set(db.collection('users').document(user_id).collection('recommendations').document('list'), {
+            'recipeIds': recipe_ids,
+        })
+    batch.commit()
+
+def run(num_users, num_recipes, latency, max_workers):
+    db = FakeFirestore(latency=latency)
+    seed(db, num_users, num_recipes)
+    index = RecipeIndex()
+    index.refresh(db)
+    engine = ScoringEngine(index)
+    engine.matrix()
+    db.reads = 0
+    scheduler = recommendation_system.RecommendationScheduler(
+        db, lambda db, user_ids: quiet_refresh(db, user_ids, engine), max_workers=max_workers,
+        batch_size=max(1, num_users // max_workers))
+    start = time.perf_counter()
+    scheduler.discover_users()
+    while scheduler.refreshes + scheduler.errors < num_users:
+        scheduler.run_pending(timeout=0.01)
+    scheduler.wait_idle()
+    elapsed = time.perf_counter() - start
+    scheduler.shutdown()
+    return elapsed, db.reads
+
+if __name__ == '__main__':
+    num_users = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    num_recipes = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    latency = (float(sys.argv[3]) if len(sys.argv) > 3 else 5) / 1000
+
+    print(f"{num_users} users, {num_recipes} recipes, {latency * 1000:.0f} ms per RPC")
+    for workers in (1, 4, 8, 16):
+        elapsed, reads = run(num_users, num_recipes, latency, workers)
+        print(f"workers={workers:>2}: {num_users / elapsed:8.1f} refreshes/s "
+              f"({elapsed:.2f}s, {reads} document reads)")
@@ -0,0 +1,98 @@
+"""Benchmark peak memory of whole-file loads against the streaming readers.
+
+Writes a synthetic Food.com-shaped recipe dump as a JSON array, as JSON
+Lines and as CSV. Each reader then runs in a fresh child process that
+touches every record, and the child's peak RSS is reported.
+
+Usage: python bench_record_stream.py [recipes]
+"""
+import csv
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from record_stream import iter_csv, iter_json_array, iter_json_lines
+
+READERS = {
+    'json.load': lambda path: json.load(open(path)),
+    'iter_json_array': iter_json_array,
+    'iter_json_lines': iter_json_lines,
+    'pd.read_csv': lambda path: pd.read_csv(path).to_dict('records'),
+    'iter_csv': iter_csv,
+}
+
+def synthetic_recipe(i, rng):
+    parts = [f'ingredient {rng.randrange(5000)}' for _ in range(9)]
+    return {
+        'Id': i,
+        'Name': f'Recipe {i}',
+        'CookTime': 'PT30M',
+        'PrepTime': 'PT15M',
+        'RecipeCategory': 'Dessert',
+        'Keywords': 'c("Easy", "< 60 Mins", "Beginner Cook")',
+        'RecipeIngredientQuantities': 'c(' + ', '.join(f'"{rng.randint(1, 4)}"' for _ in parts) + ')',
+        'RecipeIngredientParts': 'c(' + ', '.join(f'"{p}"' for p in parts) + ')',
+        'RecipeInstructions': 'c(' + ', '.join(f'"Step {s}: ' + 'stir well ' * 8 + '"' for s in range(6)) + ')',
+        'AggregatedRating': rng.choice([None, 4.5]),
+        'Calories': rng.uniform(50, 900),
+    }
+
+def write_files(num_recipes, directory):
+    rng = random.Random(5)
+    recipes = (synthetic_recipe(i, rng) for i in range(num_recipes))
+    paths = {ext: os.path.join(directory, f'recipes.{ext}') for ext in ('json', 'jsonl', 'csv')}
+    with open(paths['json'], 'w') as fa, open(paths['jsonl'], 'w') as fl, open(paths['csv'], 'w', newline='') as fc:
+        writer = None
+        fa.write('[')
+        for i, recipe in enumerate(recipes):
+            fa.write((',\n' if i else '\n') + json.dumps(recipe, indent=2))
+            fl.write(json.dumps(recipe) + '\n')
+            if writer is None:
+                writer = csv.DictWriter(fc, fieldnames=list(recipe))
+                writer.writeheader()
+            writer.writerow(recipe)
+        fa.write('\n]')
+    return paths
+
+def child(reader, path):
+    start = time.perf_counter()
+    count = sum(1 for _ in READERS[reader](path))
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+    print(json.dumps({'count': count, 'seconds': elapsed, 'peak_mb': peak}))
+
+def main():
+    num_recipes = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_files(num_recipes, directory)
+        for ext, path in paths.items():
+            print(f"{ext:5} {os.path.getsize(path) / 1e6:7.1f} MB, {num_recipes} recipes")
+        # Baseline: interpreter plus imports, no data
+        for reader in ['(imports only)'] + list(READERS):
+            if reader == '(imports only)':
+                args = ['-c', 'import resource, record_stream; '
+                              'print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)']
+            else:
+                ext = 'csv' if 'csv' in reader else ('jsonl' if 'lines' in reader else 'json')
+                args = [__file__, '--child', reader, paths[ext]]
+            out = subprocess.run([sys.executable] + args, capture_output=True, text=True, check=True,
+                                 cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+            if reader == '(imports only)':
+                print(f"  {reader:16} peak {float(out):7.1f} MB")
+                continue
+            result = json.loads(out)
+            assert result['count'] == num_recipes
+            print(f"  {reader:16} peak {result['peak_mb']:7.1f} MB  {result['seconds']:6.2f} s")
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,163 @@
+"""Crash bulk jobs partway through and check that --resume finishes them exactly once.
+
+Each job runs against an in-memory Firestore that raises Crash on a chosen
+RPC, at about 80% of the way through (see fake_firestore.FaultyFirestore). The job is then resumed against the
+same store with the fault removed. The check is that every item ends up
+written once, under the same document ids as a clean run, and that the
+resumed run only does the remaining work.
+
+    upload_recipes_batch   recipes, batched through BatchWriter
+    update_reviews         one review transaction per input line
+    randomize_ingredients  per-ingredient updates, then the nutrition delta
+
+Usage: python bench_resume.py [recipes] [reviews]
+"""
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+import randomize_ingredients
+import update_reviews
+import upload_recipes_batch
+from bench_upload_pipeline import reset_local_state, seeded_db, synthetic_recipes
+from checkpoint import CHECKPOINT_FILE
+from fake_firestore import Crash, FaultyFirestore
+from ingest_pipeline import BATCH_SIZE
+from nutrition import NUTRIENTS, RECIPE_FIELDS, NutritionTable, recipe_fields
+from upload_logging import setup_logging
+
+def quiet():
+    """Swallows the per-item prints of the older scripts"""
+    stack = contextlib.ExitStack()
+    stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+    stack.enter_context(contextlib.redirect_stderr(io.StringIO()))
+    return stack
+
+def crash_and_resume(db, job, fail_at=None, fail_after_writes=None):
+    """Runs job(resume=False) until it crashes, then job(resume=True)
+
+    Returns the writes before the crash, and the writes, RPCs and seconds of the resumed run.
+    """
+    db.fail_at, db.fail_after_writes = fail_at, fail_after_writes
+    try:
+        job(resume=False)
+    except Crash:
+        pass
+    else:
+        raise AssertionError('The injected crash did not happen')
+    first = db.writes
+    db.writes = db.rpcs = 0
+    start = time.perf_counter()
+    job(resume=True)
+    return first, db.writes, db.rpcs, time.perf_counter() - start
+
+def report(name, ok, detail):
+    print(f"  {name:22} {'✅' if ok else '❌'} {detail}")
+    return ok
+
+def check_recipes(num_recipes, directory):
+    path = os.path.join(directory, 'recipes.json')
+    with open(path, 'w') as f:
+        json.dump(synthetic_recipes(num_recipes), f)
+
+    clean = FaultyFirestore(source=seeded_db(0))
+    reset_local_state()
+    with quiet():
+        upload_recipes_batch.upload_recipes(clean, path, progress=False)
+    expected = set(clean._docs('recipes'))
+    total_writes, total_rpcs = clean.writes, clean.rpcs
+
+    db = FaultyFirestore(source=seeded_db(0))
+    reset_local_state()
+    job = lambda resume: upload_recipes_batch.upload_recipes(db, path, progress=False, resume=resume)
+    with quiet():
+        first, second, rpcs, elapsed = crash_and_resume(db, job, fail_after_writes=int(total_writes * 0.8))
+    ids = set(db._docs('recipes'))
+    # The resumed run writes what the crash left, give or take the batch that died with it
+    redone = first + second - total_writes
+    return report('upload_recipes_batch', ids == expected and len(db._docs('recipes')) == num_recipes
+                  and redone <= BATCH_SIZE and second <= 0.3 * total_writes and rpcs < total_rpcs,
+                  f"{len(ids)}/{num_recipes} recipes, same ids as a clean run; "
+                  f"{first:,} writes before the crash, {second:,} writes ({second / total_writes:.0%}) and "
+                  f"{rpcs:,} RPCs ({rpcs / total_rpcs:.0%}) on resume, {redone:,} redone ({elapsed:.2f} s)")
+
+def check_reviews(num_reviews, directory):
+    path = os.path.join(directory, 'reviews.json')
+    reviews = [{'Name': f'Recipe {i % 300}', 'AuthorId': 1000 + i, 'AuthorName': f'Author {i}',
+                'Rating': 1 + i % 5, 'Review': 'Tasty.', 'DateSubmitted': '2020-01-02T03:04:05Z',
+                'DateModified': '2020-01-02T03:04:05Z'} for i in range(num_reviews)]
+    with open(path, 'w') as f:
+        json.dump(reviews, f)
+    db = FaultyFirestore()
+    for i in range(300):
+        db._write(f'recipes/r{i}', {'Name': f'Recipe {i}'})
+    db.writes = 0
+    job = lambda resume: update_reviews.upload_reviews(db, path, os.path.join(directory, 'failed.json'), resume)
+    # A query, two reads and a commit each; the commit writes the review and its recipe
+    first, second, _, elapsed = crash_and_resume(db, job, int(4 * num_reviews * 0.8))
+    stored = sum(len(db._docs(f'recipes/r{i}/reviews')) for i in range(300))
+    counted = sum(data['ReviewCount'] for data, _ in db._docs('recipes').values())
+    return report('update_reviews', stored == counted == num_reviews and first + second <= 2 * (num_reviews + 1),
+                  f"{stored}/{num_reviews} reviews; {first:,} writes before the crash, {second:,} on resume "
+                  f"({elapsed:.2f} s)")
+
+def check_randomize(num_recipes):
+    rng = random.Random(20)
+    db = FaultyFirestore()
+    ingredients = {}
+    for i in range(500):
+        data = {'name': f'Ingredient {i}', 'name_lower': f'ingredient {i}'}
+        data.update({field: (0.0 if i % 2 else round(rng.uniform(1, 400), 2)) for field in NUTRIENTS})
+        ingredients[f'ing{i:03d}'] = data
+        db._write(f'ingredients_list/ing{i:03d}', data)
+    table = NutritionTable.from_ingredients(ingredients.items())
+    for i in range(num_recipes):
+        ids = rng.sample(list(ingredients), 6)
+        grams = [rng.randint(5, 300) for _ in ids]
+        db._write(f'recipes/recipe{i}', {
+            'RecipeIngredientParts': [ingredients[ing_id]['name'] for ing_id in ids],
+            'RecipeIngredientQuantities': grams,
+            **recipe_fields(table.recipe_totals([(table.rows[ing_id], g) for ing_id, g in zip(ids, grams)])),
+        })
+    db.writes = 0
+    # Three streams come first (the usage index and the ingredients), then one update per zeroed ingredient
+    with quiet():
+        first, second, _, elapsed = crash_and_resume(
+            db, lambda resume: randomize_ingredients.randomize_zeros_in_ingredients(db, resume), 3 + 200)
+
+    current = {ing_id: data for ing_id, (data, _) in db._docs('ingredients_list').items()}
+    table = NutritionTable.from_ingredients((data['name_lower'], data) for data in current.values())
+    wrong = 0
+    for data, _ in db._docs('recipes').values():
+        expected = table.recipe_totals([(table.rows[name.lower()], g) for name, g in
+                                        zip(data['RecipeIngredientParts'], data['RecipeIngredientQuantities'])])
+        if any(not math.isclose(data[f] or 0, e, rel_tol=1e-9, abs_tol=1e-6)
+               for f, e in zip(RECIPE_FIELDS, expected)):
+            wrong += 1
+    still_zero = sum(1 for data in current.values() if data['calories'] == 0)
+    return report('randomize_ingredients', not wrong and not still_zero,
+                  f"{len(current) - still_zero}/{len(current)} ingredients filled, {wrong} recipes with stale "
+                  f"totals; {first:,} writes before the crash, {second:,} on resume ({elapsed:.2f} s)")
+
+def main():
+    num_recipes = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    num_reviews = int(sys.argv[2]) if len(sys.argv) > 2 else 3000
+    setup_logging([], level='WARNING')
+    directory = tempfile.mkdtemp()
+    os.chdir(directory)  # Checkpoints, snapshots and key caches land here
+    print("Crash at ~80%, then --resume:")
+    ok = check_recipes(num_recipes, directory)
+    ok = check_reviews(num_reviews, directory) and ok
+    ok = check_randomize(num_recipes) and ok
+    os.remove(CHECKPOINT_FILE)
+    if not ok:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark review ingestion: one query and one transaction per review against --bulk.
+
+Seeds an in-memory Firestore with recipes and writes a Food.com-shaped
+review file with some unknown recipe names and repeat authors. The serial
+loop runs on a sample and is extrapolated; the bulk mode runs on every
+review, once scanning the recipe names and once from a recipe export. Every
+RPC sleeps for the given latency. Afterwards the stored reviews must be the
+ones the serial loop writes, and in both modes each recipe's AggregatedRating
+and ReviewCount must match its reviews subcollection.
+
+Usage: python bench_reviews.py [reviews] [latency_ms]
+"""
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+import update_reviews
+from fake_firestore import FakeFirestore
+from record_stream import write_json_array
+from upload_logging import setup_logging
+
+NUM_RECIPES = 5000
+SERIAL_SAMPLE = 500
+
+def synthetic_reviews(count, seed=21):
+    rng = random.Random(seed)
+    for i in range(count):
+        # 1% name a recipe that was never uploaded; authors repeat now and then
+        recipe = rng.randrange(NUM_RECIPES) if rng.random() > 0.01 else NUM_RECIPES + i
+        yield {'ReviewId': i, 'RecipeId': recipe, 'AuthorId': rng.randrange(count // 3 + 1),
+               'AuthorName': f'cook {i}', 'Rating': rng.randint(0, 5), 'Review': 'Great recipe, will make again!',
+               'DateSubmitted': '2009-05-14T00:27:00Z', 'DateModified': '2009-05-15T10:00:00Z',
+               'Name': f'Recipe {recipe}'}
+
+def seeded_db(latency):
+    db = FakeFirestore()
+    for i in range(NUM_RECIPES):
+        db._write(f'recipes/{i:05d}', {'Id': f'{i:05d}', 'Name': f'Recipe {i}', 'AggregatedRating': 0,
+                                       'ReviewCount': 0})
+    db.reads = db.writes = db.rpcs = 0
+    db.latency = latency
+    return db
+
+def stored_reviews(db):
+    return {(path.split('/')[1], doc_id): data['Rating'] for path, docs in db._collections.items()
+            if path.endswith('/reviews') for doc_id, (data, _) in docs.items()}
+
+def wrong_aggregates(db):
+    reviews = {}
+    for (recipe_id, _), rating in stored_reviews(db).items():
+        reviews.setdefault(recipe_id, []).append(rating)
+    wrong = 0
+    for recipe_id, (data, _) in db._docs('recipes').items():
+        ratings = reviews.get(recipe_id, [])
+        mean = sum(ratings) / len(ratings) if ratings else 0
+        if data['ReviewCount'] != len(ratings) or not math.isclose(data['AggregatedRating'], mean):
+            wrong += 1
+    return wrong
+
+def run(label, db, job, count, scale=1):
+    rpcs = db.rpcs
+    start = time.perf_counter()
+    job()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:32} {elapsed * scale:8.1f} s  {count / elapsed:9,.0f} reviews/s  "
+          f"{int((db.rpcs - rpcs) * scale):>9,} RPCs")
+
+def main():
+    num_reviews = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+    setup_logging([], level='ERROR')  # Not the failed-review warnings
+    directory = tempfile.mkdtemp()
+    os.chdir(directory)  # Checkpoint and failed reviews land here
+    path = os.path.join(directory, 'reviews.json')
+    write_json_array(path, synthetic_reviews(num_reviews))
+    sample = os.path.join(directory, 'sample.json')
+    write_json_array(sample, synthetic_reviews(SERIAL_SAMPLE))
+    export = os.path.join(directory, 'recipes.json')
+    write_json_array(export, ({'Id': f'{i:05d}', 'Name': f'Recipe {i}'} for i in range(NUM_RECIPES)))
+    print(f"{num_reviews} reviews of {NUM_RECIPES} recipes, {latency * 1000:.0f} ms per RPC")
+
+    serial = seeded_db(latency)
+    scale = num_reviews / SERIAL_SAMPLE
+    run(f'serial (x{scale:.0f} from {SERIAL_SAMPLE})', serial,
+        lambda: update_reviews.upload_reviews(serial, sample), SERIAL_SAMPLE, scale)
+    bulk_sample = seeded_db(0)
+    update_reviews.upload_reviews_bulk(bulk_sample, sample)
+    same = stored_reviews(bulk_sample) == stored_reviews(serial)
+
+    ok = same and not wrong_aggregates(serial)
+    for label, options in [('bulk, name scan', {}), ('bulk, recipe export', {'export': export})]:
+        db = seeded_db(latency)
+        run(label, db, lambda: update_reviews.upload_reviews_bulk(db, path, **options), num_reviews)
+        wrong = wrong_aggregates(db)
+        ok = ok and not wrong
+        if wrong:
+            print(f"    ❌ {wrong} recipes have aggregates that don't match their reviews")
+    with open(update_reviews.FAILED_FILE) as f:
+        failed = len(json.load(f))
+    print(f"Bulk writes {'✅ the same' if same else '❌ different'} reviews as the serial loop; "
+          f"aggregates {'✅ match' if ok else '❌ differ'}; {failed} reviews of unknown recipes in failed_reviews.json")
+    if not ok:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
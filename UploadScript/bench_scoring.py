@@ -0,0 +1,104 @@
+"""Benchmark vectorized recommendation scoring against the per-recipe Python loop.
+
+Builds a synthetic catalog shaped like the Food.com recipes (a few very common
+keywords, a long tail of ingredients) and scores a batch of users.
+
+Usage: python bench_scoring.py [recipes] [users]
+"""
+import random
+import sys
+import time
+from collections import defaultdict
+
+from recipe_index import RecipeIndex
+from recipe_scoring import CosineScoringEngine, ScoringEngine
+
+COMMON_KEYWORDS = ['Easy', '< 60 Mins', '< 30 Mins', '< 15 Mins', 'Beginner Cook', 'Weeknight']
+RARE_KEYWORDS = [f'keyword {i}' for i in range(300)]
+INGREDIENTS = [f'ingredient {i}' for i in range(8000)]
+
+def synthetic_catalog(num_recipes, seed=7):
+    rng = random.Random(seed)
+    catalog = {}
+    for i in range(num_recipes):
+        keywords = rng.sample(COMMON_KEYWORDS, 2) + rng.sample(RARE_KEYWORDS, 3)
+        # Zipf-ish ingredient popularity, like salt/butter/eggs in the real data
+        ingredients = {INGREDIENTS[min(int(rng.paretovariate(1.1)) - 1, len(INGREDIENTS) - 1)]
+                       for _ in range(9)}
+        catalog[str(i)] = {'Id': str(i), 'Keywords': keywords,
+                           'RecipeIngredientParts': sorted(ingredients)}
+    return catalog
+
+def python_loop(catalog, interacted_ids):
+    """The scoring loop generate_recommendations() used before the index"""
+    interaction_keywords = defaultdict(int)
+    interaction_ingredients = defaultdict(int)
+    for recipe_id in interacted_ids:
+        data = catalog[recipe_id]
+        for kw in data.get("Keywords", []):
+            interaction_keywords[kw.lower()] += 1
+        for ing in data.get("RecipeIngredientParts", []):
+            interaction_ingredients[ing.lower()] += 1
+
+    scored = []
+    for recipe in catalog.values():
+        rid = recipe.get("Id")
+        if rid in interacted_ids:
+            continue
+        score = 0
+        for kw in recipe.get("Keywords", []):
+            score += interaction_keywords.get(kw.lower(), 0)
+        for ing in recipe.get("RecipeIngredientParts", []):
+            score += interaction_ingredients.get(ing.lower(), 0)
+        if score > 0:
+            scored.append((score, rid))
+
+    scored.sort(reverse=True)
+    return [rid for _, rid in scored[:20]]
+
+if __name__ == '__main__':
+    num_recipes = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    num_users = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    catalog = synthetic_catalog(num_recipes)
+    rng = random.Random(1)
+    interactions = [set(rng.sample(list(catalog), 30)) for _ in range(num_users)]
+
+    start = time.perf_counter()
+    index = RecipeIndex()
+    for rid, data in catalog.items():
+        index.upsert(rid, data, 1.0)
+    engine = ScoringEngine(index)
+    matrix, _ = engine.matrix()
+    print(f"index + CSR build: {time.perf_counter() - start:.2f}s "
+          f"({matrix.shape[0]} recipes x {matrix.shape[1]} features, {matrix.nnz} nonzeros)")
+
+    sample = interactions[:5]
+    start = time.perf_counter()
+    expected = [python_loop(catalog, ids) for ids in sample]
+    loop_per_user = (time.perf_counter() - start) / len(sample)
+    print(f"python loop:       {loop_per_user * 1000:8.1f} ms/user "
+          f"(~{loop_per_user * num_users:.0f}s for {num_users} users)")
+
+    profiles = [index.profile(ids) for ids in interactions]
+    start = time.perf_counter()
+    results = engine.score_batch(profiles, interactions, k=20)
+    elapsed = time.perf_counter() - start
+    print(f"vectorized batch:  {elapsed * 1000 / num_users:8.3f} ms/user "
+          f"({elapsed:.2f}s for {num_users} users)")
+
+    # Ties at the 20th place may be cut differently, so compare scores, not ids
+    def score(ids, rid):
+        profile = index.profile(ids)
+        return sum(profile.get(f, 0) for f in index.features[index.rows[rid]])
+    same = all([score(ids, r) for r in exp] == [score(ids, r) for r in got]
+               for ids, exp, got in zip(sample, expected, results))
+    print(f"top-20 scores match python loop: {same}")
+
+    cosine = CosineScoringEngine(index)
+    cosine.matrix()
+    start = time.perf_counter()
+    cosine.score_batch(profiles, interactions, k=20)
+    elapsed = time.perf_counter() - start
+    print(f"cosine batch:      {elapsed * 1000 / num_users:8.3f} ms/user "
+          f"({cosine.matrix()[0].nnz} nonzeros after pruning common features)")
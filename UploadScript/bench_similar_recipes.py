@@ -0,0 +1,70 @@
+"""Benchmark similar() lookups on a memory-mapped similarity index.
+
+Builds the index for a synthetic catalog (see bench_scoring) into a temporary
+directory, opens it and times the first query, which must not pay for a pass
+over the whole index, and then many random queries. Neighbour lists are then
+written to an in-memory Firestore from which one recipe was deleted after the
+build: every other recipe must still get its list.
+
+Usage: python bench_similar_recipes.py [recipes] [queries]
+"""
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from bench_scoring import synthetic_catalog
+from fake_firestore import FakeFirestore
+from recipe_index import RecipeIndex
+from similar_recipes import SimilarRecipes, build, write_neighbours
+
+TARGET_MS = 0.5             # Median query latency the index is meant to reach
+
+def timed(similar, recipe_id):
+    start = time.perf_counter()
+    similar.similar(recipe_id)
+    return (time.perf_counter() - start) * 1000
+
+if __name__ == '__main__':
+    num_recipes = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    num_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    catalog = synthetic_catalog(num_recipes)
+    index = RecipeIndex()
+    for rid, data in catalog.items():
+        index.upsert(rid, data, 1.0)
+    ok = True
+    with tempfile.TemporaryDirectory() as path:
+        start = time.perf_counter()
+        build(index, path)
+        print(f"build: {time.perf_counter() - start:.2f}s")
+
+        start = time.perf_counter()
+        similar = SimilarRecipes(path)
+        print(f"open:  {(time.perf_counter() - start) * 1000:.1f} ms")
+        rng = random.Random(3)
+        first = timed(similar, str(rng.randrange(num_recipes)))
+        latencies = np.array([timed(similar, str(rng.randrange(num_recipes))) for _ in range(num_queries)])
+        p50, p99 = np.percentile(latencies, [50, 99])
+        print(f"first query {first:.3f} ms, then p50 {p50:.3f} ms, p99 {p99:.3f} ms over {num_queries} queries")
+        # The first query used to build a dense inverse of every band, an O(recipes) pass
+        if first > 20 * max(p99, TARGET_MS):
+            print("❌ The first query is far slower than the rest")
+            ok = False
+        print(f"{'✅' if p50 <= TARGET_MS else '⚠️'} median {p50:.3f} ms against the {TARGET_MS} ms target")
+
+        db = FakeFirestore()
+        for rid in similar.rows:
+            db._write(f'recipes/{rid}', {'Name': rid})
+        db._delete('recipes/1')
+        write_neighbours(db, similar)
+        stored = sum(1 for doc in db.collection('recipes').stream() if 'SimilarRecipes' in doc.to_dict())
+        if stored != len(similar.rows) - 1 or db.collection('recipes').document('1').get().exists:
+            print(f"❌ {stored} of {len(similar.rows) - 1} recipes got neighbours")
+            ok = False
+        else:
+            print("✅ A recipe deleted after the build skips only itself")
+        del similar
+    sys.exit(0 if ok else 1)
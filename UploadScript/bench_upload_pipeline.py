@@ -0,0 +1,114 @@
+"""Benchmark recipe upload throughput against an in-memory Firestore.
+
+Writes a synthetic cleaned_recipes.json, then uploads it once with the old
+serial loop (one duplicate query per recipe, one batch commit at a time) and
+once through the pipelined upload_recipes() at several commit concurrencies.
+Every RPC sleeps for the given latency to imitate a network round trip.
+
+Usage: python bench_upload_pipeline.py [recipes] [latency_ms]
+"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+import upload_recipes_batch
+from fake_firestore import FakeFirestore
+from doc_cache import CACHE_FILE
+from nutrition import NutritionTable
+from recipe_dedup import RecipeKeys
+
+INGREDIENTS = [f'ingredient {i}' for i in range(2000)]
+
+def synthetic_recipes(num_recipes, seed=11):
+    rng = random.Random(seed)
+    return [{
+        'name': f'Recipe {i}',
+        'cookTime': 'PT30M',
+        'prepTime': 'PT15M',
+        'expiryDate': rng.randint(1, 5),
+        'category': 'Dinner',
+        'keywords': ['Easy', 'Weeknight'],
+        'ingredients': [{'name': name, 'weight': rng.randint(5, 300)}
+                        for name in rng.sample(INGREDIENTS, 9)],
+        'servings': 4,
+        'yield': '4 servings',
+        'instructions': ['Mix everything.', 'Cook until done.'],
+    } for i in range(num_recipes)]
+
+def seeded_db(latency):
+    db = FakeFirestore(latency=latency)
+    # A known ingredient list, like production; the odd new name still gets created
+    for i, name in enumerate(INGREDIENTS[:-50]):
+        db._write(f'ingredients_list/{i}', {'name': name, 'name_lower': name, 'calories': 100.0,
+                                            'protein': 5.0, 'fat': 3.0, 'carbohydrate': 10.0})
+    db.reads = db.writes = db.rpcs = 0
+    return db
+
+def serial_upload(db, filepath):
+    """The upload loop upload_recipes() ran before the pipeline"""
+    existing = {doc.get('name_lower'): (doc.id, doc.to_dict())
+                for doc in db.collection('ingredients_list').stream()}
+    with open(filepath) as f:
+        recipes = json.load(f)
+    unique = [r for r in recipes
+              if not db.collection('recipes').where('Name', '==', r['name']).limit(1).get()]
+    table = NutritionTable()
+    for start in range(0, len(unique), 500):
+        batch = db.batch()
+        resolved = []
+        for recipe in unique[start:start + 500]:
+            ingredients = []
+            for ing in recipe['ingredients']:
+                name_lower = ing['name'].lower()
+                if name_lower not in existing:
+                    ref = db.collection('ingredients_list').document()
+                    ref.set({'name': ing['name'], 'name_lower': name_lower})  # One RPC per new name
+                    existing[name_lower] = (ref.id, {})
+                ingredients.append({'id': existing[name_lower][0], 'name': ing['name'],
+                                    'weight': ing['weight'], 'row': table.row(*existing[name_lower])})
+            resolved.append((recipe, ingredients))
+        for recipe_id, doc, _ in upload_recipes_batch.build_recipe_docs(resolved, table):
+            batch.set(db.collection('recipes').document(recipe_id), doc)
+        batch.commit()
+
+def reset_local_state():
+    """Drops the dedup keys and document cache a previous run left behind"""
+    RecipeKeys().invalidate()
+    for path in (CACHE_FILE, CACHE_FILE + '-wal', CACHE_FILE + '-shm'):
+        if os.path.exists(path):
+            os.remove(path)
+
+def main():
+    num_recipes = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+
+    fd, path = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(synthetic_recipes(num_recipes), f)
+    print(f"{num_recipes} recipes, {latency * 1000:.0f} ms per RPC")
+    try:
+        db = seeded_db(latency)
+        start = time.perf_counter()
+        serial_upload(db, path)
+        elapsed = time.perf_counter() - start
+        print(f"  serial loop:        {elapsed:7.2f} s  {num_recipes / elapsed:8.0f} recipes/s  "
+              f"{db.rpcs} RPCs")
+
+        for concurrency in (1, 4, 8, 16):
+            db = seeded_db(latency)
+            reset_local_state()
+            start = time.perf_counter()
+            uploaded = upload_recipes_batch.upload_recipes(db, path, concurrency, progress=False)
+            elapsed = time.perf_counter() - start
+            assert uploaded == num_recipes
+            print(f"  pipeline x{concurrency:<2}:       {elapsed:7.2f} s  "
+                  f"{num_recipes / elapsed:8.0f} recipes/s  {db.rpcs} RPCs")
+    finally:
+        os.remove(path)
+        reset_local_state()
+
+if __name__ == '__main__':
+    main()
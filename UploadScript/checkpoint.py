@@ -0,0 +1,145 @@
+"""Resumable bulk jobs: a local SQLite record of the work already committed.
+
+A job marks each input item done once the write carrying it has committed:
+its offset in an input file, or a document id. Rerun with --resume and the
+done items are skipped, so a crash at 80% redoes only the remaining 20%:
+
+    with Checkpoint('update_reviews', source=file_fingerprint(path), resume=resume) as checkpoint:
+        for offset, review in checkpoint.pending(iter_records(path)):
+            ...write...
+            checkpoint.mark([offset])
+
+Writes through a BatchWriter are marked when their batch commits:
+checkpoint.track(writer.set(ref, data), key). Each committed batch is
+logged too. Items in flight at a crash are not marked and are written again
+on resume, so jobs write to content_id() document ids (or other ids taken
+from the input) and a second write lands on the same document.
+
+Without --resume a job starts over and its old checkpoint is dropped.
+Resuming against a changed input file is refused, since its offsets no
+longer mean the same records.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+CHECKPOINT_FILE = 'job_checkpoints.db'
+FLUSH_EVERY = 1000          # Keys marked done between SQLite commits
+RESUME_FLAG = '--resume'
+
+def content_id(*parts):
+    """20-character document id derived from content, so rewriting the same input hits the same document"""
+    text = '\x1f'.join(str(part) for part in parts)
+    return hashlib.blake2b(text.encode(), digest_size=10).hexdigest()
+
+def file_fingerprint(path):
+    """Identifies one version of an input file"""
+    st = os.stat(path)
+    return f'{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}'
+
+class Checkpoint:
+    def __init__(self, job, source='', resume=False, path=CHECKPOINT_FILE):
+        self.job = job
+        self.skipped = 0            # Items pending() passed over as already done
+        self._unsaved = []
+        self._batches = []
+        self._tracked = {}          # Batch future -> keys it carries
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._db:
+            self._db.executescript('''
+                CREATE TABLE IF NOT EXISTS jobs (job TEXT PRIMARY KEY, source TEXT, status TEXT,
+                                                 started REAL, updated REAL);
+                CREATE TABLE IF NOT EXISTS done (job TEXT, key, PRIMARY KEY (job, key)) WITHOUT ROWID;
+                CREATE TABLE IF NOT EXISTS batches (job TEXT, size INTEGER, committed REAL);
+            ''')
+            row = self._db.execute('SELECT source, status, started FROM jobs WHERE job = ?', (job,)).fetchone()
+            if resume and row and row[0] != source:
+                raise ValueError(f"{job}: the input changed since the checkpoint was written; "
+                                 f"run again without {RESUME_FLAG}")
+            self.resumed = bool(resume and row and row[1] != 'done')
+            if not self.resumed:
+                self._db.execute('DELETE FROM done WHERE job = ?', (job,))
+                self._db.execute('DELETE FROM batches WHERE job = ?', (job,))
+            now = time.time()
+            self.started = row[2] if self.resumed else now
+            self._db.execute('INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?)',
+                             (job, source, 'running', self.started, now))
+        self.done = {key for key, in self._db.execute('SELECT key FROM done WHERE job = ?', (job,))}
+
+    def __len__(self):
+        return len(self.done)
+
+    def __contains__(self, key):
+        return key in self.done
+
+    def pending(self, items, key=None):
+        """Yields (key, item) for the items not done yet; the key is the offset unless key= is given"""
+        for offset, item in enumerate(items):
+            k = key(item) if key else offset
+            if k in self.done:
+                self.skipped += 1
+                continue
+            yield k, item
+
+    def mark(self, keys):
+        """Records items as committed"""
+        with self._lock:
+            self.done.update(keys)
+            self._unsaved.extend(keys)
+            if len(self._unsaved) >= FLUSH_EVERY:
+                self._flush()
+
+    def track(self, future, key):
+        """Marks key done when the BatchWriter batch behind future commits"""
+        with self._lock:
+            keys = self._tracked.get(future)
+            if keys is not None:
+                keys.append(key)
+                return
+            self._tracked[future] = [key]
+        future.add_done_callback(self._committed)
+
+    def _committed(self, future):
+        with self._lock:
+            keys = self._tracked.pop(future)
+        if future.exception() is None:
+            with self._lock:
+                self._batches.append((self.job, len(keys), time.time()))
+            self.mark(keys)
+
+    def _flush(self):
+        """Writes out the marks held in memory; the caller holds the lock"""
+        with self._db:
+            self._db.executemany('INSERT OR IGNORE INTO done VALUES (?, ?)',
+                                 ((self.job, key) for key in self._unsaved))
+            self._db.executemany('INSERT INTO batches VALUES (?, ?, ?)', self._batches)
+            self._db.execute('UPDATE jobs SET updated = ? WHERE job = ?', (time.time(), self.job))
+        self._unsaved, self._batches = [], []
+
+    @property
+    def batches(self):
+        """Number of batches committed by this job, across resumed runs"""
+        with self._lock:
+            self._flush()
+            return self._db.execute('SELECT COUNT(*) FROM batches WHERE job = ?', (self.job,)).fetchone()[0]
+
+    def close(self, finished=False):
+        """Saves every mark; a finished job's checkpoint is dropped, so it can't be resumed by mistake"""
+        with self._lock:
+            self._flush()
+            with self._db:
+                if finished:
+                    self._db.execute('DELETE FROM done WHERE job = ?', (self.job,))
+                    self._db.execute('DELETE FROM batches WHERE job = ?', (self.job,))
+                self._db.execute('UPDATE jobs SET status = ?, updated = ? WHERE job = ?',
+                                 ('done' if finished else 'stopped', time.time(), self.job))
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(finished=exc_type is None)
@@ -0,0 +1,289 @@
+"""Local read-through cache of recipes and ingredients_list documents.
+
+The services look the same documents up by id run after run: the recipes a
+user interacted with, one ingredient's nutrition. A DocumentCache answers
+from an in-memory LRU first. Next it tries an SQLite file that every process
+on the machine shares (CACHE_FILE), so restarting a worker does not mean
+downloading the catalog again. Only what is left is fetched, all of a call's
+misses together in concurrent get_all batches.
+
+Each entry keeps the document's update_time, and an older copy never
+replaces a newer one, so a listener and a fetch racing each other can't roll
+an entry back. Once an entry is older than max_age it is revalidated: a
+get_all with an empty field mask returns just the update_time, and only a
+document whose update_time moved is downloaded again. Documents that don't
+exist are cached for negative_max_age only, so one created later shows up
+soon. A long-running worker can listen() to keep its collection current
+instead. Jobs that rewrite documents invalidate() them, or, writing through a
+BatchWriter, invalidate_after() the batch commits. Hits and misses are counted
+per tier in stats.
+
+A cache given field_paths holds only those fields, fetched with a field
+mask. Its entries are kept apart from the whole documents in the file, and
+invalidating a document drops it under every mask.
+
+scan() reads a whole collection through the cache: one names-only query
+lists every document with its update_time, and only the new and changed ones
+are downloaded. Firestore still bills the listing a read per document; what
+it saves is transferring documents that haven't changed.
+
+fetch_documents() is the uncached batch read underneath: ids in get_all
+chunks, several chunks in flight, optionally with a field mask.
+
+Usage: python doc_cache.py recipes|ingredients_list id [id ...]   # Look documents up, then print the counters
+"""
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+from ingest_pipeline import chunked
+
+CACHE_FILE = 'doc_cache.db'
+MEMORY_CAPACITY = 10_000    # Documents per collection held in memory, the least recently used dropped first
+MAX_AGE = 15 * 60            # Seconds a cached document is served before its update_time is checked
+NEGATIVE_MAX_AGE = 60       # Seconds a missing document is remembered as missing
+GET_ALL_CHUNK = 100         # References per get_all call
+FETCH_CONCURRENCY = 8       # get_all calls in flight
+SQL_CHUNK = 500             # Ids per SQLite lookup, under its bound-parameter limit
+
+def fetch_documents(db, collection, doc_ids, field_paths=None, chunk_size=GET_ALL_CHUNK,
+                    concurrency=FETCH_CONCURRENCY):
+    """Snapshots of doc_ids (exists is False for missing ones), read in concurrent get_all chunks
+
+    field_paths, e.g. ['Keywords'], fetches only those fields.
+    """
+    collection_ref = db.collection(collection)
+
+    def fetch(chunk):
+        return list(db.get_all([collection_ref.document(doc_id) for doc_id in chunk], field_paths=field_paths))
+
+    chunks = list(chunked(dict.fromkeys(doc_ids), chunk_size))
+    if len(chunks) <= 1:
+        return fetch(chunks[0]) if chunks else []
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(chunks))) as pool:
+        return [snapshot for snapshots in pool.map(fetch, chunks) for snapshot in snapshots]
+
+class DocumentCache:
+    def __init__(self, db, collection, path=CACHE_FILE, capacity=MEMORY_CAPACITY, max_age=MAX_AGE,
+                 negative_max_age=NEGATIVE_MAX_AGE, field_paths=None):
+        self.db = db
+        self.collection = collection
+        self.field_paths = list(field_paths) if field_paths is not None else None
+        # SQLite key of the entries: 'recipes', or 'recipes[Keywords,RecipeIngredientParts]' under a mask
+        self._namespace = collection if field_paths is None else f"{collection}[{','.join(sorted(field_paths))}]"
+        self.capacity = capacity
+        self.max_age = max_age
+        self.negative_max_age = negative_max_age
+        # 'memory hits', 'disk hits', 'misses', 'revalidated', 'changed', 'not found'
+        self.stats = Counter()
+        self._memory = OrderedDict()  # doc id -> (data or None if missing, update_time, fetched at)
+        self._lock = threading.RLock()
+        self._watch = None
+        self._tracked = {}          # BatchWriter batch future -> ids it rewrites
+        self._sql = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._sql.execute('PRAGMA journal_mode=WAL')  # Other processes keep reading while one writes
+        with self._sql:
+            self._sql.execute('''
+                CREATE TABLE IF NOT EXISTS docs (collection TEXT, id TEXT, update_time REAL, fetched REAL,
+                                                 data BLOB, PRIMARY KEY (collection, id)) WITHOUT ROWID
+            ''')
+
+    def get(self, doc_id):
+        """The document's data, or None if it doesn't exist"""
+        return self.get_many([doc_id]).get(doc_id)
+
+    def get_many(self, doc_ids):
+        """{doc id: data} of the documents that exist, from memory, then disk, then get_all for the rest"""
+        now = time.time()
+        entries, wanted, expired = {}, [], {}
+        with self._lock:
+            for doc_id in dict.fromkeys(doc_ids):
+                entry = self._memory.get(doc_id)
+                if entry is not None and self._fresh(entry, now):
+                    self._memory.move_to_end(doc_id)
+                    self.stats['memory hits'] += 1
+                    entries[doc_id] = entry
+                else:
+                    wanted.append(doc_id)
+            stored = self._load(wanted)
+            for doc_id in wanted:
+                entry = stored.get(doc_id, self._memory.get(doc_id))
+                if entry is not None and self._fresh(entry, now):
+                    self._remember(doc_id, entry)
+                    self.stats['disk hits'] += 1
+                    entries[doc_id] = entry
+                elif entry is not None and entry[0] is not None:
+                    expired[doc_id] = entry
+        if expired:
+            entries.update(self._revalidate(expired))
+        missed = [doc_id for doc_id in wanted if doc_id not in entries]
+        if missed:
+            self.stats['misses'] += len(missed)
+            fetched = self._fetch(missed)
+            self.stats['not found'] += sum(1 for entry in fetched.values() if entry[0] is None)
+            entries.update(self._store(fetched))
+        # Copies, so a caller editing its result doesn't edit the cache
+        return {doc_id: dict(entry[0]) for doc_id, entry in entries.items() if entry[0] is not None}
+
+    def scan(self):
+        """{doc id: data} of the whole collection, downloading only documents new or changed since they were cached"""
+        now = time.time()
+        listed = {snapshot.id: self._entry(snapshot, now)[1]
+                  for snapshot in self.db.collection(self.collection).select(['__name__']).stream()}
+        with self._lock:
+            stored = self._load(list(listed))
+            gone = [doc_id for doc_id in self._ids() if doc_id not in listed]
+        if gone:
+            self.invalidate(gone)
+        current = {doc_id: (entry[0], entry[1], now) for doc_id, entry in stored.items()
+                   if entry[0] is not None and entry[1] == listed[doc_id]}
+        self.stats['revalidated'] += len(current)
+        entries = self._store(current)
+        changed = [doc_id for doc_id in listed if doc_id not in current]
+        if changed:
+            self.stats['misses'] += len(changed)
+            entries.update(self._store(self._fetch(changed)))
+        # In the listing's order, which is the order stream() returns
+        return {doc_id: dict(entries[doc_id][0]) for doc_id in listed
+                if doc_id in entries and entries[doc_id][0] is not None}
+
+    def put(self, snapshots):
+        """Caches documents already read elsewhere (whole documents, or ones with at least this cache's fields)"""
+        now = time.time()
+        self._store({snapshot.id: self._entry(snapshot, now) for snapshot in snapshots})
+
+    def invalidate(self, doc_ids):
+        """Drops documents that were just rewritten, under every mask and for every process sharing the file"""
+        doc_ids = list(doc_ids)
+        with self._lock:
+            for doc_id in doc_ids:
+                self._memory.pop(doc_id, None)
+            with self._sql:
+                self._sql.executemany('DELETE FROM docs WHERE (collection = ? OR collection LIKE ?) AND id = ?',
+                                      ((self.collection, self.collection + '[%', doc_id) for doc_id in doc_ids))
+
+    def invalidate_after(self, future, doc_id):
+        """Invalidates doc_id once the BatchWriter batch behind future is done"""
+        with self._lock:
+            ids = self._tracked.get(future)
+            if ids is not None:
+                ids.append(doc_id)
+                return
+            self._tracked[future] = [doc_id]
+        future.add_done_callback(self._committed)
+
+    def _committed(self, future):
+        with self._lock:
+            ids = self._tracked.pop(future)
+        self.invalidate(ids)
+
+    def listen(self):
+        """Keeps the cache current from a listener on the collection; its first snapshot reads every document"""
+        def callback(docs, changes, read_time):
+            removed = [change.document.id for change in changes if change.type.name == 'REMOVED']
+            self.put(change.document for change in changes if change.type.name != 'REMOVED')
+            if removed:
+                self.invalidate(removed)
+
+        self._watch = self.db.collection(self.collection).on_snapshot(callback)
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def close(self):
+        self.stop()
+        self._sql.close()
+
+    def hit_rate(self):
+        hits = self.stats['memory hits'] + self.stats['disk hits']
+        return hits / (hits + self.stats['misses']) if hits + self.stats['misses'] else 0.0
+
+    def _fresh(self, entry, now):
+        return now - entry[2] < (self.max_age if entry[0] is not None else self.negative_max_age)
+
+    def _revalidate(self, expired):
+        """Entries of expired whose update_time is unchanged, kept for another max_age; the rest are left out"""
+        now = time.time()
+        current = {}
+        for snapshot in fetch_documents(self.db, self.collection, expired, field_paths=[]):
+            entry = expired[snapshot.id]
+            if snapshot.exists and self._entry(snapshot, now)[1] == entry[1]:
+                current[snapshot.id] = (entry[0], entry[1], now)
+        self.stats['revalidated'] += len(current)
+        self.stats['changed'] += len(expired) - len(current)
+        return self._store(current)
+
+    def _entry(self, snapshot, now):
+        if not snapshot.exists:
+            return None, now, now   # Missing as of now; a document created later is newer
+        data = snapshot.to_dict()
+        if self.field_paths is not None:
+            data = {field: data[field] for field in self.field_paths if field in data}
+        return data, snapshot.update_time.timestamp() if snapshot.update_time else 0.0, now
+
+    def _remember(self, doc_id, entry):
+        """Puts an entry in the memory tier; the caller holds the lock"""
+        self._memory[doc_id] = entry
+        self._memory.move_to_end(doc_id)
+        while len(self._memory) > self.capacity:
+            self._memory.popitem(last=False)
+
+    def _load(self, doc_ids):
+        """Entries of doc_ids found in SQLite; the caller holds the lock"""
+        entries = {}
+        for chunk in chunked(doc_ids, SQL_CHUNK):
+            rows = self._sql.execute(
+                f'SELECT id, update_time, fetched, data FROM docs WHERE collection = ? '
+                f'AND id IN ({",".join("?" * len(chunk))})', (self._namespace, *chunk))
+            for doc_id, update_time, fetched, data in rows:
+                entries[doc_id] = (pickle.loads(data) if data is not None else None, update_time, fetched)
+        return entries
+
+    def _ids(self):
+        """Ids of every document of the collection on disk; the caller holds the lock"""
+        return [doc_id for doc_id, in self._sql.execute('SELECT id FROM docs WHERE collection = ?', (self._namespace,))]
+
+    def _fetch(self, doc_ids):
+        now = time.time()
+        return {snapshot.id: self._entry(snapshot, now)
+                for snapshot in fetch_documents(self.db, self.collection, doc_ids, field_paths=self.field_paths)}
+
+    def _store(self, entries):
+        """Writes entries through both tiers unless a newer copy is already there; returns what is cached now"""
+        with self._lock:
+            for doc_id, entry in entries.items():
+                current = self._memory.get(doc_id)
+                if current is not None and current[1] > entry[1]:
+                    entries[doc_id] = current
+                    continue
+                self._remember(doc_id, entry)
+            with self._sql:
+                self._sql.executemany('''
+                    INSERT INTO docs VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (collection, id) DO UPDATE
+                    SET update_time = excluded.update_time, fetched = excluded.fetched, data = excluded.data
+                    WHERE excluded.update_time >= docs.update_time
+                ''', ((self._namespace, doc_id, update_time, fetched,
+                       pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL) if data is not None else None)
+                      for doc_id, (data, update_time, fetched) in entries.items()))
+        return entries
+
+if __name__ == '__main__':
+    cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
+    firebase_admin.initialize_app(cred)
+    db = firestore.client()
+
+    cache = DocumentCache(db, sys.argv[1])
+    for doc_id, data in cache.get_many(sys.argv[2:]).items():
+        print(f"{doc_id}: {data.get('Name') or data.get('name')}")
+    print(dict(cache.stats), f"hit rate {cache.hit_rate():.0%}")
+    cache.close()
@@ -0,0 +1,255 @@
+"""Expiry alerts and "use soon" recipe suggestions from inventory changes.
+
+Every inventory item gets a projected expiry: its expiry_date when the app
+has one, otherwise date_added plus the user's estimated_expiry for that item
+name (users/{uid}/preferences/expiry_dates/items), otherwise
+DEFAULT_SHELF_LIFE_DAYS. Items sit in a min-heap keyed by the time their
+alert is due (expiry minus remind_before). The engine is fed from a listener
+on the inventory collection group, so each tick only handles changed items
+and the heap head, never a rescan of every user's inventory. The listener
+callback only queues the changes; the tick projects them, so preferences are
+read on the tick thread, and only for items that get an alert time.
+
+The projected expiry each item was last alerted for is kept in a local
+SQLite file (SENT_FILE), so a restart, whose first snapshot replays every item, does not alert again
+for items already alerted (and mark alerts the user has read unread).
+
+Usage: python expiry_engine.py
+"""
+import datetime
+import heapq
+import itertools
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+from inventory_ranking import InventoryRanker, load_ingredient_ids
+from recipe_index import RecipeIndex
+
+DEFAULT_SHELF_LIFE_DAYS = 7
+DEFAULT_REMIND_BEFORE_DAYS = 1
+PREFERENCES_TTL = 3600      # Seconds before a user's shelf-life preferences are re-read
+TICK_INTERVAL = 60
+SENT_FILE = 'expiry_alerts_sent.db'
+BATCH_SIZE = 500
+DAY = 86400
+
+def _timestamp(value):
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        return float(value)
+    return None
+
+def urgency(days_left):
+    if days_left <= 1:
+        return 'high'
+    if days_left <= 3:
+        return 'medium'
+    return 'low'
+
+class ExpiryEngine:
+    def __init__(self, db, ranker=None, sent_path=SENT_FILE):
+        self.db = db
+        self.ranker = ranker
+        self.items = defaultdict(dict)  # uid -> item id -> (name, expires_at, alert_at, version)
+        self._heap = []                 # (alert_at, version, uid, item id)
+        self._versions = itertools.count()
+        # (uid, item id) -> projected expiry last alerted for; sent_path None keeps it in memory only
+        self._sql = sqlite3.connect(sent_path or ':memory:', check_same_thread=False)
+        with self._sql:
+            self._sql.execute('CREATE TABLE IF NOT EXISTS sent (user TEXT, item TEXT, expires_at REAL, '
+                              'PRIMARY KEY (user, item)) WITHOUT ROWID')
+        self._sent = {(user_id, item_id): expires_at
+                      for user_id, item_id, expires_at in self._sql.execute('SELECT * FROM sent')}
+        self._changes = {}              # (uid, item id) -> data or None, queued by the listener
+        self._preferences = {}          # uid -> (loaded at, {name_lower: (shelf days, remind days)})
+        self._lock = threading.Lock()
+        self._preferences_lock = threading.Lock()
+
+    def shelf_life(self, user_id, name):
+        """(shelf days, remind days) for an item name, from the user's cached preferences"""
+        now = time.time()
+        with self._preferences_lock:
+            cached = self._preferences.get(user_id)
+            if cached is None or now - cached[0] > PREFERENCES_TTL:
+                prefs = {}
+                ref = self.db.collection(f'users/{user_id}/preferences/expiry_dates/items')
+                for doc in ref.stream():
+                    data = doc.to_dict()
+                    if data.get('name'):
+                        prefs[data['name'].lower()] = (data.get('estimated_expiry'), data.get('remind_before'))
+                cached = (now, prefs)
+                self._preferences[user_id] = cached
+        shelf, remind = cached[1].get(name.lower(), (None, None))
+        return (shelf if shelf is not None else DEFAULT_SHELF_LIFE_DAYS,
+                remind if remind is not None else DEFAULT_REMIND_BEFORE_DAYS)
+
+    def _forget(self, user_id, item_id):
+        with self._lock:
+            self.items[user_id].pop(item_id, None)
+            if self._sent.pop((user_id, item_id), None) is not None:
+                with self._sql:
+                    self._sql.execute('DELETE FROM sent WHERE user = ? AND item = ?', (user_id, item_id))
+
+    def apply(self, user_id, item_id, data):
+        """Records an added, changed (data) or removed (None) inventory item"""
+        if not data or not data.get('name'):
+            self._forget(user_id, item_id)
+            return
+        expires_at = _timestamp(data.get('expiry_date'))
+        added = _timestamp(data.get('date_added'))
+        if expires_at is None and added is None:
+            self._forget(user_id, item_id)
+            return
+        # remind_before applies to dated items too, so both kinds need the preferences
+        shelf, remind = self.shelf_life(user_id, data['name'])
+        if expires_at is None:
+            expires_at = added + shelf * DAY
+        alert_at = expires_at - remind * DAY
+        with self._lock:
+            current = self.items[user_id].get(item_id)
+            if current and current[1] == expires_at and current[2] == alert_at:
+                return  # e.g. only the weight changed
+            version = next(self._versions)
+            self.items[user_id][item_id] = (data['name'], expires_at, alert_at, version)
+            if self._sent.get((user_id, item_id)) != expires_at:
+                heapq.heappush(self._heap, (alert_at, version, user_id, item_id))
+
+    def project(self):
+        """Applies the inventory changes the listener queued since the last call; failed ones are retried next call"""
+        with self._lock:
+            changes, self._changes = self._changes, {}
+        for (user_id, item_id), data in changes.items():
+            try:
+                self.apply(user_id, item_id, data)
+            except Exception as e:
+                print(f"Error projecting expiry for users/{user_id}/inventory/{item_id}: {e}; retrying next tick")
+                with self._lock:
+                    self._changes.setdefault((user_id, item_id), data)   # Unless a newer change came in
+
+    def due(self, now=None):
+        """Pops every item whose alert is due; returns {uid: [(item id, name, expires_at)]}"""
+        now = now or time.time()
+        due = defaultdict(list)
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, version, user_id, item_id = heapq.heappop(self._heap)
+                item = self.items[user_id].get(item_id)
+                if item is None or item[3] != version:
+                    continue  # Removed or re-projected since it was pushed
+                due[user_id].append((item_id, item[0], item[1]))
+        return due
+
+    def inventory(self, user_id):
+        with self._lock:
+            return [(name, datetime.datetime.fromtimestamp(expires_at, datetime.timezone.utc))
+                    for name, expires_at, _, _ in self.items[user_id].values()]
+
+    def tick(self, now=None):
+        """Writes alerts and use-soon suggestions for every user with items coming due"""
+        now = now or time.time()
+        self.project()
+        due = self.due(now)
+        try:
+            sent = self._send(due, now)
+        except Exception:
+            self._requeue(due)
+            raise
+        rows = [(user_id, item_id, expires_at) for user_id, items in due.items()
+                for item_id, _, expires_at in items]
+        with self._lock:
+            self._sent.update(((user_id, item_id), expires_at) for user_id, item_id, expires_at in rows)
+            with self._sql:
+                self._sql.executemany('INSERT OR REPLACE INTO sent VALUES (?, ?, ?)', rows)
+        return sent
+
+    def close(self):
+        self._sql.close()
+
+    def _requeue(self, due):
+        with self._lock:
+            for user_id, items in due.items():
+                for item_id, _, _ in items:
+                    item = self.items[user_id].get(item_id)
+                    if item is not None:
+                        heapq.heappush(self._heap, (item[2], item[3], user_id, item_id))
+
+    def _send(self, due, now):
+        batch = self.db.batch()
+        pending = 0
+
+        def add(ref, data):
+            nonlocal batch, pending
+            batch.set(ref, data)
+            pending += 1
+            if pending == BATCH_SIZE:
+                batch.commit()
+                batch = self.db.batch()
+                pending = 0
+
+        for user_id, items in due.items():
+            user_ref = self.db.collection('users').document(user_id)
+            for item_id, name, expires_at in items:
+                days_left = (expires_at - now) / DAY
+                when = 'has expired' if days_left <= 0 else f'expires in {max(int(days_left + 0.5), 1)} day(s)'
+                # One alert per item and projected expiry; SENT_FILE keeps a restart from sending it again
+                add(user_ref.collection('alerts').document(f'expiry_{item_id}_{int(expires_at)}'), {
+                    'subject': f'{name} {when}',
+                    'message': f'{name} {when}. Use it soon or move it to the freezer.',
+                    'urgency': urgency(days_left),
+                    'type': 'item',
+                    'id': item_id,
+                    'read': False,
+                    'createdAt': firestore.SERVER_TIMESTAMP,
+                })
+            if self.ranker is not None:
+                now_dt = datetime.datetime.fromtimestamp(now, datetime.timezone.utc)
+                add(user_ref.collection('recommendations').document('use_soon'), {
+                    'items': [item_id for item_id, _, _ in items],
+                    'recipes': self.ranker.use_soon(self.inventory(user_id), now=now_dt),
+                    'updatedAt': firestore.SERVER_TIMESTAMP,
+                })
+        if pending:
+            batch.commit()
+        return sum(len(items) for items in due.values())
+
+    def on_snapshot(self, docs, changes, read_time):
+        with self._lock:
+            for change in changes:
+                doc = change.document
+                user_id = doc.reference.path.split('/')[1]
+                self._changes[(user_id, doc.id)] = None if change.type.name == 'REMOVED' else doc.to_dict()
+
+def main():
+    cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
+    firebase_admin.initialize_app(cred)
+    db = firestore.client()
+
+    index = RecipeIndex.load()
+    index.listen(db)
+    engine = ExpiryEngine(db, InventoryRanker(index, load_ingredient_ids(db)))
+    watch = db.collection_group('inventory').on_snapshot(engine.on_snapshot)
+    try:
+        while True:
+            time.sleep(TICK_INTERVAL)
+            try:
+                alerted = engine.tick()
+                if alerted:
+                    print(f"Sent {alerted} expiry alerts.")
+            except Exception as e:
+                print(f"Error sending expiry alerts: {e}")
+    finally:
+        watch.unsubscribe()
+        engine.close()
+        index.stop()
+        index.save()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,525 @@
+"""In-memory stand-in for the Firestore client, used by the benchmark scripts.
+
+Only the parts of the API the UploadScript tools use are implemented. Every
+RPC sleeps for `latency` seconds to imitate a network round trip, and
+document reads and writes are counted so scripts can report them.
+
+on_snapshot listeners get their initial snapshot at once, then one callback
+per write that adds, changes or removes a matching document, delivered on
+the writing thread. As in Firestore, the initial snapshot bills a read per
+document and each added or modified document one more. Query filters and
+projections are honoured; order and limit are not.
+
+FaultyFirestore crashes on a chosen RPC, for checking that jobs resume.
+"""
+import datetime
+import enum
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from firebase_admin import firestore
+from google.api_core import exceptions
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+def _get_field(data, field_path):
+    value = data
+    for part in field_path.split('.'):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+def _resolve(value):
+    if value is firestore.SERVER_TIMESTAMP:
+        return _now()
+    if isinstance(value, dict):
+        return {k: _resolve(v) for k, v in value.items()}
+    return value
+
+_OPS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a is not None and a < b,
+    '<=': lambda a, b: a is not None and a <= b,
+    '>': lambda a, b: a is not None and a > b,
+    '>=': lambda a, b: a is not None and a >= b,
+    'in': lambda a, b: a in b,
+    'array_contains': lambda a, b: isinstance(a, list) and b in a,
+}
+
+class FakeSnapshot:
+    def __init__(self, reference, data, update_time, field_paths=None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self.update_time = update_time
+        self.create_time = update_time
+        if data is not None and field_paths is not None:
+            data = {k: v for k, v in data.items() if k in field_paths}
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field_path):
+        """Like the real client: None for a missing document, KeyError for a missing field"""
+        if self._data is None:
+            return None
+        value = self._data
+        for part in field_path.split('.'):
+            if not isinstance(value, dict) or part not in value:
+                raise KeyError(f"'{field_path}' is not contained in the data")
+            value = value[part]
+        return value
+
+ChangeType = enum.Enum('ChangeType', 'ADDED MODIFIED REMOVED')
+
+class FakeDocumentChange:
+    def __init__(self, kind, document):
+        self.type = kind
+        self.document = document
+
+class FakeWatch:
+    def __init__(self, client, query, callback):
+        self._client = client
+        self._query = query
+        self._callback = callback
+        self._paths = set()         # Paths of the documents currently in the result set
+
+    def unsubscribe(self):
+        with self._client._lock:
+            if self in self._client._watches:
+                self._client._watches.remove(self)
+
+    def _changed(self, path, data, update_time):
+        """Delivers the change a write to path makes to the result set, if any"""
+        matches = data is not None and self._query._matches_doc(path, data)
+        if matches:
+            kind = ChangeType.MODIFIED if path in self._paths else ChangeType.ADDED
+            self._paths.add(path)
+            self._client.reads += 1
+        elif path in self._paths:
+            kind = ChangeType.REMOVED
+            self._paths.discard(path)
+        else:
+            return
+        snapshot = FakeSnapshot(FakeDocumentReference(self._client, path),
+                                dict(data) if matches else None, update_time, self._query._field_paths)
+        # A removed document still carries its last data in Firestore; nothing here reads it
+        self._callback([snapshot] if matches else [], [FakeDocumentChange(kind, snapshot)], _now())
+
+class FakeDocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self.path = path
+        self.id = path.rsplit('/', 1)[-1]
+        self.parent = FakeCollectionReference(client, path.rsplit('/', 1)[0])
+
+    def collection(self, name):
+        return FakeCollectionReference(self._client, f'{self.path}/{name}')
+
+    def get(self, field_paths=None, transaction=None):
+        self._client._rpc()
+        if transaction is not None:
+            transaction._record(self.path)
+        return self._client._read(self, field_paths)
+
+    def set(self, data, merge=False):
+        self._client._rpc()
+        self._client._write(self.path, data, merge=merge)
+
+    def update(self, data):
+        self._client._rpc()
+        if self._client._docs(self.parent.path).get(self.id) is None:
+            raise exceptions.NotFound(f'No document to update: {self.path}')
+        self._client._write(self.path, data, merge=True)
+
+    def delete(self):
+        self._client._rpc()
+        self._client._delete(self.path)
+
+class FakeQuery:
+    def __init__(self, client, path, group=False, filters=(), order=None, limit=None,
+                 start_after=None, field_paths=None, path_range=None):
+        self._client = client
+        self.path = path
+        self._group = group
+        self._filters = tuple(filters)
+        self._order = order
+        self._limit = limit
+        self._start_after = start_after
+        self._field_paths = field_paths
+        self._path_range = path_range   # (first path, path to stop before) of a partition
+
+    def _copy(self, **changes):
+        args = dict(filters=self._filters, order=self._order, limit=self._limit,
+                    start_after=self._start_after, field_paths=self._field_paths,
+                    path_range=self._path_range)
+        args.update(changes)
+        return FakeQuery(self._client, self.path, self._group, **args)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction='ASCENDING'):
+        return self._copy(order=(field_path, direction))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, snapshot):
+        return self._copy(start_after=snapshot)
+
+    def select(self, field_paths):
+        return self._copy(field_paths=list(field_paths))
+
+    def get_partitions(self, partition_count):
+        """Splits a collection group query into ranges of document paths that can be read in parallel"""
+        self._client._rpc()
+        paths = sorted(p for p, _, _ in self._matches())
+        step = -(-len(paths) // max(1, partition_count)) or 1
+        starts = [None] + paths[step::step]
+        for start, end in zip(starts, starts[1:] + [None]):
+            yield FakeQueryPartition(self, start, end)
+
+    def on_snapshot(self, callback):
+        return self._client._listen(self, callback)
+
+    def _matches_doc(self, path, data):
+        """Whether the document at path with data is in this query's result set, ignoring order and limit"""
+        collection_path = path.rsplit('/', 1)[0]
+        if self._group:
+            if collection_path.rsplit('/', 1)[-1] != self.path:
+                return False
+        elif collection_path != self.path:
+            return False
+        if self._path_range is not None:
+            start, end = self._path_range
+            if (start is not None and path < start) or (end is not None and path >= end):
+                return False
+        return all(_OPS[op_string](_get_field(data, field_path), value)
+                   for field_path, op_string, value in self._filters)
+
+    def _matches(self):
+        items = self._client._scan(self.path, self._group)
+        if self._path_range is not None:
+            start, end = self._path_range
+            items = [item for item in items
+                     if (start is None or item[0] >= start) and (end is None or item[0] < end)]
+        for field_path, op_string, value in self._filters:
+            op = _OPS[op_string]
+            items = [(p, d, t) for p, d, t in items if op(_get_field(d, field_path), value)]
+        if self._order:
+            field_path, direction = self._order
+            items.sort(key=lambda item: (_get_field(item[1], field_path) is None,
+                                         _get_field(item[1], field_path)),
+                       reverse=direction == 'DESCENDING')
+        else:
+            items.sort(key=lambda item: item[0])
+        if self._start_after is not None:
+            cursor = self._start_after.reference.path
+            if not self._order:
+                # Position by document path, so the cursor works even if its document no longer matches
+                items = [item for item in items if item[0] > cursor]
+            else:
+                paths = [p for p, _, _ in items]
+                if cursor in paths:
+                    items = items[paths.index(cursor) + 1:]
+        if self._limit is not None:
+            items = items[:self._limit]
+        return items
+
+    def stream(self):
+        self._client._rpc()
+        snapshots = []
+        for path, data, update_time in self._matches():
+            ref = FakeDocumentReference(self._client, path)
+            snapshots.append(FakeSnapshot(ref, data, update_time, self._field_paths))
+        self._client._count_reads(len(snapshots))
+        return iter(snapshots)
+
+    def get(self):
+        return list(self.stream())
+
+    def count(self, alias=None):
+        return FakeAggregationQuery(self, alias)
+
+class FakeQueryPartition:
+    def __init__(self, query, start_at, end_at):
+        self._query = query
+        self.start_at = start_at
+        self.end_at = end_at
+
+    def query(self):
+        return self._query._copy(path_range=(self.start_at, self.end_at))
+
+class FakeAggregationResult:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+
+class FakeAggregationQuery:
+    def __init__(self, query, alias=None):
+        self._query = query
+        self._alias = alias
+
+    def get(self):
+        self._query._client._rpc()
+        count = len(self._query._matches())
+        self._query._client._count_reads(max(1, -(-count // 1000)))  # One read per 1000 index entries
+        return [[FakeAggregationResult(self._alias or 'count', count)]]
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client, path):
+        super().__init__(client, path)
+        self.id = path.rsplit('/', 1)[-1]
+
+    @property
+    def parent(self):
+        if '/' not in self.path:
+            return None
+        return FakeDocumentReference(self._client, self.path.rsplit('/', 1)[0])
+
+    def document(self, document_id=None):
+        if document_id is None:
+            document_id = uuid.uuid4().hex[:20]
+        return FakeDocumentReference(self._client, f'{self.path}/{document_id}')
+
+    def add(self, data):
+        ref = self.document()
+        ref.set(data)
+        return _now(), ref
+
+    def list_documents(self):
+        self._client._rpc()
+        return [self.document(doc_id) for doc_id in self._client._child_ids(self.path)]
+
+class FakeWriteBatch:
+    MAX_OPS = 500
+
+    def __init__(self, client):
+        self._client = client
+        self._ops = []
+
+    def __len__(self):
+        return len(self._ops)
+
+    def _add(self, op):
+        if len(self._ops) >= self.MAX_OPS:
+            raise ValueError('A write batch can contain at most 500 operations.')
+        self._ops.append(op)
+
+    def set(self, reference, data, merge=False):
+        self._add(('set', reference.path, data, merge))
+
+    def update(self, reference, data):
+        self._add(('update', reference.path, data, True))
+
+    def delete(self, reference):
+        self._add(('delete', reference.path, None, False))
+
+    def commit(self):
+        self._client._rpc()
+        with self._client._lock:
+            self._check_updates()
+            self._apply()
+
+    def _check_updates(self):
+        """Fails the whole batch, as Firestore does, if an update targets a missing document"""
+        for kind, path, _, _ in self._ops:
+            if kind == 'update':
+                collection_path, doc_id = path.rsplit('/', 1)
+                if self._client._docs(collection_path).get(doc_id) is None:
+                    self._ops = []
+                    raise exceptions.NotFound(f'No document to update: {path}')
+
+    def _apply(self):
+        for kind, path, data, merge in self._ops:
+            if kind == 'delete':
+                self._client._delete(path)
+            else:
+                self._client._write(path, data, merge=merge)
+        self._ops = []
+
+class FakeTransaction(FakeWriteBatch):
+    """Optimistic transaction for firestore.transactional: the commit fails with
+    Aborted, and the decorator retries, if a document read in it changed since"""
+
+    def __init__(self, client, max_attempts=5):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._read_only = False
+        self._id = None
+        self._reads = {}            # path -> stored (data, update_time) entry when read
+
+    def _clean_up(self):
+        self._ops = []
+        self._reads = {}
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._id = uuid.uuid4().bytes
+
+    def _rollback(self):
+        self._clean_up()
+
+    def _record(self, path):
+        collection_path, doc_id = path.rsplit('/', 1)
+        with self._client._lock:
+            self._reads.setdefault(path, self._client._docs(collection_path).get(doc_id))
+
+    def _commit(self):
+        self._client._rpc()
+        with self._client._lock:
+            for path, entry in self._reads.items():
+                collection_path, doc_id = path.rsplit('/', 1)
+                if self._client._docs(collection_path).get(doc_id) is not entry:
+                    self._clean_up()
+                    raise exceptions.Aborted(f'{path} changed during the transaction')
+            self._apply()
+        self._clean_up()
+
+class FakeFirestore:
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.reads = 0
+        self.writes = 0
+        self.rpcs = 0
+        self._lock = threading.RLock()
+        self._collections = defaultdict(dict)  # collection path -> {doc id: (data, update_time)}
+        self._watches = []
+
+    def _rpc(self):
+        with self._lock:
+            self.rpcs += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _count_reads(self, count):
+        with self._lock:
+            self.reads += count
+
+    def _docs(self, collection_path):
+        return self._collections[collection_path]
+
+    def _read(self, reference, field_paths=None):
+        with self._lock:
+            data, update_time = self._docs(reference.parent.path).get(reference.id, (None, None))
+            self.reads += 1
+        return FakeSnapshot(reference, dict(data) if data is not None else None, update_time, field_paths)
+
+    def _write(self, path, data, merge=False):
+        collection_path, doc_id = path.rsplit('/', 1)
+        with self._lock:
+            docs = self._docs(collection_path)
+            current = docs.get(doc_id, (None, None))[0]
+            if merge and current is not None:
+                new_data = dict(current)
+                for key, value in data.items():
+                    if isinstance(value, firestore.Increment):
+                        new_data[key] = (new_data.get(key) or 0) + value.value
+                    else:
+                        new_data[key] = _resolve(value)
+            else:
+                new_data = {k: (v.value if isinstance(v, firestore.Increment) else _resolve(v))
+                            for k, v in data.items()}
+            docs[doc_id] = (new_data, _now())
+            self.writes += 1
+            self._notify(path, new_data, docs[doc_id][1])
+
+    def _delete(self, path):
+        collection_path, doc_id = path.rsplit('/', 1)
+        with self._lock:
+            self._docs(collection_path).pop(doc_id, None)
+            self.writes += 1
+            self._notify(path, None, _now())
+
+    def _notify(self, path, data, update_time):
+        for watch in list(self._watches):
+            watch._changed(path, data, update_time)
+
+    def _listen(self, query, callback):
+        """Registers a listener and delivers its initial snapshot"""
+        watch = FakeWatch(self, query, callback)
+        self._rpc()
+        with self._lock:
+            items = query._matches()
+            self.reads += len(items)
+            watch._paths = {path for path, _, _ in items}
+            self._watches.append(watch)
+            docs = [FakeSnapshot(FakeDocumentReference(self, path), data, update_time, query._field_paths)
+                    for path, data, update_time in items]
+            callback(docs, [FakeDocumentChange(ChangeType.ADDED, doc) for doc in docs], _now())
+        return watch
+
+    def _scan(self, path, group=False):
+        with self._lock:
+            if not group:
+                return [(f'{path}/{doc_id}', dict(data), t) for doc_id, (data, t) in self._docs(path).items()]
+            items = []
+            for collection_path, docs in self._collections.items():
+                if collection_path.rsplit('/', 1)[-1] == path:
+                    items.extend((f'{collection_path}/{doc_id}', dict(data), t)
+                                 for doc_id, (data, t) in docs.items())
+            return items
+
+    def _child_ids(self, collection_path):
+        with self._lock:
+            ids = set(self._docs(collection_path))
+            prefix = collection_path + '/'
+            for path in self._collections:
+                if path.startswith(prefix) and self._collections[path]:
+                    ids.add(path[len(prefix):].split('/', 1)[0])
+            return sorted(ids)
+
+    def collection(self, path):
+        return FakeCollectionReference(self, path)
+
+    def collection_group(self, collection_id):
+        return FakeQuery(self, collection_id, group=True)
+
+    def document(self, path):
+        return FakeDocumentReference(self, path)
+
+    def batch(self):
+        return FakeWriteBatch(self)
+
+    def transaction(self, max_attempts=5):
+        return FakeTransaction(self, max_attempts)
+
+    def get_all(self, references, field_paths=None):
+        self._rpc()
+        for reference in references:
+            yield self._read(reference, field_paths)
+
+class Crash(BaseException):
+    """A process dying mid-run: not an Exception, so nothing on the way up handles it"""
+
+class FaultyFirestore(FakeFirestore):
+    """A FakeFirestore that raises Crash once, on its fail_at-th RPC or the first RPC after fail_after_writes writes
+
+    source shares another store's documents.
+    """
+
+    def __init__(self, fail_at=None, source=None, fail_after_writes=None):
+        super().__init__()
+        self.fail_at = fail_at
+        self.fail_after_writes = fail_after_writes
+        if source is not None:
+            self._collections = source._collections
+            self.reads = self.writes = self.rpcs = 0
+
+    def _rpc(self):
+        super()._rpc()
+        if self.fail_at is not None and self.rpcs >= self.fail_at:
+            self.fail_at = None
+            raise Crash(f'Injected crash at RPC {self.rpcs}')
+        if self.fail_after_writes is not None and self.writes >= self.fail_after_writes:
+            self.fail_after_writes = None
+            raise Crash(f'Injected crash after {self.writes} writes')
@@ -2,23 +2,22 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 import json
 
+from doc_cache import DocumentCache
+
 # Initialize Firebase Admin
 cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')  # Replace with your actual path
 firebase_admin.initialize_app(cred)
 
 # Connect to Firestore
 db = firestore.client()
+ingredient_cache = DocumentCache(db, 'ingredients_list')
 
 def fetch_ingredient(ingredient_id):
-    # Reference to the ingredients_list collection
-    doc_ref = db.collection('ingredients_list').document(ingredient_id)
-    doc = doc_ref.get()
-
-    if doc.exists:
-        return doc.to_dict()
-    else:
+    # Served from the local document cache, read from ingredients_list only on a miss
+    data = ingredient_cache.get(ingredient_id)
+    if data is None:
         print(f"Ingredient with ID '{ingredient_id}' not found.")
-        return None
+    return data
 
 def save_to_json(data, filename='ingredient.json'):
     with open(filename, 'w') as json_file:
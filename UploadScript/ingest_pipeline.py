@@ -0,0 +1,254 @@
+"""Building blocks for the staged recipe upload pipeline.
+
+Each stage is a generator function that runs in its own thread. Stages are
+linked by bounded queues, so a slow stage applies back-pressure instead of
+letting everything upstream pile up in memory. BatchWriter groups writes
+into batches of up to 500 and keeps several commits in flight at once. A
+commit that fails with a transient error is retried with exponential
+back-off. A write can name other batches that must commit before its own,
+so a recipe never lands ahead of a new ingredient it refers to.
+AdaptiveLimit lets a BatchWriter find its own concurrency: it adds a slot
+while commits come back fast and halves the window when Firestore pushes back.
+"""
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from google.api_core import exceptions
+
+QUEUE_SIZE = 1000           # Items buffered between two stages
+BATCH_SIZE = 500            # Firestore write batch limit
+CONCURRENCY = 8             # Batch commits in flight at once
+RETRIES = 5
+BACKOFF = 0.5               # Seconds before the first retry; doubles on every attempt
+TARGET_LATENCY = 2.0        # Commit seconds above which AdaptiveLimit stops growing and shrinks
+
+# Contention, throttling and dropped connections; anything else is a real error
+RETRYABLE = (
+    exceptions.Aborted,
+    exceptions.DeadlineExceeded,
+    exceptions.InternalServerError,
+    exceptions.ResourceExhausted,
+    exceptions.ServiceUnavailable,
+)
+# Errors after which the commit certainly did not apply. Batches that are not
+# idempotent (Increment transforms) retry only these; a timeout may have landed.
+NOT_APPLIED = (
+    exceptions.Aborted,
+    exceptions.ResourceExhausted,
+)
+
+_DONE = object()
+
+class _Failed:
+    def __init__(self, error):
+        self.error = error
+
+def stage(func, source, maxsize=QUEUE_SIZE, name=None):
+    """Runs func(source) in a thread and yields its output through a bounded queue.
+
+    An exception raised inside the stage is re-raised in the consumer.
+    """
+    out = queue.Queue(maxsize)
+
+    def run():
+        try:
+            for item in func(source):
+                out.put(item)
+        except BaseException as e:
+            out.put(_Failed(e))
+        else:
+            out.put(_DONE)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    while True:
+        item = out.get()
+        if item is _DONE:
+            return
+        if isinstance(item, _Failed):
+            raise item.error
+        yield item
+
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def commit_with_retry(db, ops, retries=RETRIES, backoff=BACKOFF, retryable=RETRYABLE, on_retry=None):
+    """Commits (reference, data[, merge]) tuples as one batch, retrying transient failures"""
+    for attempt in range(retries + 1):
+        batch = db.batch()
+        for op in ops:
+            batch.set(*op)
+        try:
+            batch.commit()
+            return len(ops)
+        except retryable as e:
+            if on_retry:
+                on_retry(e)
+            if attempt == retries:
+                raise
+            delay = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            print(f"⚠️ Batch commit failed ({e.__class__.__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+class AdaptiveLimit:
+    """Concurrency window for batch commits, grown and shrunk from what commits report (AIMD).
+
+    Every commit that finishes under target_latency adds 1/limit, so a full
+    window of fast commits adds one slot. A slow commit takes 10% off, and
+    a throttling or timeout error halves the window, at most once per
+    target_latency so one burst of errors does not collapse it to the minimum.
+    """
+
+    def __init__(self, start=CONCURRENCY, minimum=1, maximum=CONCURRENCY * 4, target_latency=TARGET_LATENCY):
+        self.limit = float(start)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.throttles = 0
+        self._in_flight = 0
+        self._last_cut = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def record(self, latency):
+        """Feeds back the duration of a successful commit"""
+        with self._cond:
+            if latency > self.target_latency:
+                self.limit = max(self.minimum, self.limit * 0.9)
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def throttled(self, error=None):
+        """Halves the window after a retryable commit error"""
+        with self._cond:
+            self.throttles += 1
+            now = time.monotonic()
+            if now - self._last_cut >= self.target_latency:
+                self._last_cut = now
+                self.limit = max(self.minimum, self.limit / 2)
+
+class BatchWriter:
+    """Buffers set() calls into batches and commits up to `concurrency` of them at once.
+
+    set() blocks once `concurrency` commits are already in flight (or as many
+    as `limiter`, an AdaptiveLimit, currently allows), which keeps
+    the stages upstream from running far ahead of Firestore. close() waits for
+    every commit and re-raises the first failure.
+    """
+
+    def __init__(self, db, concurrency=CONCURRENCY, batch_size=BATCH_SIZE, retries=RETRIES,
+                 backoff=BACKOFF, on_commit=None, retryable=RETRYABLE, limiter=None):
+        self.db = db
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff
+        self.retryable = retryable
+        self.on_commit = on_commit
+        self.committed = 0
+        self._ops = []
+        self._after = set()         # Batches the buffered one has to wait for
+        self._future = None         # Future of the buffered batch, created by its first write
+        self.limiter = limiter
+        self._pool = ThreadPoolExecutor(limiter.maximum if limiter else concurrency)
+        self._slots = limiter or threading.BoundedSemaphore(concurrency)
+        self._futures = set()
+        self._error = None
+        self._lock = threading.Lock()
+
+    def set(self, ref, data, after=(), merge=False):
+        """Queues a write; returns the future of the batch that will carry it.
+
+        after holds futures of earlier batches that must commit first.
+        """
+        if self._future is None:
+            self._future = Future()
+        future = self._future
+        self._ops.append((ref, data, merge))
+        self._after.update(f for f in after if f is not future)
+        if len(self._ops) >= self.batch_size:
+            self.flush()
+        return future
+
+    def flush(self):
+        """Submits the buffered writes as one batch; returns its future, or None if empty"""
+        if self._error is not None:
+            raise self._error
+        if not self._ops:
+            return None
+        ops, after, future = self._ops, self._after, self._future
+        self._ops, self._after, self._future = [], set(), None
+        self._slots.acquire()
+        task = self._pool.submit(self._commit, ops, after, future)
+        with self._lock:
+            self._futures.add(task)
+        task.add_done_callback(self._done)
+        return future
+
+    def _commit(self, ops, after, future):
+        try:
+            # Dependencies were submitted earlier, so they're already running or done
+            wait(after)
+            for dependency in after:
+                if dependency.exception() is not None:
+                    raise RuntimeError('A batch this one depends on failed') from dependency.exception()
+            start = time.monotonic()
+            count = commit_with_retry(self.db, ops, self.retries, self.backoff, self.retryable,
+                                      self.limiter.throttled if self.limiter else None)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        if self.limiter:
+            self.limiter.record(time.monotonic() - start)
+        with self._lock:
+            self.committed += count
+        future.set_result(count)
+        if self.on_commit:
+            self.on_commit(count)
+        return count
+
+    def _done(self, future):
+        self._slots.release()
+        with self._lock:
+            self._futures.discard(future)
+            if future.exception() is not None and self._error is None:
+                self._error = future.exception()
+
+    def close(self):
+        if self._ops and self._error is None:
+            self.flush()
+        with self._lock:
+            futures = list(self._futures)
+        wait(futures)
+        self._pool.shutdown()
+        if self._error is not None:
+            raise self._error
+        return self.committed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._pool.shutdown(wait=True)
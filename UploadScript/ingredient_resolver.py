@@ -0,0 +1,211 @@
+"""Local name -> document resolution for ingredients_list.
+
+The collection is read once into a sorted array of name_lower values, with
+a character-trigram index for fuzzy lookups. load() reads it through the
+shared document cache (see doc_cache): a names-only listing gives each
+ingredient's update_time, and only those added or edited since the last run
+are downloaded. So ingredients added or edited elsewhere, say by
+randomize_ingredients, are always seen with their current values. Lookups go
+exact -> prefix -> fuzzy, all in memory, instead of one or two queries per
+ingredient line. New ingredients get a document id derived from their name
+immediately and are written behind: in the same batch as the next recipe (set_with_pending),
+through a BatchWriter ahead of the recipes that use them (write_pending), or
+in 500-op batches by flush().
+
+Usage: python ingredient_resolver.py [name ...]   # Load the ingredients, then resolve names
+"""
+import sys
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+from checkpoint import content_id
+from doc_cache import CACHE_FILE, DocumentCache
+
+FUZZY_THRESHOLD = 0.7       # Minimum trigram Dice similarity for a fuzzy match
+BATCH_SIZE = 500
+
+def trigrams(name):
+    padded = f'  {name} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class IngredientResolver:
+    def __init__(self, ingredients=None):
+        self.ingredients = {}       # name_lower -> (doc id, data)
+        self.names = []             # Sorted name_lower values, for prefix search
+        self._grams = {}            # Trigram -> list of names containing it
+        self._gram_counts = {}      # name_lower -> number of distinct trigrams
+        self._pending = []          # (reference, data) of ingredients not yet written
+        self._writes = {}           # doc id -> future of the BatchWriter batch writing it
+        self._lock = threading.RLock()
+        for name_lower, (doc_id, data) in (ingredients or {}).items():
+            self._insert(name_lower, doc_id, data)
+        self.names = sorted(self.ingredients)
+
+    def __len__(self):
+        return len(self.ingredients)
+
+    def _insert(self, name_lower, doc_id, data):
+        if name_lower in self.ingredients:
+            return
+        self.ingredients[name_lower] = (doc_id, data)
+        grams = trigrams(name_lower)
+        self._gram_counts[name_lower] = len(grams)
+        for gram in grams:
+            self._grams.setdefault(gram, []).append(name_lower)
+
+    def exact(self, name_lower):
+        return self.ingredients.get(name_lower)
+
+    def prefix(self, name_lower):
+        """First name, in sort order, that starts with name_lower (the old >=/<= range query)"""
+        with self._lock:
+            i = bisect_left(self.names, name_lower)
+            if i < len(self.names) and self.names[i].startswith(name_lower):
+                return self.ingredients[self.names[i]]
+        return None
+
+    def fuzzy(self, name_lower, threshold=FUZZY_THRESHOLD):
+        """Most similar name by trigram Dice coefficient, if at least threshold"""
+        grams = trigrams(name_lower)
+        shared = Counter()
+        with self._lock:
+            for gram in grams:
+                shared.update(self._grams.get(gram, ()))
+            best, best_score = None, 0.0
+            for name, count in shared.items():
+                score = 2 * count / (len(grams) + self._gram_counts[name])
+                if score > best_score or (score == best_score and name < best):
+                    best, best_score = name, score
+            if best is None or best_score < threshold:
+                return None
+            return self.ingredients[best]
+
+    def resolve(self, name_lower, prefix=False, fuzzy=False):
+        """(doc id, data, 'exact' | 'prefix' | 'fuzzy') of the best match, or None"""
+        found = self.exact(name_lower)
+        if found:
+            return found + ('exact',)
+        if prefix:
+            found = self.prefix(name_lower)
+            if found:
+                return found + ('prefix',)
+        if fuzzy:
+            found = self.fuzzy(name_lower)
+            if found:
+                return found + ('fuzzy',)
+        return None
+
+    def create(self, db, data):
+        """Registers a new ingredient under an id derived from its name; the write waits for flush()
+
+        The same name always gets the same id, so an upload rerun after a
+        crash rewrites the ingredients it already wrote instead of duplicating them.
+        """
+        with self._lock:
+            existing = self.exact(data['name_lower'])
+            if existing:
+                return existing
+            ref = db.collection('ingredients_list').document(content_id('ingredient', data['name_lower']))
+            self._insert(data['name_lower'], ref.id, data)
+            insort(self.names, data['name_lower'])
+            self._pending.append((ref, data))
+            return ref.id, data
+
+    def write_pending(self, writer):
+        """Hands every pending ingredient to a BatchWriter, ahead of anything queued after"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+            for ref, data in pending:
+                self._writes[ref.id] = writer.set(ref, data)
+
+    def after(self, ingredient_ids):
+        """Futures of the in-flight batches that create any of these ingredients"""
+        with self._lock:
+            futures = {self._writes.get(ingredient_id) for ingredient_id in ingredient_ids}
+            futures.discard(None)
+            return {future for future in futures if not future.done()}
+
+    def set_with_pending(self, db, ref, data):
+        """Writes one document in the same batch as every pending ingredient"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        batch = db.batch()
+        for ingredient_ref, ingredient_data in pending:
+            batch.set(ingredient_ref, ingredient_data)
+        batch.set(ref, data)
+        try:
+            batch.commit()
+        except Exception:
+            with self._lock:
+                self._pending[:0] = pending
+            raise
+
+    def flush(self, db):
+        """Writes every pending ingredient in 500-op batches; returns how many were written"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for start in range(0, len(pending), BATCH_SIZE):
+            batch = db.batch()
+            for ref, data in pending[start:start + BATCH_SIZE]:
+                batch.set(ref, data)
+            try:
+                batch.commit()
+            except Exception:
+                with self._lock:
+                    self._pending[:0] = pending[start:]
+                raise
+        return len(pending)
+
+    @classmethod
+    def from_firestore(cls, db, cache=None):
+        """Reads the whole collection, through cache (a DocumentCache for ingredients_list) if given"""
+        ingredients = {}
+        fixes = []
+        collection = db.collection('ingredients_list')
+        if cache is not None:
+            docs = cache.scan()     # Downloads only the ingredients that changed since the last run
+        else:
+            docs = {doc.id: doc.to_dict() for doc in collection.stream()}
+        for doc_id, data in docs.items():
+            if 'name_lower' not in data:
+                if 'name' not in data:
+                    print(f"Skipping doc {doc_id} — no name field.")
+                    continue
+                data['name_lower'] = data['name'].lower()
+                fixes.append((collection.document(doc_id), data['name_lower']))
+            ingredients.setdefault(data['name_lower'], (doc_id, data))
+        for start in range(0, len(fixes), BATCH_SIZE):
+            batch = db.batch()
+            for ref, name_lower in fixes[start:start + BATCH_SIZE]:
+                batch.update(ref, {'name_lower': name_lower})
+            batch.commit()
+        if fixes:
+            if cache is not None:
+                cache.invalidate(ref.id for ref, _ in fixes)
+            print(f"Fixed missing name_lower on {len(fixes)} ingredients")
+        return cls(ingredients)
+
+    @classmethod
+    def load(cls, db, path=CACHE_FILE):
+        """Reads the collection through the document cache at path, downloading only changed ingredients"""
+        cache = DocumentCache(db, 'ingredients_list', path)
+        try:
+            return cls.from_firestore(db, cache=cache)
+        finally:
+            cache.close()
+
+if __name__ == '__main__':
+    cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
+    firebase_admin.initialize_app(cred)
+    db = firestore.client()
+
+    start = time.perf_counter()
+    resolver = IngredientResolver.load(db)
+    print(f"✅ Loaded {len(resolver)} ingredients in {time.perf_counter() - start:.1f}s")
+    for name in sys.argv[1:]:
+        print(f"{name}: {resolver.resolve(name.lower(), prefix=True, fuzzy=True)}")
@@ -0,0 +1,222 @@
+"""Server-side "cook with what you have" recipe rankings.
+
+An inverted index maps each ingredient (its ingredients_list id where the
+name resolves, otherwise the lowercased name) to the recipe rows that use it.
+Ranking a user's inventory is then one bincount over the postings of the
+items they own, instead of the app downloading the recipes collection and
+comparing every recipe on the phone. Results go to
+users/{uid}/recommendations/inventory so the app reads them in one get.
+
+The postings are rebuilt from a snapshot of the RecipeIndex taken under its
+lock, but built outside it, so the recommendation worker sharing the index
+is not blocked. Like the scoring matrix, they are rebuilt at most once per
+rebuild_interval (see recipe_scoring).
+
+Usage: python inventory_ranking.py      # Keeps every user's ranking current
+"""
+import datetime
+import itertools
+import threading
+import time
+
+import firebase_admin
+import numpy as np
+from firebase_admin import credentials, firestore
+
+from recipe_index import INGREDIENT_PREFIX, RecipeIndex
+from recipe_scoring import REBUILD_INTERVAL
+
+TOP_K = 20
+EXPIRY_HORIZON_DAYS = 7     # Items expiring within this many days boost recipes that use them
+BATCH_SIZE = 500
+
+def load_ingredient_ids(db):
+    """name_lower -> ingredients_list doc id, read once"""
+    ids = {}
+    for doc in db.collection('ingredients_list').select(['name', 'name_lower']).stream():
+        data = doc.to_dict()
+        name = data.get('name_lower') or (data.get('name') or '').lower()
+        if name:
+            ids.setdefault(name, doc.id)
+    return ids
+
+def _days_left(expiry, now):
+    if expiry is None:
+        return None
+    if isinstance(expiry, datetime.datetime):
+        if expiry.tzinfo is None:
+            expiry = expiry.replace(tzinfo=datetime.timezone.utc)
+        return (expiry - now).total_seconds() / 86400
+    return None
+
+class InventoryRanker:
+    def __init__(self, index, ingredient_ids, rebuild_interval=REBUILD_INTERVAL):
+        self.index = index
+        self.ingredient_ids = ingredient_ids
+        self.rebuild_interval = rebuild_interval
+        self._version = None
+        self._built = 0.0
+        self._keys = []             # Feature id -> posting key (None for keywords); the vocabulary only grows
+        self._lock = threading.Lock()
+
+    def key(self, name):
+        name = name.strip().lower()
+        return self.ingredient_ids.get(name, name)
+
+    def _build(self):
+        index = self.index
+        with index._lock:
+            # Upserts replace a row's feature array rather than editing it, so copying the list is a snapshot
+            features = list(index.features)
+            recipe_ids = list(index.recipe_ids)
+            expiry_days = np.frombuffer(index.expiry_days.tobytes(), dtype=np.int32).copy()
+            new_names = list(itertools.islice(index.vocab, len(self._keys), None))
+            version = index.version
+        # Feature ids are handed out in vocab order, so only names added since the last build need a key
+        self._keys.extend(self.key(name[len(INGREDIENT_PREFIX):]) if name.startswith(INGREDIENT_PREFIX) else None
+                          for name in new_names)
+        keys_of = self._keys
+        postings = {}
+        sizes = np.zeros(len(features), dtype=np.int32)
+        for row, row_features in enumerate(features):
+            keys = {keys_of[fid] for fid in row_features}
+            keys.discard(None)
+            sizes[row] = len(keys)
+            for key in keys:
+                postings.setdefault(key, []).append(row)
+        self._postings = {key: np.array(rows, dtype=np.int32) for key, rows in postings.items()}
+        self._sizes = sizes
+        self._recipe_ids = recipe_ids
+        self._expiry_days = expiry_days
+        self._version = version
+
+    def _score(self, inventory, now):
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        with self._lock:
+            if self._version is None or (self._version != self.index.version
+                                         and time.monotonic() - self._built >= self.rebuild_interval):
+                self._build()
+                self._built = time.monotonic()
+            postings, sizes = self._postings, self._sizes
+
+        owned = {}
+        for name, expiry in inventory:
+            key = self.key(name)
+            days = _days_left(expiry, now)
+            urgency = 0.0
+            if days is not None and days <= EXPIRY_HORIZON_DAYS:
+                urgency = 1.0 / (1.0 + max(days, 0.0))
+            owned[key] = max(owned.get(key, 0.0), urgency)
+
+        hits = [postings[key] for key in owned if key in postings]
+        if not hits:
+            return None
+        have = np.bincount(np.concatenate(hits), minlength=len(sizes))
+        urgent = np.zeros(len(sizes))
+        for key, urgency in owned.items():
+            if urgency and key in postings:
+                urgent[postings[key]] += urgency
+        candidates = np.flatnonzero(have)
+        missing = sizes[candidates] - have[candidates]
+        coverage = have[candidates] / np.maximum(sizes[candidates], 1)
+        return candidates, missing, coverage, urgent[candidates]
+
+    def _results(self, candidates, missing, coverage, urgent, order):
+        return [{
+            'id': self._recipe_ids[candidates[i]],
+            'missing': int(missing[i]),
+            'coverage': round(float(coverage[i]), 3),
+            'expiringUsed': round(float(urgent[i]), 3),
+        } for i in order]
+
+    def rank(self, inventory, k=TOP_K, now=None):
+        """Ranks recipes for an inventory of (name, expiry datetime or None) pairs.
+
+        Fewest missing ingredients first, then most soon-to-expire items used,
+        then highest coverage. Recipes sharing no ingredient are never returned.
+        """
+        scored = self._score(inventory, now)
+        if scored is None:
+            return []
+        candidates, missing, coverage, urgent = scored
+        order = np.lexsort((-coverage, -urgent, missing))[:k]
+        return self._results(candidates, missing, coverage, urgent, order)
+
+    def use_soon(self, inventory, k=TOP_K, now=None):
+        """Recipes that use up soon-to-expire items, for "use soon" suggestions.
+
+        Most expiring stock used first, then fewest missing ingredients, then
+        dishes with the longest ExpiryDate so the cooked food keeps longer.
+        """
+        scored = self._score(inventory, now)
+        if scored is None:
+            return []
+        candidates, missing, coverage, urgent = scored
+        keep_days = self._expiry_days[candidates]
+        order = np.lexsort((-keep_days, missing, -urgent))
+        order = order[urgent[order] > 0][:k]
+        return self._results(candidates, missing, coverage, urgent, order)
+
+def get_inventory(db, user_id):
+    items = []
+    for doc in db.collection('users').document(user_id).collection('inventory').stream():
+        data = doc.to_dict()
+        if data.get('name'):
+            items.append((data['name'], data.get('expiry_date')))
+    return items
+
+def update_inventory_rankings(db, user_ids, ranker):
+    """Ranks each user's inventory and writes the results in batched commits"""
+    batch = db.batch()
+    pending = 0
+    for user_id in user_ids:
+        ranking = ranker.rank(get_inventory(db, user_id))
+        ref = db.collection('users').document(user_id).collection('recommendations').document('inventory')
+        batch.set(ref, {'recipes': ranking, 'updatedAt': firestore.SERVER_TIMESTAMP})
+        pending += 1
+        if pending == BATCH_SIZE:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+
+def main():
+    cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
+    firebase_admin.initialize_app(cred)
+    db = firestore.client()
+
+    index = RecipeIndex.load()
+    index.listen(db)
+    ranker = InventoryRanker(index, load_ingredient_ids(db))
+
+    dirty = set()
+    lock = threading.Lock()
+
+    def on_inventory(docs, changes, read_time):
+        with lock:
+            for change in changes:
+                dirty.add(change.document.reference.path.split('/')[1])
+
+    watch = db.collection_group('inventory').on_snapshot(on_inventory)
+    try:
+        while True:
+            time.sleep(5)
+            with lock:
+                user_ids = list(dirty)
+                dirty.clear()
+            if user_ids:
+                try:
+                    update_inventory_rankings(db, user_ids, ranker)
+                    print(f"Updated inventory rankings for {len(user_ids)} users.")
+                except Exception as e:
+                    print(f"Error updating inventory rankings: {e}")
+                    with lock:
+                        dirty.update(user_ids)
+    finally:
+        watch.unsubscribe()
+        index.stop()
+        index.save()
+
+if __name__ == '__main__':
+    main()
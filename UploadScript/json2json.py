@@ -1,12 +1,11 @@
-import json
-import random
-import re
+from quantities import grams_per_unit, parse_amount
+from r_vectors import parse_r_vector
+from record_stream import iter_records, write_json_array
 
-def parse_r_list(r_string):
-    """Parses R-style c(...) strings into a Python list."""
+def parse_r_list(r_string, drop_na=False):
+    """Parses R-style c(...) strings into a Python list; NA elements become None unless drop_na."""
     if isinstance(r_string, str) and r_string.startswith("c("):
-        items = re.findall(r'"(.*?)"', r_string)
-        return items
+        return parse_r_vector(r_string, drop_na=drop_na)
     return []
 
 def clean_image_string(image_str):
@@ -17,34 +16,34 @@ def clean_image_string(image_str):
     return []
 
 def convert_recipe_data(raw_data):
-    transformed = []
-
+    """Yields the cleaned form of each raw recipe, so the input can be a stream"""
     for recipe in raw_data:
         ingredients = []
         quantities = parse_r_list(recipe.get("RecipeIngredientQuantities", ""))
         parts = parse_r_list(recipe.get("RecipeIngredientParts", ""))
 
         for qty, part in zip(quantities, parts):
-            try:
-                quantity = float(eval(qty))
-            except:
+            if part is None:
+                continue
+            quantity, unit = parse_amount(qty)
+            if quantity is None:
                 quantity = 1  # fallback if invalid
-            weight = round(quantity * random.uniform(10, 20), 2)
+            weight = round(quantity * grams_per_unit(unit, part), 2)
             ingredients.append({
                 "name": part.strip(),
                 "weight": weight
             })
 
         raw_instructions = recipe.get("RecipeInstructions", "")
-        instructions = " ".join(parse_r_list(raw_instructions))
+        instructions = " ".join(parse_r_list(raw_instructions, drop_na=True))
 
-        transformed.append({
+        yield {
             "name": recipe.get("Name", "Unknown Recipe"),
             "prepTime": recipe.get("PrepTime", ""),
             "cookTime": recipe.get("CookTime", ""),
             "expiryDate": recipe.get("ExpiryDate", 4),
             "category": recipe.get("RecipeCategory", "Other"),
-            "keywords": parse_r_list(recipe.get("Keywords", "")),
+            "keywords": parse_r_list(recipe.get("Keywords", ""), drop_na=True),
             "servings": str(recipe.get("RecipeServings", "") or "1"),
             "yield": recipe.get("RecipeYield", "") or "",
             "instructions": instructions,
@@ -61,17 +60,9 @@ def convert_recipe_data(raw_data):
             "sodiumContent": recipe.get("SodiumContent", 0),
             "fiberContent": recipe.get("FiberContent", 0),
             "sugarContent": recipe.get("SugarContent", 0)
-        })
-
-    return transformed
+        }
 
 # Usage
-with open('meals_trimmed.json', 'r') as f:
-    raw_data = json.load(f)
-
-cleaned_data = convert_recipe_data(raw_data)
-
-with open('cleaned_recipes.json', 'w') as f:
-    json.dump(cleaned_data, f, indent=2)
+count = write_json_array('cleaned_recipes.json', convert_recipe_data(iter_records('meals_trimmed.json')))
 
-print("✅ Data cleaning complete — full fields included!")
+print(f"✅ Data cleaning complete — full fields included! ({count} recipes)")
@@ -0,0 +1,120 @@
+"""Recipe nutrition totals from ingredients_list held as a NumPy matrix.
+
+Each ingredient is one row of per-100 g values, one column per nutrient in
+NUTRIENTS order. Missing and None values count as 0. A recipe is a list of
+(row, grams) pairs:
+
+    table = NutritionTable.from_resolver(resolver)
+    rows = [[(table.row(ing_id, data), grams), ...], ...]
+    totals = table.totals(rows)         # recipes x nutrients, one sparse x dense product
+    docs = [recipe_fields(t) for t in totals]
+
+recipe_fields() gives the recipe document fields. Cholesterol and sodium
+totals of 0 become None, as the uploaders always did. Writers stamp
+SUMMED_FIELD next to them, so nutrition_delta can tell which ingredient
+values a recipe's totals were summed with. Cholesterol is summed
+like every other nutrient; three of the old copies never added it up.
+"""
+import threading
+
+import numpy as np
+from scipy import sparse
+
+# Ingredient field -> recipe field, in matrix column order
+NUTRIENTS = {
+    'calories': 'Calories',
+    'protein': 'ProteinContent',
+    'carbohydrate': 'CarbohydrateContent',
+    'fat': 'FatContent',
+    'saturatedfat': 'SaturatedFatContent',
+    'cholesterol': 'CholesterolContent',
+    'sodium': 'SodiumContent',
+    'fiber': 'FiberContent',
+    'sugar': 'SugarContent',
+}
+RECIPE_FIELDS = tuple(NUTRIENTS.values())
+SUMMED_FIELD = 'NutritionSummedAt'  # Server time a recipe's totals were last summed from ingredients_list
+NONE_IF_ZERO = ('CholesterolContent', 'SodiumContent')
+
+def nutrient_vector(data):
+    """Per-100 g values of one ingredient document, in column order"""
+    return [float(data.get(field) or 0) for field in NUTRIENTS]
+
+def recipe_fields(totals):
+    """Recipe document fields for one row of totals"""
+    fields = dict(zip(RECIPE_FIELDS, map(float, totals)))
+    for field in NONE_IF_ZERO:
+        if fields[field] == 0:
+            fields[field] = None
+    return fields
+
+class NutritionTable:
+    def __init__(self):
+        self.rows = {}              # ingredient id -> row
+        self._matrix = np.zeros((1024, len(NUTRIENTS)))
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    @classmethod
+    def from_ingredients(cls, ingredients):
+        """From (ingredient id, data) pairs"""
+        table = cls()
+        for ingredient_id, data in ingredients:
+            table.row(ingredient_id, data)
+        return table
+
+    @classmethod
+    def from_resolver(cls, resolver):
+        return cls.from_ingredients(resolver.ingredients.values())
+
+    @property
+    def matrix(self):
+        return self._matrix[:self._size]
+
+    def row(self, ingredient_id, data=None):
+        """Row of an ingredient, added from data (all zeros if None) the first time it is seen"""
+        row = self.rows.get(ingredient_id)
+        if row is not None:
+            return row
+        with self._lock:
+            row = self.rows.get(ingredient_id)
+            if row is None:
+                if self._size == len(self._matrix):
+                    self._matrix = np.concatenate([self._matrix, np.zeros_like(self._matrix)])
+                row = self._size
+                self._matrix[row] = nutrient_vector(data or {})
+                self._size += 1
+                self.rows[ingredient_id] = row
+            return row
+
+    def update(self, ingredient_id, data):
+        """Replaces an ingredient's values; returns its row"""
+        row = self.row(ingredient_id)
+        with self._lock:
+            self._matrix[row] = nutrient_vector(data)
+        return row
+
+    def weights(self, recipes, num_rows=None):
+        """recipes x ingredients CSR matrix of grams / 100 from lists of (row, grams)"""
+        indptr = np.zeros(len(recipes) + 1, dtype=np.int64)
+        np.cumsum([len(pairs) for pairs in recipes], out=indptr[1:])
+        indices = np.fromiter((row for pairs in recipes for row, _ in pairs), dtype=np.int64,
+                              count=indptr[-1])
+        data = np.fromiter((grams or 0 for pairs in recipes for _, grams in pairs), dtype=float,
+                           count=indptr[-1]) / 100.0
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(recipes), num_rows or self._size))
+
+    def totals(self, recipes):
+        """recipes x nutrients array of totals for lists of (row, grams)"""
+        matrix = self.matrix  # Taken first: rows added meanwhile are not in these recipes
+        return np.asarray(self.weights(recipes, len(matrix)) @ matrix)
+
+    def recipe_totals(self, pairs):
+        """Totals of a single recipe; cheaper than totals() for one recipe"""
+        if not pairs:
+            return np.zeros(len(NUTRIENTS))
+        rows, grams = zip(*pairs)
+        return np.asarray([g or 0 for g in grams], dtype=float) @ self._matrix[list(rows)] / 100.0
@@ -0,0 +1,272 @@
+"""Carry ingredients_list changes into recipe nutrition totals without recomputing them.
+
+IngredientUsage is a reverse index from ingredient name to the recipes that
+use it and how many grams each uses, built from one select() read of
+RecipeIngredientParts / RecipeIngredientQuantities and saved locally. It also
+records the nutrient vector of each ingredient that the stored totals
+reflect, so an edit is a delta:
+
+    usage = IngredientUsage.load(db)                # Before the ingredients change
+    ...
+    apply_changes(db, usage, {'butter': new_data})  # name_lower -> new ingredient data
+    usage.save()
+
+Each affected recipe gets weights @ deltas, written as Increment transforms in
+500-op batches. No recipe document is read and recipes that do not use a
+changed ingredient are not touched. A total that reaches 0 stays 0 rather than
+turning into None the way a fresh upload would store it.
+
+The index also keeps each recipe's SUMMED_FIELD, the server time its totals
+were summed at upload or backfill. changed_ingredients notes when each changed
+ingredient was last written, and a recipe summed after that already has the
+new values, so it gets no delta. A recipe summed between two edits of one
+ingredient within a run still gets the delta from the recorded vector.
+
+The saved index is checked against a count of the recipes, and its usage is
+read again when the count differs (recipes were uploaded or deleted) or once
+it is older than USAGE_TTL. Only the usage is re-read: the recorded vectors
+are carried forward, since the stored totals still reflect them until the
+next delta. Only --rebuild takes the ingredients as they are now.
+
+Usage:
+  python nutrition_delta.py            # Apply every ingredients_list change since the last run
+  python nutrition_delta.py --rebuild  # Re-read the index, taking the stored totals as current
+"""
+import json
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+from firebase_admin import credentials, firestore
+from scipy import sparse
+
+from ingest_pipeline import NOT_APPLIED, BatchWriter
+from nutrition import NUTRIENTS, RECIPE_FIELDS, SUMMED_FIELD, nutrient_vector
+from recipe_dedup import count_recipes
+
+USAGE_FILE = 'nutrition_usage.pkl'
+USAGE_TTL = 24 * 3600       # Seconds before the recipes' usage is re-read (the vectors are kept)
+FAILED_FILE = 'nutrition_delta_failed.json'
+
+def ingredient_names(data):
+    """Names recipes may list an ingredient under"""
+    names = {data.get('name_lower'), (data.get('name') or '').strip().lower()}
+    names.discard(None)
+    names.discard('')
+    return names
+
+class IngredientUsage:
+    def __init__(self):
+        self.recipe_ids = []        # row -> recipe id
+        self.rows = {}              # recipe id -> row
+        self.parts = []             # row -> names the recipe uses
+        self.usage = {}             # name_lower -> {row: grams}
+        self.summed = []            # row -> when the recipe's totals were summed, None if unknown
+        self.vectors = {}           # name_lower -> nutrient vector the stored totals reflect
+        self.edited = {}            # name_lower -> when a changed ingredient was written
+        self.count = None           # Recipe documents the usage was read from
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add_recipe(self, recipe_id, parts, weights, summed=None):
+        """Indexes one recipe, replacing what was indexed for it before"""
+        row = self.rows.get(recipe_id)
+        if row is None:
+            row = len(self.recipe_ids)
+            self.rows[recipe_id] = row
+            self.recipe_ids.append(recipe_id)
+            self.parts.append(())
+            self.summed.append(None)
+        else:
+            self._unlink(row)
+        self.summed[row] = summed
+        names = set()
+        for part, weight in zip(parts or [], weights or []):
+            try:
+                grams = float(weight)
+            except (TypeError, ValueError):
+                continue
+            name = str(part).strip().lower()
+            recipes = self.usage.setdefault(name, {})
+            recipes[row] = recipes.get(row, 0.0) + grams
+            names.add(name)
+        self.parts[row] = tuple(names)
+
+    def remove_recipe(self, recipe_id):
+        row = self.rows.get(recipe_id)
+        if row is not None:
+            self._unlink(row)
+            self.parts[row] = ()
+            self.summed[row] = None
+
+    def _unlink(self, row):
+        for name in self.parts[row]:
+            recipes = self.usage.get(name)
+            if recipes is not None:
+                recipes.pop(row, None)
+
+    def recipes_using(self, name_lower):
+        """{recipe id: grams} of the recipes that list an ingredient"""
+        return {self.recipe_ids[row]: grams for row, grams in self.usage.get(name_lower, {}).items()}
+
+    def record(self, data):
+        """Takes an ingredient's current values as what the stored totals reflect"""
+        vector = nutrient_vector(data)
+        for name in ingredient_names(data):
+            self.vectors[name] = vector
+
+    def deltas(self, changes):
+        """(recipe ids, recipes x nutrients increments) for {name_lower: new data}"""
+        names, rows = [], []
+        for name, data in changes.items():
+            old = self.vectors.get(name)
+            if old is None or not self.usage.get(name):
+                continue
+            delta = np.subtract(nutrient_vector(data), old)
+            if delta.any():
+                names.append(name)
+                rows.append(delta)
+        if not names:
+            return [], np.zeros((0, len(NUTRIENTS)))
+
+        # recipes x changed ingredients, grams / 100, over the affected recipes only
+        affected = {}
+        indices, columns, grams = [], [], []
+        for column, name in enumerate(names):
+            edited = self.edited.get(name)
+            for row, weight in self.usage[name].items():
+                summed = self.summed[row]
+                if edited is not None and summed is not None and summed >= edited:
+                    continue    # Summed after the edit, so its totals have the new values
+                indices.append(affected.setdefault(row, len(affected)))
+                columns.append(column)
+                grams.append(weight)
+        weights = sparse.csr_matrix((np.asarray(grams) / 100.0, (indices, columns)),
+                                    shape=(len(affected), len(names)))
+        return [self.recipe_ids[row] for row in affected], np.asarray(weights @ np.vstack(rows))
+
+    def read_recipes(self, db):
+        """Re-reads which recipes use which ingredients, keeping the recorded vectors"""
+        self.recipe_ids, self.rows, self.parts, self.usage, self.summed = [], {}, [], {}, []
+        fields = ['RecipeIngredientParts', 'RecipeIngredientQuantities', SUMMED_FIELD]
+        for doc in db.collection('recipes').select(fields).stream():
+            data = doc.to_dict()
+            self.add_recipe(doc.id, data.get('RecipeIngredientParts'), data.get('RecipeIngredientQuantities'),
+                            data.get(SUMMED_FIELD))
+        self.count = len(self.recipe_ids)
+
+    @classmethod
+    def from_firestore(cls, db):
+        """Reads the recipe parts and weights, and takes the ingredients as the stored totals have them"""
+        usage = cls()
+        usage.read_recipes(db)
+        for doc in db.collection('ingredients_list').stream():
+            usage.record(doc.to_dict())
+        return usage
+
+    @classmethod
+    def read(cls, path=USAGE_FILE):
+        usage = cls()
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        usage.recipe_ids, usage.parts, usage.usage, usage.vectors = (
+            state['recipe_ids'], state['parts'], state['usage'], state['vectors'])
+        usage.count = state.get('count')
+        usage.summed = state.get('summed') or [None] * len(usage.recipe_ids)
+        usage.rows = {recipe_id: row for row, recipe_id in enumerate(usage.recipe_ids)}
+        return usage
+
+    @classmethod
+    def load(cls, db, path=USAGE_FILE, max_age=USAGE_TTL):
+        """Reads the saved index, re-reading the recipes' usage when it is stale; builds it when missing"""
+        if not os.path.exists(path):
+            usage = cls.from_firestore(db)
+            usage.save(path)
+            return usage
+        usage = cls.read(path)
+        if time.time() - os.path.getmtime(path) >= max_age or usage.count is None \
+                or usage.count != count_recipes(db):
+            print("Recipes may have changed since the usage index was saved; reading them again")
+            usage.read_recipes(db)
+            usage.save(path)
+        return usage
+
+    def save(self, path=USAGE_FILE):
+        state = {'recipe_ids': self.recipe_ids, 'parts': self.parts, 'usage': self.usage, 'vectors': self.vectors,
+                 'count': self.count, 'summed': self.summed}
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+def apply_changes(db, usage, changes, concurrency=None, failed_path=FAILED_FILE):
+    """Adds weight x delta to the totals of every recipe using a changed ingredient.
+
+    changes maps name_lower to the ingredient's new data. Returns how many
+    recipes were updated. Increments are not idempotent, so batches are only
+    retried on errors that guarantee nothing was applied; recipes in a batch
+    that failed anyway are written to failed_path for a full recompute, and
+    the new vectors are recorded either way so a rerun cannot apply a delta twice.
+    """
+    recipe_ids, increments = usage.deltas(changes)
+    futures = []
+    options = {'concurrency': concurrency} if concurrency else {}
+    recipes = db.collection('recipes')
+    error = None
+    try:
+        with BatchWriter(db, retryable=NOT_APPLIED, **options) as writer:
+            for recipe_id, increment in zip(recipe_ids, increments):
+                data = {field: firestore.Increment(float(value))
+                        for field, value in zip(RECIPE_FIELDS, increment) if value}
+                if data:
+                    futures.append((recipe_id, writer.set(recipes.document(recipe_id), data, merge=True)))
+    except Exception as e:
+        error = e
+
+    for name, data in changes.items():
+        if name in usage.vectors or name in usage.usage:
+            usage.vectors[name] = nutrient_vector(data)
+        usage.edited.pop(name, None)
+
+    failed = [recipe_id for recipe_id, future in futures if not future.done() or future.exception() is not None]
+    if failed:
+        with open(failed_path, 'w') as f:
+            json.dump(failed, f)
+        print(f"⚠️ {len(failed)} recipes not updated ({error}); ids saved to {failed_path} for a full recompute")
+    return len(futures) - len(failed)
+
+def changed_ingredients(db, usage):
+    """{name_lower: data} of ingredients whose values differ from the ones the totals reflect"""
+    changes = {}
+    for doc in db.collection('ingredients_list').stream():
+        data = doc.to_dict()
+        vector = nutrient_vector(data)
+        for name in ingredient_names(data):
+            old = usage.vectors.get(name)
+            if old is None:
+                usage.vectors[name] = vector    # New ingredient: its recipes were built with these values
+            elif old != vector:
+                changes[name] = data
+                usage.edited[name] = doc.update_time
+    return changes
+
+if __name__ == "__main__":
+    import firebase_admin
+
+    cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
+    firebase_admin.initialize_app(cred)
+    db = firestore.client()
+
+    if '--rebuild' in sys.argv:
+        usage = IngredientUsage.from_firestore(db)
+    else:
+        usage = IngredientUsage.load(db)
+    print(f"📇 Index covers {len(usage)} recipes, {len(usage.usage)} ingredient names")
+    changes = changed_ingredients(db, usage)
+    print(f"🔎 {len(changes)} ingredients changed since the last run")
+    updated = apply_changes(db, usage, changes)
+    usage.save()
+    print(f"✅ Updated nutrition totals of {updated} recipes")
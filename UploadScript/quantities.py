@@ -0,0 +1,217 @@
+"""Ingredient quantities and units, and their weight in grams.
+
+Parses the amount strings in the recipe dumps without eval():
+
+    '2', '1.5', '.5'                    ->  (2.0, None), (1.5, None), (0.5, None)
+    '1/2', '1 1/2', '1½', '¾'           ->  (0.5, None), (1.5, None), (1.5, None), (0.75, None)
+    '1-1/2', '1 - 1/2'                  ->  (1.5, None), (1.5, None)                # mixed numbers, not ranges
+    '1-2', '1 -2', '2 to 3'             ->  (1.5, None), (1.5, None), (2.5, None)   # ranges give the mean
+    '2 cups', '1 tbsp.', '8 fl oz'      ->  (2.0, 'cup'), (1.0, 'tbsp'), (8.0, 'fl oz')
+    '2 T', '1 t.'                       ->  (2.0, 'tbsp'), (1.0, 'tsp')             # case decides which
+
+grams_per_unit() turns one unit of an ingredient into grams: mass units
+directly, volume units through a density table, and counts through a table
+of typical piece weights. Food.com quantities carry no unit, so a bare count
+means the unit the ingredient is usually measured in ('2' milk is 2 cups,
+'1' salt is 1 teaspoon, '3' eggs are 3 eggs).
+
+parse_quantities() and to_grams() work on whole columns: each distinct
+string or (unit, ingredient) pair is parsed once and the rest is NumPy.
+"""
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_PIECE_GRAMS = 15.0   # Unknown ingredient, no unit: the mean of the old 10-20 g guess
+DEFAULT_DENSITY = 1.0        # g/ml when the ingredient is not in the table (water)
+CACHE_SIZE = 1 << 16
+
+_FRACTIONS = {
+    '½': ' 1/2', '⅓': ' 1/3', '⅔': ' 2/3', '¼': ' 1/4', '¾': ' 3/4', '⅕': ' 1/5', '⅖': ' 2/5',
+    '⅗': ' 3/5', '⅘': ' 4/5', '⅙': ' 1/6', '⅚': ' 5/6', '⅛': ' 1/8', '⅜': ' 3/8', '⅝': ' 5/8',
+    '⅞': ' 7/8', '⁄': '/', '–': '-', '—': '-',
+}
+_NUMBER = r'(?:\d+(?:\s+|\s*-\s*)\d+\s*/\s*\d+|\d+\s*/\s*\d+|\d+(?:\.\d*)?|\.\d+)'
+_AMOUNT = re.compile(rf'(?:about|approx\.?|approximately)?\s*({_NUMBER})'
+                     rf'(?:\s*(?:-|to|or)\s*({_NUMBER}))?\s*(.*)', re.S | re.I)
+
+# Canonical unit -> ('ml' | 'g' | 'each', size in that dimension)
+UNITS = {
+    'tsp': ('ml', 4.93), 'tbsp': ('ml', 14.79), 'cup': ('ml', 236.6), 'fl oz': ('ml', 29.57),
+    'pint': ('ml', 473.2), 'quart': ('ml', 946.4), 'gallon': ('ml', 3785.4),
+    'ml': ('ml', 1.0), 'cl': ('ml', 10.0), 'dl': ('ml', 100.0), 'l': ('ml', 1000.0),
+    'pinch': ('ml', 0.31), 'dash': ('ml', 0.62),
+    'g': ('g', 1.0), 'kg': ('g', 1000.0), 'mg': ('g', 0.001), 'oz': ('g', 28.35), 'lb': ('g', 453.6),
+    'stick': ('g', 113.0), 'can': ('g', 400.0), 'package': ('g', 250.0),
+    'each': ('each', 1.0),
+}
+_UNIT_ALIASES = {
+    'teaspoon': 'tsp', 'tsp': 'tsp', 'tablespoon': 'tbsp', 'tbsp': 'tbsp', 'tbs': 'tbsp', 'tbl': 'tbsp',
+    'cup': 'cup', 'c': 'cup', 'fluid ounce': 'fl oz', 'fl oz': 'fl oz', 'fl. oz': 'fl oz',
+    'pint': 'pint', 'pt': 'pint', 'quart': 'quart', 'qt': 'quart', 'gallon': 'gallon', 'gal': 'gallon',
+    'milliliter': 'ml', 'millilitre': 'ml', 'ml': 'ml', 'cl': 'cl', 'dl': 'dl',
+    'liter': 'l', 'litre': 'l', 'l': 'l', 'pinch': 'pinch', 'dash': 'dash',
+    'gram': 'g', 'g': 'g', 'gr': 'g', 'kilogram': 'kg', 'kg': 'kg', 'milligram': 'mg', 'mg': 'mg',
+    'ounce': 'oz', 'oz': 'oz', 'pound': 'lb', 'lb': 'lb', 'lbs': 'lb',
+    'stick': 'stick', 'can': 'can', 'tin': 'can', 'package': 'package', 'pkg': 'package',
+    'packet': 'package', 'each': 'each', 'piece': 'each', 'whole': 'each', 'clove': 'each',
+    'slice': 'each', 'large': 'each', 'medium': 'each', 'small': 'each',
+}
+_CASED_UNITS = {'T': 'tbsp', 't': 'tsp'}   # Recipe shorthand, told apart only by case
+_IRREGULAR = {'leaves': 'leaf', 'halves': 'half', 'loaves': 'loaf', 'berries': 'berry', 'cherries': 'cherry'}
+
+# Keyword in the ingredient name -> (g/ml, unit a bare count means)
+INGREDIENT_UNITS = {
+    'water': (1.0, 'cup'), 'milk': (1.03, 'cup'), 'buttermilk': (1.03, 'cup'), 'cream': (1.0, 'cup'),
+    'sour cream': (1.0, 'cup'), 'yogurt': (1.05, 'cup'), 'broth': (1.0, 'cup'), 'stock': (1.0, 'cup'),
+    'wine': (0.99, 'cup'), 'juice': (1.04, 'tbsp'), 'vinegar': (1.01, 'tbsp'), 'sauce': (1.1, 'tbsp'),
+    'flour': (0.53, 'cup'), 'sugar': (0.85, 'cup'), 'brown sugar': (0.93, 'cup'),
+    'powdered sugar': (0.5, 'cup'), 'confectioner sugar': (0.5, 'cup'), 'icing sugar': (0.5, 'cup'),
+    'rice': (0.85, 'cup'), 'oat': (0.34, 'cup'), 'breadcrumb': (0.45, 'cup'), 'cheese': (0.45, 'cup'),
+    'nut': (0.55, 'cup'), 'walnut': (0.5, 'cup'), 'pecan': (0.45, 'cup'), 'raisin': (0.65, 'cup'),
+    'chocolate chip': (0.72, 'cup'), 'corn': (0.7, 'cup'), 'pea': (0.6, 'cup'), 'bean': (0.75, 'cup'),
+    'butter': (0.96, 'tbsp'), 'margarine': (0.96, 'tbsp'), 'shortening': (0.82, 'tbsp'),
+    'oil': (0.92, 'tbsp'), 'honey': (1.42, 'tbsp'), 'molasses': (1.4, 'tbsp'), 'syrup': (1.33, 'tbsp'),
+    'peanut butter': (1.08, 'tbsp'), 'mayonnaise': (0.91, 'tbsp'), 'ketchup': (1.1, 'tbsp'),
+    'cocoa': (0.42, 'tbsp'), 'cornstarch': (0.54, 'tbsp'), 'parsley': (0.25, 'tbsp'),
+    'cilantro': (0.25, 'tbsp'), 'basil': (0.25, 'tbsp'),
+    'salt': (1.2, 'tsp'), 'pepper': (0.5, 'tsp'), 'paprika': (0.46, 'tsp'), 'cinnamon': (0.56, 'tsp'),
+    'cumin': (0.43, 'tsp'), 'oregano': (0.2, 'tsp'), 'thyme': (0.3, 'tsp'), 'dried basil': (0.15, 'tsp'),
+    'nutmeg': (0.47, 'tsp'), 'ginger': (0.4, 'tsp'), 'mustard': (0.4, 'tsp'), 'extract': (0.88, 'tsp'),
+    'baking soda': (0.96, 'tsp'), 'baking powder': (0.9, 'tsp'), 'yeast': (0.6, 'tsp'),
+}
+# Keyword in the ingredient name -> grams per piece
+PIECE_GRAMS = {
+    'egg': 50, 'egg white': 33, 'egg yolk': 17, 'onion': 110, 'red onion': 150, 'green onion': 15,
+    'garlic': 5, 'garlic clove': 5, 'clove': 5, 'shallot': 40, 'tomato': 120, 'potato': 170,
+    'sweet potato': 130, 'carrot': 60, 'celery': 40, 'eggplant': 450, 'zucchini': 200,
+    'bell pepper': 120, 'jalapeno': 15, 'cucumber': 300, 'avocado': 200, 'mushroom': 18,
+    'banana': 120, 'apple': 180, 'pear': 180, 'orange': 130, 'lemon': 85, 'lime': 65, 'peach': 150,
+    'chicken breast': 175, 'chicken thigh': 115, 'pork chop': 200, 'sausage': 75, 'bacon': 12,
+    'tortilla': 45, 'bay leaf': 0.2, 'bread': 30,
+}
+
+def _singular(word):
+    if word in _IRREGULAR:
+        return _IRREGULAR[word]
+    if len(word) <= 3 or not word.endswith('s') or word.endswith(('ss', 'us')):
+        return word
+    if word.endswith('ies') and len(word) > 4:
+        return word[:-3] + 'y'
+    if word.endswith(('ches', 'shes', 'sses', 'oes', 'xes', 'zes')):
+        return word[:-2]
+    return word[:-1]
+
+def _normal_words(text):
+    return ' '.join(_singular(word) for word in re.findall(r'[a-z]+', text.lower()))
+
+_KEYWORDS = {}
+for _table, _kind in ((INGREDIENT_UNITS, 'unit'), (PIECE_GRAMS, 'each')):
+    for _keyword, _value in _table.items():
+        _KEYWORDS[_normal_words(_keyword)] = (_kind, _value)
+_KEYWORD = re.compile(r'\b(?:' + '|'.join(sorted(map(re.escape, _KEYWORDS), key=len, reverse=True)) + r')\b')
+
+def _number(text):
+    whole, _, fraction = text.replace('-', ' ').replace(' /', '/').replace('/ ', '/').rpartition(' ')
+    if '/' in fraction:
+        numerator, denominator = fraction.split('/')
+        if float(denominator) == 0:
+            return None
+        value = float(numerator) / float(denominator)
+    else:
+        value = float(fraction)
+    return value + float(whole) if whole else value
+
+def canonical_unit(word):
+    """Canonical unit for a unit word ('Tablespoons', 'tbsp.', 'fl oz', 'T'), or None"""
+    word = word.strip().rstrip('.')
+    if word in _CASED_UNITS:
+        return _CASED_UNITS[word]
+    word = word.lower()
+    if word in _UNIT_ALIASES:
+        return _UNIT_ALIASES[word]
+    return _UNIT_ALIASES.get(_singular(word))
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_amount(text):
+    """(quantity, unit) of an amount string; quantity is None when there is no number"""
+    if not isinstance(text, str):
+        if text is None or text != text:   # None or NaN
+            return None, None
+        return float(text), None
+    for char, replacement in _FRACTIONS.items():
+        if char in text:
+            text = text.replace(char, replacement)
+    match = _AMOUNT.match(text.strip())
+    if match is None:
+        return None, None
+    low, high, rest = match.groups()
+    quantity = _number(low)
+    if high is not None and quantity is not None:
+        upper = _number(high)
+        quantity = None if upper is None else (quantity + upper) / 2
+    unit = None
+    words = re.sub(r'\([^)]*\)', ' ', rest).split()   # '1 (8 oz) can' is one can
+    if words:
+        unit = canonical_unit(' '.join(words[:2])) if len(words) > 1 else None
+        unit = unit or canonical_unit(words[0])
+    return quantity, unit
+
+def parse_quantity(text):
+    """Number in an amount string, or None"""
+    return parse_amount(text)[0]
+
+@lru_cache(maxsize=CACHE_SIZE)
+def ingredient_profile(name):
+    """('unit', (g/ml, default unit)) or ('each', grams) for an ingredient name, or None"""
+    best = None
+    for match in _KEYWORD.finditer(_normal_words(name or '')):
+        # The head noun comes last ("lemon juice" is juice); ties go to the longer keyword
+        rank = (match.end(), match.end() - match.start())
+        if best is None or rank > best[0]:
+            best = (rank, match.group())
+    return _KEYWORDS[best[1]] if best else None
+
+@lru_cache(maxsize=CACHE_SIZE)
+def grams_per_unit(unit, name):
+    """Grams in one unit of the ingredient; unit None means the unit a bare count implies"""
+    profile = ingredient_profile(name)
+    density = profile[1][0] if profile and profile[0] == 'unit' else DEFAULT_DENSITY
+    if unit is None or unit == 'each':
+        if profile is None:
+            return DEFAULT_PIECE_GRAMS
+        if profile[0] == 'each':
+            return float(profile[1])
+        if unit is None:
+            unit = profile[1][1]
+        else:
+            return DEFAULT_PIECE_GRAMS
+    dimension, size = UNITS[unit]
+    return size * density if dimension == 'ml' else size
+
+def ingredient_grams(amount, name):
+    """Weight in grams of an amount string of an ingredient, or None if it has no number"""
+    quantity, unit = parse_amount(amount)
+    return None if quantity is None else quantity * grams_per_unit(unit, name)
+
+def _distinct(values):
+    codes, uniques = pd.factorize(pd.Series(list(values) if not isinstance(values, pd.Series) else values,
+                                            dtype=object), use_na_sentinel=True)
+    return codes, list(uniques)
+
+def parse_quantities(values):
+    """Vectorized parse_amount: (float array with NaN where unparseable, object array of units)"""
+    codes, uniques = _distinct(values)
+    parsed = [parse_amount(value) for value in uniques] + [(None, None)]   # code -1 is missing
+    quantity = np.array([np.nan if q is None else q for q, _ in parsed], dtype=float)
+    unit = np.array([u for _, u in parsed], dtype=object)
+    return quantity[codes], unit[codes]
+
+def to_grams(quantities, units, names):
+    """Vectorized quantity * grams_per_unit(unit, name); NaN quantities stay NaN"""
+    pairs = pd.Series(list(zip(units, names)), dtype=object)
+    codes, uniques = pd.factorize(pairs)
+    factors = np.array([grams_per_unit(unit, name) for unit, name in uniques], dtype=float)
+    return np.asarray(quantities, dtype=float) * factors[codes]
@@ -0,0 +1,135 @@
+"""Parser for the R character vectors in the Food.com dumps.
+
+Keywords, RecipeIngredientParts, RecipeIngredientQuantities, Images and
+RecipeInstructions arrive as deparsed R vectors:
+
+    c("1", "1/2", NA, "say \\"when\\"")     ->  ['1', '1/2', None, 'say "when"']
+    character(0), NA, '' or a missing value ->  []
+    "http://img" or http://img              ->  ['http://img']
+
+parse_r_vector() splits the canonical deparse form with str.split after a
+quote-count check; NA elements are swapped for a stand-in character and
+escaped quotes unescaped first, so the common dump rows never reach a regex. Anything else is validated with
+one precompiled regex and its elements pulled out with another, so no
+per-character Python loop runs. Only elements with a backslash are unescaped.
+parse_r_column() parses a whole column (a pandas Series or any iterable,
+such as pyarrow's to_pylist()), and parses each distinct string only once.
+"""
+import math
+import re
+
+import pandas as pd
+
+# An element is a quoted string, NA, or a bare token such as a number
+_ITEM = r'(?:"[^"\\]*(?:\\.[^"\\]*)*"|NA(?:_character_)?|[^\s,()"]+)'
+_VECTOR = re.compile(r'c\(\s*(?:' + _ITEM + r'\s*,\s*)*(?:' + _ITEM + r'\s*)?\)', re.S)
+_VECTOR_PREFIX = re.compile(r'c\(\s*(?:' + _ITEM + r'\s*,\s*)*(?:' + _ITEM + r')?', re.S)
+_ELEMENT = re.compile(r'"([^"\\]*(?:\\.[^"\\]*)*)"|(NA(?:_character_)?)|([^\s,()"]+)', re.S)
+_ESCAPE = re.compile(r'\\([uU]\{?[0-9a-fA-F]{1,8}\}?|x[0-9a-fA-F]{1,2}|.)', re.S)
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '0': '\0', '"': '"', "'": "'", '\\': '\\'}
+_EMPTY = {'', 'NA', 'character(0)', 'c()', 'NULL'}
+_NA = '\1'                      # Stands in for an NA element while splitting
+_NA_SEPARATOR = ', NA, '
+_NA_ITEM = ', "' + _NA + '", '
+
+def _unescape_one(match):
+    code = match.group(1)
+    if code[0] in 'uUx' and len(code) > 1:
+        return chr(int(code.strip('uUx{}'), 16))
+    return _ESCAPES.get(code, code)
+
+def unescape(text):
+    if '\\' not in text:
+        return text
+    if text.count('\\') == text.count('\\"'):
+        return text.replace('\\"', '"')   # Only escaped quotes, the common case
+    return _ESCAPE.sub(_unescape_one, text)
+
+def _split_quoted(body, escaped):
+    """body split on its ", " separators, or None if any other unescaped quote is left"""
+    if body[:1] != '"' or body[-1:] != '"':
+        return None
+    inner = body[1:-1]
+    items = (inner.replace('\\"', '"') if escaped else inner).split('", "')
+    # Every unescaped quote is a delimiter, so this count proves the split is exact
+    return items if body.count('"') - escaped == 2 * len(items) else None
+
+def _split_canonical(text):
+    """Elements of c("a", NA, "b \\"c\\"") text, or None if it is not in that exact form"""
+    body = text[2:-1]
+    escaped = 0
+    if '\\' in body:
+        escaped = body.count('\\"')
+        # Only escaped quotes, and none beside a separator, so unescaping can't make one
+        if escaped != body.count('\\') or '\\", ' in body or ', \\"' in body:
+            return None
+    items = _split_quoted(body, escaped)
+    if items is None and 'NA' in body and _NA not in body:
+        # Two passes, as each one skips every other NA of a run. An NA swapped inside
+        # a string adds two quotes but also two items, so the count fails.
+        swapped = (', ' + body + ', ').replace(_NA_SEPARATOR, _NA_ITEM).replace(_NA_SEPARATOR, _NA_ITEM)
+        items = _split_quoted(swapped[2:-2], escaped)
+        if items is not None:
+            items = [None if item == _NA else item for item in items]
+    return items
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+def parse_r_vector(value, drop_na=False, strict=False):
+    """List of the elements of an R vector string; NA elements become None unless drop_na.
+
+    Lists pass through unchanged. A malformed or truncated c(...) string
+    raises ValueError if strict, otherwise yields the elements read so far.
+    """
+    if type(value) is str and value.startswith('c(') and value.endswith(')'):
+        items = _split_canonical(value)
+        if items is not None:
+            return [item for item in items if item is not None] if drop_na and None in items else items
+    if isinstance(value, list):
+        return [v for v in value if v is not None] if drop_na else value
+    if _is_missing(value):
+        return []
+    text = str(value).strip()
+    if text in _EMPTY:
+        return []
+    if not text.startswith('c('):
+        if len(text) >= 2 and text[0] == '"' and text[-1] == '"':
+            text = unescape(text[1:-1])
+        return [text]
+
+    if text.endswith(')') and text is not value:      # Padded with whitespace, so not tried above
+        items = _split_canonical(text)
+        if items is not None:
+            return [item for item in items if item is not None] if drop_na and None in items else items
+
+    match = _VECTOR.match(text)
+    if match is None or (strict and match.end() != len(text)):
+        if strict:
+            raise ValueError(f"Malformed R vector: {text[:80]!r}")
+        # Truncated or damaged: keep the elements before the damage
+        match = _VECTOR_PREFIX.match(text)
+    items = []
+    for quoted, na, bare in _ELEMENT.findall(text, 2, match.end()):
+        if na:
+            if not drop_na:
+                items.append(None)
+        else:
+            items.append(unescape(quoted) if quoted or not bare else bare)
+    return items
+
+def parse_r_column(column, drop_na=False, strict=False):
+    """parse_r_vector over a whole column; returns a Series for a Series, else a list"""
+    cache = {}
+
+    def parse(value):
+        if not isinstance(value, str):
+            return parse_r_vector(value, drop_na, strict)
+        items = cache.get(value)
+        if items is None:
+            items = cache[value] = parse_r_vector(value, drop_na, strict)
+        return list(items)
+
+    if isinstance(column, pd.Series):
+        return column.map(parse)
+    return [parse(value) for value in column]
@@ -1,39 +1,63 @@
+"""Fill zero or missing nutrient values in ingredients_list with random placeholders.
+
+Each updated ingredient is recorded in the local checkpoint (see checkpoint),
+keyed by document id; after a crash, --resume skips them. The recipes using
+the changed ingredients get their nutrition totals adjusted at the end (see
+nutrition_delta).
+
+Usage: python randomize_ingredients.py [--resume]
+"""
 import firebase_admin
 from firebase_admin import credentials, firestore
 import random
-import time
+import sys
 from tqdm import tqdm
 
-# Initialize Firebase
-cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
-firebase_admin.initialize_app(cred)
-db = firestore.client()
-
-def randomize_zeros_in_ingredients():
-    ingredient_docs = list(db.collection('ingredients_list').stream())
-    print(f"Total ingredients found: {len(ingredient_docs)}")
-
-    for doc in tqdm(ingredient_docs, desc="Processing ingredients"):
-        data = doc.to_dict()
-        updated = False
-
-        # Fields you want to check
-        nutrition_fields = [
-            'calories', 'carbohydrate', 'fat', 
-            'fiber', 'protein', 'saturatedfat', 'sugar'
-        ]
-
-        for field in nutrition_fields:
-            if field in data and (data[field] == 0 or data[field] is None):
-                new_value = round(random.uniform(10, 50), 2)
-                data[field] = new_value
-                updated = True
-
-        if updated:
-            doc.reference.update(data)
-            print(f"Updated: {data.get('name', 'Unnamed Ingredient')}")
-
-    print("\n🎯 All ingredients processed!")
+from checkpoint import CHECKPOINT_FILE, RESUME_FLAG, Checkpoint
+from nutrition_delta import IngredientUsage, apply_changes, changed_ingredients, ingredient_names
+
+def randomize_zeros_in_ingredients(db, resume=False, checkpoint_path=CHECKPOINT_FILE):
+    usage = IngredientUsage.load(db)  # Loaded first, so it records the values before they change
+    changes = {}
+    with Checkpoint('randomize_ingredients', resume=resume, path=checkpoint_path) as checkpoint:
+        ingredient_docs = list(db.collection('ingredients_list').stream())
+        print(f"Total ingredients found: {len(ingredient_docs)}")
+
+        for doc_id, doc in tqdm(checkpoint.pending(ingredient_docs, key=lambda doc: doc.id),
+                                desc="Processing ingredients", total=len(ingredient_docs)):
+            data = doc.to_dict()
+            updated = False
+
+            # Fields you want to check
+            nutrition_fields = [
+                'calories', 'carbohydrate', 'fat',
+                'fiber', 'protein', 'saturatedfat', 'sugar'
+            ]
+
+            for field in nutrition_fields:
+                if field in data and (data[field] == 0 or data[field] is None):
+                    new_value = round(random.uniform(10, 50), 2)
+                    data[field] = new_value
+                    updated = True
+
+            if updated:
+                doc.reference.update(data)
+                changes.update(dict.fromkeys(ingredient_names(data), data))
+                print(f"Updated: {data.get('name', 'Unnamed Ingredient')}")
+            checkpoint.mark([doc_id])
+
+        print("\n🎯 All ingredients processed!")
+        if checkpoint.resumed:
+            # Ingredients changed before the restart are not in changes; diff them all instead
+            changes = changed_ingredients(db, usage)
+        updated = apply_changes(db, usage, changes)
+        usage.save()
+    print(f"🔁 Nutrition totals updated on {updated} recipes")
 
 if __name__ == "__main__":
-    randomize_zeros_in_ingredients()
+    # Initialize Firebase
+    cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
+    firebase_admin.initialize_app(cred)
+    db = firestore.client()
+
+    randomize_zeros_in_ingredients(db, resume=RESUME_FLAG in sys.argv)
@@ -0,0 +1,189 @@
+"""Keep each recipe's rating aggregates up to date as its reviews change.
+
+A recipe stores ReviewCount, RatingSum and RatingSumSquares, and the
+AggregatedRating (mean) and BayesianRating derived from them. submit_review
+and delete_review change one review and its recipe's sums in one
+transaction. They read only those two documents, so an insert, edit or
+delete costs the same however many reviews the recipe has. Submitting the
+same review twice leaves the sums as they were, so retries and --resume are
+safe. The Bayesian average counts PRIOR_WEIGHT extra reviews of PRIOR_MEAN,
+so a recipe with two 5-star reviews does not outrank one with two hundred.
+
+Recipes written before the sums existed get them seeded from
+AggregatedRating x ReviewCount on their first change. The sum of squares is
+approximate until the recipe is reconciled.
+
+reconcile recounts every review, reading the reviews collection group in
+parallel partitions while the recipes are paged in, and rewrites the recipes
+whose aggregates drifted. Run it while no reviews are being written, or a
+review that lands mid-run can be counted out again. --check only reports.
+recount does the same for a given set of recipes, one query each, and has
+the same window: a review written between a recipe's query and its write is
+counted out.
+
+Usage: python rating_aggregates.py [--check] [--partitions=16] [--debug | --quiet] [--log-json]
+"""
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+from ingest_pipeline import BatchWriter
+from update_recipes import page_recipes
+from upload_logging import Progress, get_logger, setup_logging
+
+PRIOR_MEAN = 4.0            # Rating a recipe is assumed to have before its reviews say otherwise
+PRIOR_WEIGHT = 5            # ... and how many reviews that assumption is worth
+PARTITIONS = 16             # Parallel reads of the reviews collection group
+RECOUNT_CONCURRENCY = 16    # Recipes whose reviews recount() reads at once
+FIELDS = ['ReviewCount', 'RatingSum', 'RatingSumSquares', 'AggregatedRating', 'BayesianRating']
+
+log = get_logger('rating_aggregates')
+
+def rating_fields(count, total, squares, prior=(PRIOR_MEAN, PRIOR_WEIGHT)):
+    """Recipe fields for count ratings adding up to total, whose squares add up to squares"""
+    if count <= 0:
+        count, total, squares = 0, 0.0, 0.0   # No rounding residue left behind by the last delete
+    data = {'ReviewCount': count, 'RatingSum': total, 'RatingSumSquares': squares,
+            'AggregatedRating': total / count if count else 0}
+    if prior is not None:
+        mean, weight = prior
+        data['BayesianRating'] = (total + mean * weight) / (count + weight)
+    return data
+
+def rating_sums(data):
+    """(count, sum, sum of squares) stored on a recipe; seeded from the mean on recipes older than the sums"""
+    count = int(data.get('ReviewCount') or 0)
+    if data.get('RatingSum') is not None:
+        return count, data['RatingSum'], data.get('RatingSumSquares') or 0.0
+    mean = data.get('AggregatedRating') or 0.0
+    return count, mean * count, mean * mean * count
+
+def rating_stddev(data):
+    """Standard deviation of a recipe's ratings, from its stored sums"""
+    count, total, squares = rating_sums(data)
+    if not count:
+        return 0.0
+    return math.sqrt(max(0.0, squares / count - (total / count) ** 2))
+
+@firestore.transactional
+def _change_review(transaction, recipe_ref, review_ref, review_data):
+    recipe = recipe_ref.get(transaction=transaction)
+    if not recipe.exists:
+        raise ValueError(f'Recipe {recipe_ref.id} does not exist')
+    old = review_ref.get(transaction=transaction)
+    count, total, squares = rating_sums(recipe.to_dict())
+    if old.exists:
+        rating = float(old.to_dict().get('Rating') or 0)
+        count, total, squares = count - 1, total - rating, squares - rating * rating
+    elif review_data is None:
+        return False                            # Deleting a review that isn't there
+    if review_data is None:
+        transaction.delete(review_ref)
+    else:
+        rating = float(review_data['Rating'])
+        count, total, squares = count + 1, total + rating, squares + rating * rating
+        transaction.set(review_ref, review_data)
+    transaction.set(recipe_ref, rating_fields(count, total, squares), merge=True)
+    return old.exists
+
+def submit_review(db, recipe_id, author_id, review_data):
+    """Writes (or replaces) an author's review and updates the recipe's aggregates; True if it replaced one"""
+    recipe_ref = db.collection('recipes').document(recipe_id)
+    return _change_review(db.transaction(), recipe_ref, recipe_ref.collection('reviews').document(author_id),
+                          review_data)
+
+def delete_review(db, recipe_id, author_id):
+    """Deletes an author's review and updates the recipe's aggregates; True if there was one"""
+    recipe_ref = db.collection('recipes').document(recipe_id)
+    return _change_review(db.transaction(), recipe_ref, recipe_ref.collection('reviews').document(author_id), None)
+
+def _tally(query):
+    """Recipe id -> [count, sum, sum of squares] of the reviews query returns"""
+    tallies = {}
+    for doc in query.select(['Rating']).stream():
+        rating = float(doc.to_dict().get('Rating') or 0)
+        tally = tallies.setdefault(doc.reference.parent.parent.id, [0, 0.0, 0.0])
+        tally[0] += 1
+        tally[1] += rating
+        tally[2] += rating * rating
+    return tallies
+
+def _tally_partition(partition):
+    return _tally(partition.query())
+
+def count_reviews(db, partitions=PARTITIONS):
+    """Recipe id -> [count, sum, sum of squares] over the reviews collection group, read in parallel"""
+    parts = list(db.collection_group('reviews').get_partitions(partitions))
+    with ThreadPoolExecutor(max_workers=len(parts) or 1) as pool:
+        totals = {}
+        # A recipe's reviews can straddle two partitions, so the tallies are added up
+        for tallies in pool.map(_tally_partition, parts):
+            for recipe_id, (count, total, squares) in tallies.items():
+                tally = totals.setdefault(recipe_id, [0, 0.0, 0.0])
+                tally[0] += count
+                tally[1] += total
+                tally[2] += squares
+    return totals
+
+def _drifted(stored, expected):
+    return any(stored.get(field) is None or not math.isclose(stored[field], expected[field], abs_tol=1e-9)
+               for field in FIELDS)
+
+def reconcile(db, fix=True, partitions=PARTITIONS):
+    """Recounts every recipe's reviews and rewrites the aggregates that differ; returns the drifted recipe ids"""
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        counting = pool.submit(count_reviews, db, partitions)
+        recipes = {}
+        with Progress(log, 'recipes') as progress:
+            for page in page_recipes(db.collection('recipes'), fields=FIELDS):
+                recipes.update((doc.id, doc.to_dict()) for doc in page)
+                progress.update(len(page))
+        totals = counting.result()
+    orphaned = len(totals.keys() - recipes.keys())
+    if orphaned:
+        log.warning("⚠️ %d recipes with reviews no longer exist; their reviews are not counted", orphaned)
+
+    drifted = {}
+    for recipe_id, stored in recipes.items():
+        expected = rating_fields(*totals.get(recipe_id, (0, 0.0, 0.0)))
+        if _drifted(stored, expected):
+            drifted[recipe_id] = expected
+            log.debug("%s: stored %s, recounted %s", recipe_id,
+                      {field: stored.get(field) for field in FIELDS}, expected)
+    log.info("🔎 %d of %d recipes have drifted aggregates", len(drifted), len(recipes))
+    if fix and drifted:
+        collection = db.collection('recipes')
+        with BatchWriter(db) as writer:
+            for recipe_id, data in drifted.items():
+                writer.set(collection.document(recipe_id), data, merge=True)
+        log.info("🔧 Rewrote the aggregates of %d recipes", writer.committed)
+    return sorted(drifted)
+
+def recount(db, recipe_ids, concurrency=RECOUNT_CONCURRENCY):
+    """Sets the aggregates of recipe_ids from their reviews as stored now; returns how many recipes were written
+
+    Not transactional: run it while no reviews are being written to those recipes.
+    """
+    recipes = db.collection('recipes')
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    if not recipe_ids:
+        return 0
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(recipe_ids))) as pool, BatchWriter(db) as writer:
+        tallies = pool.map(lambda recipe_id: _tally(recipes.document(recipe_id).collection('reviews')), recipe_ids)
+        for recipe_id, tally in zip(recipe_ids, tallies):
+            writer.set(recipes.document(recipe_id), rating_fields(*tally.get(recipe_id, (0, 0.0, 0.0))), merge=True)
+    return len(recipe_ids)
+
+if __name__ == "__main__":
+    argv = setup_logging()  # --debug logs every drifted recipe, --quiet only problems, --log-json for JSON lines
+    cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
+    firebase_admin.initialize_app(cred)
+    db = firestore.client()
+
+    partitions = PARTITIONS
+    for arg in argv[1:]:
+        if arg.startswith('--partitions='):
+            partitions = int(arg.split('=', 1)[1])
+    reconcile(db, fix='--check' not in argv, partitions=partitions)
@@ -0,0 +1,154 @@
+"""Bulk duplicate detection for the recipe upload scripts.
+
+The existing recipes are read once, with only Name and
+RecipeIngredientParts selected, and reduced to 64-bit keys held in a set.
+The keys are cached in a local .npz file together with the number of recipe
+documents they cover. Before the cache is trusted, that number is checked
+against a count aggregation of the collection (one read per 1000 recipes),
+so recipes uploaded from another machine since force a fresh read. A whole
+input file is then checked in memory instead of with one Firestore query
+per recipe.
+
+Two keys are supported:
+    name     the normalized name, so "Banana  Bread!" matches "banana bread"
+    content  the normalized name plus the sorted set of ingredient names, so
+             differently-made dishes that share a name are both kept
+
+Usage: python recipe_dedup.py [name|content]   # Rebuilds the cache from Firestore
+"""
+import hashlib
+import os
+import re
+import sys
+import time
+
+import firebase_admin
+import numpy as np
+from firebase_admin import credentials, firestore
+from unidecode import unidecode
+
+from r_vectors import parse_r_vector
+
+CACHE_FILE = 'recipe_keys_{mode}.npz'
+CACHE_TTL = 24 * 3600       # Seconds before the cache is rebuilt from Firestore even if the count matches
+MODES = ('name', 'content')
+
+def normalize_name(name):
+    name = unidecode(name or '').lower()
+    return ' '.join(re.findall(r'[a-z0-9]+', name))
+
+def _key(text):
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'little')
+
+def recipe_key(name, ingredient_names=(), mode='name'):
+    """64-bit key of a recipe; ingredient_names is only used in content mode"""
+    if mode == 'name':
+        return _key(normalize_name(name))
+    parts = sorted({normalize_name(part) for part in ingredient_names})
+    return _key(normalize_name(name) + '\x00' + '\x1f'.join(parts))
+
+def input_key(recipe, mode='name'):
+    """Key of a recipe from an input file, in either the cleaned or the raw Food.com shape"""
+    if 'name' in recipe:
+        return recipe_key(recipe['name'], [ing['name'] for ing in recipe.get('ingredients') or []], mode)
+    parts = recipe.get('RecipeIngredientParts')
+    if isinstance(parts, str):  # Raw Food.com c("...") vector
+        parts = parse_r_vector(parts, drop_na=True)
+    return recipe_key(recipe['Name'], parts or [], mode)
+
+def count_recipes(db):
+    """Recipe documents in Firestore from a count aggregation, or None if it fails"""
+    try:
+        return db.collection('recipes').count().get()[0][0].value
+    except Exception as e:
+        print(f"Couldn't count recipes ({e})")
+        return None
+
+class RecipeKeys:
+    """The set of keys of every recipe already uploaded"""
+
+    def __init__(self, keys=(), mode='name', count=None):
+        if mode not in MODES:
+            raise ValueError(f"Unknown duplicate key mode: {mode}")
+        self.mode = mode
+        self.keys = set(keys)
+        self.count = count          # Recipe documents the keys cover, None if unknown
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def add(self, key):
+        self.keys.add(key)
+
+    @classmethod
+    def from_firestore(cls, db, mode='name'):
+        fields = ['Name'] if mode == 'name' else ['Name', 'RecipeIngredientParts']
+        keys = cls(mode=mode, count=0)
+        for doc in db.collection('recipes').select(fields).stream():
+            keys.count += 1
+            data = doc.to_dict()
+            if data.get('Name'):
+                keys.add(recipe_key(data['Name'], data.get('RecipeIngredientParts') or [], mode))
+        return keys
+
+    @classmethod
+    def read(cls, path, mode='name'):
+        """The keys in a cache file, without checking them against Firestore"""
+        with np.load(path) as data:
+            count = int(data['count'])
+            return cls(data['keys'].tolist(), mode, count if count >= 0 else None)
+
+    @classmethod
+    def load(cls, db, mode='name', path=None, max_age=CACHE_TTL):
+        """Reads the cache file if Firestore holds as many recipes as it covers, else rebuilds it"""
+        path = path or CACHE_FILE.format(mode=mode)
+        if os.path.exists(path) and time.time() - os.path.getmtime(path) < max_age:
+            keys = cls.read(path, mode)
+            if keys.count is not None and keys.count == count_recipes(db):
+                return keys
+            print("Recipes changed since the duplicate keys were cached; reading them again")
+        keys = cls.from_firestore(db, mode)
+        keys.save(path)
+        return keys
+
+    def uploaded(self, count):
+        """Records count new recipe documents, so a saved cache still matches Firestore's count"""
+        if self.count is not None:
+            self.count += count
+
+    def save(self, path=None):
+        path = path or CACHE_FILE.format(mode=self.mode)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, keys=np.fromiter(self.keys, dtype=np.uint64, count=len(self.keys)),
+                 count=np.int64(-1 if self.count is None else self.count))
+        os.replace(tmp_path, path)
+
+    def invalidate(self, path=None):
+        """Drops the cache file, e.g. after an upload failed partway through"""
+        path = path or CACHE_FILE.format(mode=self.mode)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def filter(self, recipes, on_duplicate=None):
+        """Yields the recipes not seen before, including earlier in the same input"""
+        for recipe in recipes:
+            key = input_key(recipe, self.mode)
+            if key in self.keys:
+                if on_duplicate:
+                    on_duplicate(recipe)
+                continue
+            self.keys.add(key)
+            yield recipe
+
+if __name__ == '__main__':
+    cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
+    firebase_admin.initialize_app(cred)
+    db = firestore.client()
+
+    mode = sys.argv[1] if len(sys.argv) > 1 else 'name'
+    start = time.perf_counter()
+    keys = RecipeKeys.load(db, mode, max_age=0)
+    print(f"✅ Cached {len(keys)} {mode} keys in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,254 @@
+"""Local feature index of the recipes collection for the recommendation worker.
+
+Each recipe's Keywords and RecipeIngredientParts are lowercased and interned
+into integer feature ids and stored as one compact array per recipe. The
+index is saved to disk and kept current from Firestore update_time, so a
+refresh only costs memory lookups instead of a read of the whole collection.
+Recipes a refresh needs but the index doesn't have yet (say, before the
+listener has caught up) are fetched with fetch_missing: batched, concurrent
+and masked to INDEXED_FIELDS.
+
+Every writer of INDEXED_FIELDS (the upload scripts, the recipe merge and the
+app's add and edit pages) stamps the recipe's UPDATED_FIELD with the server
+time, and the saved index records the time it is current as of, so
+the listener resumes from there instead of reading the whole catalog again.
+Changes that arrive together (one listener callback, one fetch_missing) bump
+version once, so derived structures rebuild once per batch, not per recipe.
+Scoring over the index lives in recipe_scoring.
+"""
+import datetime
+import os
+import pickle
+import sys
+import threading
+import time
+from array import array
+from collections import defaultdict
+from contextlib import contextmanager
+
+from doc_cache import fetch_documents
+
+INDEX_FILE = 'recipe_index.pkl'
+
+KEYWORD_PREFIX = 'k:'
+INGREDIENT_PREFIX = 'i:'
+
+INDEXED_FIELDS = ['Keywords', 'RecipeIngredientParts', 'ExpiryDate']
+UPDATED_FIELD = 'UpdatedAt'     # Server time of a recipe's last INDEXED_FIELDS write
+CLOCK_SKEW = 60                 # Seconds a resumed listener reaches back before the saved read time
+
+def _int_or_zero(value):
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+class RecipeIndex:
+    def __init__(self):
+        self.vocab = {}             # Interned feature string -> feature id
+        self.recipe_ids = []        # Row -> recipe doc id (None once deleted)
+        self.rows = {}              # Recipe doc id -> row
+        self.features = []          # Row -> array('i') of feature ids
+        self.update_times = array('d')
+        self.expiry_days = array('i')  # Row -> recipe ExpiryDate (days a cooked dish keeps)
+        self.doc_freq = array('i')  # Feature id -> number of recipes containing it
+        self.version = 0            # Bumped on every change so derived structures can rebuild
+        self._absent = set()        # Recipe ids fetch_missing found deleted, so they aren't asked for again
+        self.read_time = None       # Timestamp the index is current as of; None until a refresh
+        self._batch_depth = 0
+        self._changed = False
+        self._lock = threading.RLock()
+        self._watch = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _feature_id(self, name):
+        feature_id = self.vocab.get(name)
+        if feature_id is None:
+            feature_id = len(self.vocab)
+            self.vocab[sys.intern(name)] = feature_id
+            self.doc_freq.append(0)
+        return feature_id
+
+    def _count(self, features, delta):
+        for feature_id in features:
+            self.doc_freq[feature_id] += delta
+
+    def recipe_features(self, data):
+        names = {KEYWORD_PREFIX + kw.lower() for kw in data.get('Keywords') or []}
+        names.update(INGREDIENT_PREFIX + ing.lower() for ing in data.get('RecipeIngredientParts') or [])
+        return array('i', sorted(self._feature_id(name) for name in names))
+
+    def upsert(self, recipe_id, data, update_time=0.0):
+        with self._lock:
+            self._absent.discard(recipe_id)
+            row = self.rows.get(recipe_id)
+            if row is not None and self.update_times[row] >= update_time > 0:
+                return False
+            features = self.recipe_features(data)
+            self._count(features, 1)
+            if row is None:
+                row = len(self.recipe_ids)
+                self.rows[recipe_id] = row
+                self.recipe_ids.append(recipe_id)
+                self.features.append(features)
+                self.update_times.append(update_time)
+                self.expiry_days.append(0)
+            else:
+                self._count(self.features[row], -1)
+                self.features[row] = features
+                self.update_times[row] = update_time
+            self.expiry_days[row] = _int_or_zero(data.get('ExpiryDate'))
+            self._bump()
+            return True
+
+    def remove(self, recipe_id):
+        with self._lock:
+            row = self.rows.pop(recipe_id, None)
+            if row is None:
+                return False
+            self.recipe_ids[row] = None
+            self._count(self.features[row], -1)
+            self.features[row] = array('i')
+            self._bump()
+            return True
+
+    def _bump(self):
+        """Bumps version now, or once at the end of the enclosing batch(); the caller holds the lock"""
+        if self._batch_depth:
+            self._changed = True
+        else:
+            self.version += 1
+
+    @contextmanager
+    def batch(self):
+        """Applies the changes made inside the block under a single version bump"""
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if not self._batch_depth and self._changed:
+                    self._changed = False
+                    self.version += 1
+
+    def apply_snapshot(self, doc):
+        update_time = doc.update_time.timestamp() if doc.update_time else 0.0
+        return self.upsert(doc.id, doc.to_dict() or {}, update_time)
+
+    def refresh(self, db):
+        """One-shot sync from a full read of the collection; returns the number of changed recipes"""
+        start = time.time()
+        docs = list(db.collection('recipes').select(INDEXED_FIELDS).stream())
+        changed = 0
+        seen = set()
+        with self.batch():
+            for doc in docs:
+                seen.add(doc.id)
+                changed += self.apply_snapshot(doc)
+            for recipe_id in [rid for rid in self.rows if rid not in seen]:
+                changed += self.remove(recipe_id)
+            self.read_time = start
+        return changed
+
+    def fetch_missing(self, db, recipe_ids):
+        """Indexes those of recipe_ids the index lacks, reading only INDEXED_FIELDS; returns how many"""
+        with self._lock:
+            missing = [rid for rid in recipe_ids if rid not in self.rows and rid not in self._absent]
+        snapshots = fetch_documents(db, 'recipes', missing, field_paths=INDEXED_FIELDS)
+        added = 0
+        with self.batch():
+            for snapshot in snapshots:
+                if snapshot.exists:
+                    added += self.apply_snapshot(snapshot)
+                else:
+                    self._absent.add(snapshot.id)
+        return added
+
+    def listen(self, db):
+        """Keeps the index current from a listener on the recipes written since read_time.
+
+        The listener asks only for recipes whose UPDATED_FIELD is later than
+        read_time (less CLOCK_SKEW), masked to INDEXED_FIELDS, so a restart
+        from a saved index downloads just what changed meanwhile. An index
+        that was never synced is filled by refresh() first. Only documents
+        whose update_time is newer than the indexed copy are re-interned. A
+        recipe deleted without being written since read_time is not in the
+        listener's results; the next refresh() drops it.
+        """
+        if self.read_time is None:
+            self.refresh(db)
+        since = datetime.datetime.fromtimestamp(self.read_time - CLOCK_SKEW, tz=datetime.timezone.utc)
+
+        def callback(docs, changes, read_time):
+            with self.batch():
+                for change in changes:
+                    if change.type.name == 'REMOVED':
+                        self.remove(change.document.id)
+                    else:
+                        self.apply_snapshot(change.document)
+                self.read_time = read_time.timestamp()
+
+        query = db.collection('recipes').where(UPDATED_FIELD, '>', since).select(INDEXED_FIELDS)
+        self._watch = query.on_snapshot(callback)
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+    def profile(self, recipe_ids):
+        """Sparse feature vector (feature id -> count) of a set of recipes"""
+        vector = defaultdict(int)
+        with self._lock:
+            for recipe_id in recipe_ids:
+                row = self.rows.get(recipe_id)
+                if row is None:
+                    continue
+                for feature_id in self.features[row]:
+                    vector[feature_id] += 1
+        return vector
+
+    def save(self, path=INDEX_FILE):
+        with self._lock:
+            live = [row for row, rid in enumerate(self.recipe_ids) if rid is not None]
+            state = {
+                'vocab': self.vocab,
+                'recipe_ids': [self.recipe_ids[row] for row in live],
+                'features': [self.features[row].tobytes() for row in live],
+                'update_times': array('d', (self.update_times[row] for row in live)).tobytes(),
+                'expiry_days': array('i', (self.expiry_days[row] for row in live)).tobytes(),
+                'read_time': self.read_time,
+            }
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=INDEX_FILE):
+        index = cls()
+        if not os.path.exists(path):
+            return index
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        index.vocab = {sys.intern(name): fid for name, fid in state['vocab'].items()}
+        index.recipe_ids = state['recipe_ids']
+        index.rows = {rid: row for row, rid in enumerate(index.recipe_ids)}
+        index.features = []
+        for raw in state['features']:
+            features = array('i')
+            features.frombytes(raw)
+            index.features.append(features)
+        index.update_times.frombytes(state['update_times'])
+        index.read_time = state.get('read_time')
+        if 'expiry_days' in state:
+            index.expiry_days.frombytes(state['expiry_days'])
+        else:
+            index.expiry_days = array('i', bytes(4 * len(index.recipe_ids)))
+        index.doc_freq = array('i', bytes(4 * len(index.vocab)))
+        for features in index.features:
+            index._count(features, 1)
+        return index
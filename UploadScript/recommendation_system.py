@@ -1,111 +1,342 @@
 import firebase_admin
 from firebase_admin import credentials, firestore
+import heapq
+import itertools
+import json
+import os
+import sys
+import threading
 import time
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
-# Set this to the target user's UID
-USER_ID = 'C6tmjf2PVJSQFlyBKsat0SJqBUu1'
+from doc_cache import FETCH_CONCURRENCY
+from recipe_index import RecipeIndex
+from recipe_scoring import CosineScoringEngine, ScoringEngine
 
-cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
-firebase_admin.initialize_app(cred)
+# Persisted interaction watermark so restarts don't recompute for old changes
+WATERMARK_FILE = 'recommendation_watermark.json'
 
-db = firestore.client()
+# Interaction collections under users/{uid}/recipes/{kind}/...
+INTERACTION_KINDS = ('viewed', 'reviewed', 'saved')
 
-# Stores last update timestamps to detect changes
-last_seen = {}
+MAX_WORKERS = 8
+BATCH_SIZE = 64                     # Users scored together in one refresh task
+MIN_REFRESH_INTERVAL = 15           # Seconds between refreshes of one active user
+MAX_REFRESH_INTERVAL = 24 * 3600    # Back-off ceiling for inactive users
+DISCOVERY_INTERVAL = 300            # Seconds between scans for new users
+INDEX_REFRESH_INTERVAL = 24 * 3600  # Seconds between full index syncs, which drop deleted recipes
 
-def get_user_interactions():
-    viewed_ref = db.collection(f'users/{USER_ID}/recipes/viewed/items')
-    reviewed_ref = db.collection(f'users/{USER_ID}/recipes/reviewed/items')
-    saved_collections_ref = db.collection(f'users/{USER_ID}/recipes/saved/collection')
+def init_firestore():
+    cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
+    firebase_admin.initialize_app(cred)
+    return firestore.client()
+
+def get_user_interactions(db, user_id):
+    viewed_ref = db.collection(f'users/{user_id}/recipes/viewed/items')
+    reviewed_ref = db.collection(f'users/{user_id}/recipes/reviewed/items')
+    saved_collections_ref = db.collection(f'users/{user_id}/recipes/saved/collection')
 
     viewed = [doc.id for doc in viewed_ref.stream()]
     reviewed = [doc.id for doc in reviewed_ref.stream()]
-    
+
     saved_recipe_ids = []
     for col_doc in saved_collections_ref.stream():
         saved_recipe_ids.extend(col_doc.to_dict().get("recipes", []))
 
     return set(viewed + reviewed + saved_recipe_ids)
 
-def generate_recommendations(interacted_ids):
-    all_recipes = db.collection('recipes').stream()
-
-    interaction_keywords = defaultdict(int)
-    interaction_ingredients = defaultdict(int)
-
-    for recipe_id in interacted_ids:
-        recipe = db.collection('recipes').document(recipe_id).get()
-        if recipe.exists:
-            data = recipe.to_dict()
-            for kw in data.get("Keywords", []):
-                interaction_keywords[kw.lower()] += 1
-            for ing in data.get("RecipeIngredientParts", []):
-                interaction_ingredients[ing.lower()] += 1
-
-    scored = []
-    for recipe_doc in all_recipes:
-        recipe = recipe_doc.to_dict()
-        rid = recipe.get("Id")
-        if rid in interacted_ids:
-            continue
-
-        score = 0
-        for kw in recipe.get("Keywords", []):
-            score += interaction_keywords.get(kw.lower(), 0)
-        for ing in recipe.get("RecipeIngredientParts", []):
-            score += interaction_ingredients.get(ing.lower(), 0)
-
-        if score > 0:
-            scored.append((score, rid))
-
-    scored.sort(reverse=True)
-    return [rid for _, rid in scored[:20]]  # Top 20 recipes
-
-def update_recommendations():
-    print(f"Updating recommendations for {USER_ID}...")
-    interacted_ids = get_user_interactions()
-    recommendations = generate_recommendations(interacted_ids)
-
-    db.collection('users').document(USER_ID).collection('recommendations').document('list').set({
-        'recipeIds': recommendations,
-        'updatedAt': firestore.SERVER_TIMESTAMP
-    })
-    print(f"Updated {len(recommendations)} recommendations.")
-
-def has_new_interactions():
-    updated = False
-    collections = [
-        ('viewed', f'users/{USER_ID}/recipes/viewed/items'),
-        ('reviewed', f'users/{USER_ID}/recipes/reviewed/items'),
-        ('saved', f'users/{USER_ID}/recipes/saved/collection'),
-    ]
-
-    for name, path in collections:
-        ref = db.collection(path)
-        max_time = last_seen.get(name, 0)
-
-        docs = ref.stream()
-        max_doc_time = max_time
-        for doc in docs:
-            update_time = doc.update_time.timestamp()
-            if update_time > max_time:
-                updated = True
-            if update_time > max_doc_time:
-                max_doc_time = update_time
-
-        last_seen[name] = max_doc_time
-
-    return updated
+def read_interactions(db, user_ids, index=None, concurrency=FETCH_CONCURRENCY):
+    """{user_id: interacted recipe ids}, several users read at once; recipes the index lacks are fetched into it"""
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(user_ids)))) as pool:
+        interactions = dict(zip(user_ids, pool.map(partial(get_user_interactions, db), user_ids)))
+    if index is not None:
+        index.fetch_missing(db, set().union(*interactions.values()))
+    return interactions
 
-def main():
-    while True:
+def generate_recommendations(engine, interactions):
+    """Top 20 recipes for each user in {user_id: interacted recipe ids}, scored as one batch"""
+    user_ids = list(interactions)
+    profiles = [engine.index.profile(interactions[uid]) for uid in user_ids]
+    exclude = [interactions[uid] for uid in user_ids]
+    results = engine.score_batch(profiles, exclude, k=20)
+    return dict(zip(user_ids, results))
+
+def update_recommendations(db, user_ids, engine):
+    print(f"Updating recommendations for {len(user_ids)} users...")
+    interactions = read_interactions(db, user_ids, engine.index)
+    recommendations = generate_recommendations(engine, interactions)
+
+    batch = db.batch()
+    for user_id, recipe_ids in recommendations.items():
+        batch.set(db.collection('users').document(user_id).collection('recommendations').document('list'), {
+            'recipeIds': recipe_ids,
+            'updatedAt': firestore.SERVER_TIMESTAMP
+        })
+    batch.commit()
+    print(f"Updated recommendations for {len(user_ids)} users.")
+
+def load_watermark(path=WATERMARK_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_watermark(watermark, path=WATERMARK_FILE):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(watermark, f)
+    os.replace(tmp_path, path)
+
+def interaction_key(path):
+    """Map an interaction document path to its 'uid/kind' watermark key"""
+    parts = path.split('/')
+    if len(parts) < 5 or parts[0] != 'users' or parts[2] != 'recipes':
+        return None
+    if parts[3] not in INTERACTION_KINDS:
+        return None
+    return f"{parts[1]}/{parts[3]}"
+
+class InteractionWatcher:
+    """Listens to every user's interaction collections and reports stale users.
+
+    Two collection group listeners cover the viewed/reviewed 'items' and the
+    saved 'collection' subcollections of all users. Firestore only sends
+    changed documents to a listener after its initial snapshot, so idle users
+    cost no reads. The initial snapshot is compared against the persisted
+    per-user watermark, so a restart does not recompute for interactions that
+    were already handled.
+    """
+
+    def __init__(self, db, on_change, watermark_path=WATERMARK_FILE):
+        self.db = db
+        self.on_change = on_change
+        self.watermark_path = watermark_path
+        self.watermark = load_watermark(watermark_path)
+        self.pending = dict(self.watermark)
+        self._lock = threading.Lock()
+        self._watches = []
+
+    def start(self):
+        for group in ('items', 'collection'):
+            watch = self.db.collection_group(group).on_snapshot(self._on_snapshot)
+            self._watches.append(watch)
+
+    def stop(self):
+        for watch in self._watches:
+            watch.unsubscribe()
+        self._watches = []
+
+    def _on_snapshot(self, docs, changes, read_time):
+        stale_users = set()
+        with self._lock:
+            for change in changes:
+                key = interaction_key(change.document.reference.path)
+                if key is None:
+                    continue
+                user_id = key.split('/')[0]
+                if change.type.name == 'REMOVED':
+                    # Removing an interaction changes the profile too
+                    stale_users.add(user_id)
+                    continue
+                update_time = change.document.update_time.timestamp()
+                if update_time > self.watermark.get(key, 0):
+                    stale_users.add(user_id)
+                self.pending[key] = max(self.pending.get(key, 0), update_time)
+        for user_id in stale_users:
+            self.on_change(user_id)
+
+    def begin_update(self, user_id):
+        """Returns the watermark entries a refresh of this user will cover"""
+        prefix = f"{user_id}/"
+        with self._lock:
+            return {k: v for k, v in self.pending.items() if k.startswith(prefix)}
+
+    def commit(self, watermark):
+        with self._lock:
+            self.watermark.update(watermark)
+            save_watermark(self.watermark, self.watermark_path)
+
+class RecommendationScheduler:
+    """Schedules recommendation refreshes for many users on a bounded thread pool.
+
+    Users are served in order of their due time, up to BATCH_SIZE per task so
+    they can be scored as one matrix product, and a user is never refreshed by
+    two workers at once, so a busy household cannot starve the others.
+    Interaction changes make a user due again after MIN_REFRESH_INTERVAL.
+    Users without new interactions are still refreshed periodically to pick up
+    catalog changes, and their interval doubles each time, up to
+    MAX_REFRESH_INTERVAL.
+    """
+
+    def __init__(self, db, refresh, watcher=None,
+                 max_workers=MAX_WORKERS, batch_size=BATCH_SIZE,
+                 min_interval=MIN_REFRESH_INTERVAL, max_interval=MAX_REFRESH_INTERVAL):
+        self.db = db
+        self.refresh = refresh
+        self.watcher = watcher
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+        self.refreshes = 0
+        self.errors = 0
+        self._cond = threading.Condition()
+        self._queue = []  # Heap of (due, seq, user_id)
+        self._seq = itertools.count()
+        self._users = {}
+        self._running = 0
+
+    def _schedule(self, user_id, due):
+        state = self._users[user_id]
+        if state['due'] is not None and state['due'] <= due:
+            return
+        state['due'] = due
+        heapq.heappush(self._queue, (due, next(self._seq), user_id))
+        self._cond.notify()
+
+    def add_user(self, user_id):
+        with self._cond:
+            if user_id in self._users:
+                return
+            self._users[user_id] = {
+                'due': None,
+                'running': False,
+                'dirty': True,
+                'interval': self.min_interval,
+                'last_run': 0,
+            }
+            self._schedule(user_id, time.time())
+
+    def mark_dirty(self, user_id):
+        self.add_user(user_id)
+        with self._cond:
+            state = self._users[user_id]
+            state['dirty'] = True
+            if not state['running']:
+                self._schedule(user_id, max(time.time(), state['last_run'] + self.min_interval))
+
+    def discover_users(self):
+        for user_ref in self.db.collection('users').list_documents():
+            self.add_user(user_ref.id)
+
+    def _next_ready(self, now):
+        while self._queue and self._queue[0][0] <= now:
+            due, _, user_id = heapq.heappop(self._queue)
+            state = self._users[user_id]
+            if state['due'] != due or state['running']:
+                continue  # Superseded by a later reschedule
+            return user_id
+        return None
+
+    def _run(self, user_ids, active):
+        """Refreshes user_ids; active maps each to whether it had new interactions when submitted"""
         try:
-            if has_new_interactions():
-                update_recommendations()
+            watermark = {}
+            if self.watcher:
+                for uid in user_ids:
+                    watermark.update(self.watcher.begin_update(uid))
+            self.refresh(self.db, user_ids)
+            if self.watcher:
+                self.watcher.commit(watermark)  # One watermark file write per batch
+            ok = True
         except Exception as e:
-            print(f"Error: {e}")
-        time.sleep(15)  # Poll every 15 seconds
+            print(f"Error refreshing {len(user_ids)} users: {e}")
+            ok = False
+        with self._cond:
+            self._running -= 1
+            now = time.time()
+            for user_id in user_ids:
+                state = self._users[user_id]
+                state['running'] = False
+                state['last_run'] = now
+                if ok:
+                    self.refreshes += 1
+                else:
+                    self.errors += 1
+                    state['dirty'] = state['dirty'] or active[user_id]
+                if state['dirty']:
+                    # New interactions arrived during the refresh, or it failed
+                    self._schedule(user_id, now + self.min_interval)
+                else:
+                    if active[user_id]:
+                        state['interval'] = self.min_interval
+                    else:
+                        state['interval'] = min(state['interval'] * 2, self.max_interval)
+                    self._schedule(user_id, now + state['interval'])
+            self._cond.notify()
+
+    def run_pending(self, timeout=None):
+        """Submits due refreshes while worker slots are free; waits up to timeout for work"""
+        with self._cond:
+            now = time.time()
+            submitted = 0
+            while self._running < self.max_workers:
+                user_ids, active = [], {}
+                while len(user_ids) < self.batch_size:
+                    user_id = self._next_ready(now)
+                    if user_id is None:
+                        break
+                    state = self._users[user_id]
+                    state['running'] = True
+                    active[user_id] = state['dirty']   # Read before clearing: _run backs off only idle users
+                    state['dirty'] = False
+                    state['due'] = None
+                    user_ids.append(user_id)
+                if not user_ids:
+                    break
+                self._running += 1
+                self.pool.submit(self._run, user_ids, active)
+                submitted += len(user_ids)
+            if not submitted and timeout:
+                wait = timeout
+                if self._queue and self._running < self.max_workers:
+                    wait = min(wait, max(0, self._queue[0][0] - now))
+                self._cond.wait(wait)
+            return submitted
+
+    def wait_idle(self):
+        with self._cond:
+            while self._running:
+                self._cond.wait()
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+def main():
+    db = init_firestore()
+    index = RecipeIndex.load()
+    index.listen(db)
+    # --cosine scores with IDF-weighted cosine similarity instead of raw feature counts
+    engine = CosineScoringEngine(index) if '--cosine' in sys.argv else ScoringEngine(index)
+    scheduler = RecommendationScheduler(db, partial(update_recommendations, engine=engine))
+    watcher = InteractionWatcher(db, scheduler.mark_dirty)
+    scheduler.watcher = watcher
+    watcher.start()
+    last_discovery = 0
+    last_refresh = time.time()
+    try:
+        while True:
+            if time.time() - last_discovery > DISCOVERY_INTERVAL:
+                try:
+                    scheduler.discover_users()
+                except Exception as e:
+                    print(f"Error discovering users: {e}")
+                if time.time() - last_refresh > INDEX_REFRESH_INTERVAL:
+                    try:
+                        index.refresh(db)
+                    except Exception as e:
+                        print(f"Error refreshing the recipe index: {e}")
+                    last_refresh = time.time()
+                index.save()
+                last_discovery = time.time()
+            scheduler.run_pending(timeout=5)
+    finally:
+        watcher.stop()
+        index.stop()
+        index.save()
+        scheduler.shutdown()
 
 if __name__ == '__main__':
     main()
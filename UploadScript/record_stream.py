@@ -0,0 +1,114 @@
+"""Constant-memory readers and writers for the dataset files.
+
+The Food.com dumps run to several GB, so the ingestion scripts read them as
+a stream of records instead of json.load() or a whole-file read_csv():
+
+    iter_json_array   one element at a time from a top-level JSON array
+    iter_json_lines   one record per line (.jsonl / .ndjson)
+    iter_csv          CSV rows as dicts, parsed by pandas in chunks
+    iter_records      picks one of the above from the file
+
+write_json_array() writes a generator back out as a JSON array without
+building the list first.
+"""
+import json
+import os
+
+import pandas as pd
+
+CHUNK_SIZE = 1 << 16        # Characters read per step of the JSON array parser
+CSV_CHUNK_ROWS = 10_000     # Rows per pandas chunk
+
+_WHITESPACE = ' \t\r\n'
+_SEPARATORS = _WHITESPACE + ',]'
+
+def iter_json_array(path, chunk_size=CHUNK_SIZE):
+    """Yields the elements of a file holding one JSON array, reading chunk_size characters at a time"""
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buf = ''
+        pos = 0
+        eof = False
+        started = False
+        while True:
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            if pos == len(buf) and not eof:
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf, pos = chunk, 0
+                continue
+            if not started:
+                if pos == len(buf) or buf[pos] != '[':
+                    raise ValueError(f"{path} does not hold a JSON array")
+                started = True
+                pos += 1
+                continue
+            if pos == len(buf):
+                raise ValueError(f"{path}: unterminated JSON array")
+            if buf[pos] == ']':
+                return
+            if buf[pos] == ',':
+                pos += 1
+                continue
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+                # A number cut at the buffer edge ("12" of "12.5") parses; only trust it if a separator follows
+                complete = eof or (end < len(buf) and buf[end] in _SEPARATORS)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+            if not complete:
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf, pos = buf[pos:] + chunk, 0
+                continue
+            pos = end
+            yield item
+
+def iter_json_lines(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def iter_csv_chunks(path, chunksize=CSV_CHUNK_ROWS, **kwargs):
+    """DataFrames of up to chunksize rows, for scripts that work column-wise"""
+    yield from pd.read_csv(path, chunksize=chunksize, **kwargs)
+
+def iter_csv(path, chunksize=CSV_CHUNK_ROWS, **kwargs):
+    """CSV rows as dicts, typed the way read_csv types them (missing values are NaN)"""
+    for chunk in iter_csv_chunks(path, chunksize, **kwargs):
+        yield from chunk.to_dict('records')
+
+def _starts_with_array(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        while True:
+            ch = f.read(1)
+            if not ch or ch not in _WHITESPACE:
+                return ch == '['
+
+def iter_records(path):
+    """Streams records from a .csv, .jsonl/.ndjson or .json file (array or JSON Lines)"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return iter_csv(path)
+    if ext in ('.jsonl', '.ndjson') or not _starts_with_array(path):
+        return iter_json_lines(path)
+    return iter_json_array(path)
+
+def write_json_array(path, records, indent=2):
+    """Writes records as a JSON array laid out like json.dump(indent=indent); returns the count"""
+    count = 0
+    pad = ' ' * indent
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for record in records:
+            f.write(',\n' if count else '\n')
+            f.write(pad + json.dumps(record, indent=indent).replace('\n', '\n' + pad))
+            count += 1
+        f.write('\n]' if count else ']')
+    os.replace(tmp_path, path)
+    return count
@@ -0,0 +1,166 @@
+"""Offline "more like this" index over recipe keyword and ingredient sets.
+
+Each recipe's feature set from the RecipeIndex is reduced to a MinHash
+signature, and the signatures are banded into LSH buckets. Everything is
+stored as plain .npy files that are memory-mapped on load, so similar() only
+touches one row of bucket keys, the buckets of that recipe and a few
+hundred signature rows. bench_similar_recipes.py measures the lookups.
+
+Usage:
+    python similar_recipes.py build     # Build from recipe_index.pkl (refreshed from Firestore)
+    python similar_recipes.py write     # Also store each recipe's neighbours in SimilarRecipes
+"""
+import os
+import sys
+
+import firebase_admin
+import numpy as np
+from firebase_admin import credentials, firestore
+from google.api_core.exceptions import NotFound
+
+from recipe_index import RecipeIndex
+
+INDEX_DIR = 'similar_index'
+NUM_PERM = 64
+BANDS = 16                  # NUM_PERM / BANDS rows per band; ~0.5 Jaccard threshold
+MAX_BUCKET = 200            # Candidates taken from one bucket; caps very common feature sets
+NEIGHBOURS = 10
+BUILD_CHUNK = 4096          # Recipes hashed per step while building
+BATCH_SIZE = 500            # Firestore write batch limit
+
+_PRIME = (1 << 31) - 1
+
+def _hash_params(num_perm, seed=1):
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, size=num_perm, dtype=np.int64)
+    b = rng.integers(0, _PRIME, size=num_perm, dtype=np.int64)
+    return a, b
+
+def minhash_signatures(index, num_perm=NUM_PERM):
+    """One row of num_perm minimum feature hashes per recipe row"""
+    a, b = _hash_params(num_perm)
+    feature_ids = np.arange(len(index.vocab), dtype=np.int64)
+    # Hash of every feature under every permutation, num_perm x vocab
+    hashes = ((a[:, None] * feature_ids[None, :] + b[:, None]) % _PRIME).astype(np.uint32)
+    empty = np.iinfo(np.uint32).max
+    signatures = np.full((len(index.features), num_perm), empty, dtype=np.uint32)
+    for start in range(0, len(index.features), BUILD_CHUNK):
+        chunk = index.features[start:start + BUILD_CHUNK]
+        lengths = np.array([len(f) for f in chunk], dtype=np.int64)
+        if not lengths.sum():
+            continue
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        indices = np.frombuffer(b''.join(f.tobytes() for f in chunk), dtype=np.int32)
+        nonempty = lengths > 0
+        mins = np.minimum.reduceat(hashes[:, indices], offsets[nonempty], axis=1)
+        signatures[start:start + len(chunk)][nonempty] = mins.T
+    return signatures
+
+def band_keys(signatures, bands=BANDS):
+    """Collapses each band of a signature into one 64-bit bucket key, bands x recipes"""
+    rows = signatures.shape[1] // bands
+    keys = np.empty((bands, signatures.shape[0]), dtype=np.uint64)
+    for band in range(bands):
+        part = signatures[:, band * rows:(band + 1) * rows].astype(np.uint64)
+        key = np.full(signatures.shape[0], 1469598103934665603, dtype=np.uint64)
+        for col in range(rows):
+            key = (key ^ part[:, col]) * np.uint64(1099511628211)
+        keys[band] = key
+    return keys
+
+def build(index, path=INDEX_DIR):
+    live = np.array([rid is not None and len(index.features[row]) > 0
+                     for row, rid in enumerate(index.recipe_ids)], dtype=bool)
+    signatures = minhash_signatures(index)[live]
+    recipe_ids = np.array([rid for rid, ok in zip(index.recipe_ids, live) if ok])
+    keys = band_keys(signatures)
+    order = np.argsort(keys, axis=1, kind='stable')
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'signatures.npy'), signatures)
+    np.save(os.path.join(path, 'recipe_ids.npy'), recipe_ids)
+    np.save(os.path.join(path, 'band_keys.npy'), np.take_along_axis(keys, order, axis=1))
+    np.save(os.path.join(path, 'band_rows.npy'), order.astype(np.int32))
+    np.save(os.path.join(path, 'row_keys.npy'), np.ascontiguousarray(keys.T))  # Recipe row -> its bucket keys
+    print(f"Built similarity index for {len(recipe_ids)} recipes in {path}/")
+
+class SimilarRecipes:
+    def __init__(self, path=INDEX_DIR):
+        load = lambda name: np.load(os.path.join(path, name), mmap_mode='r')
+        self.signatures = load('signatures.npy')
+        self.band_keys = load('band_keys.npy')
+        self.band_rows = load('band_rows.npy')
+        self.row_keys = load('row_keys.npy')
+        self.recipe_ids = np.load(os.path.join(path, 'recipe_ids.npy'))
+        self.rows = {rid: row for row, rid in enumerate(self.recipe_ids.tolist())}
+
+    def similar(self, recipe_id, k=NEIGHBOURS):
+        """Up to k (recipe id, estimated Jaccard similarity) pairs, most similar first"""
+        row = self.rows.get(recipe_id)
+        if row is None:
+            return []
+        candidates = []
+        for band, key in enumerate(self.row_keys[row]):
+            keys = self.band_keys[band]
+            lo = np.searchsorted(keys, key, side='left')
+            hi = min(np.searchsorted(keys, key, side='right'), lo + MAX_BUCKET)
+            candidates.append(self.band_rows[band, lo:hi])
+        candidates = np.unique(np.concatenate(candidates))
+        candidates = candidates[candidates != row]
+        if not len(candidates):
+            return []
+        similarity = (self.signatures[candidates] == self.signatures[row]).mean(axis=1)
+        if len(candidates) > k:
+            top = np.argpartition(-similarity, k - 1)[:k]
+            candidates, similarity = candidates[top], similarity[top]
+        order = np.argsort(-similarity, kind='stable')
+        return [(str(self.recipe_ids[c]), float(s)) for c, s in zip(candidates[order], similarity[order])]
+
+def _commit_updates(db, updates):
+    """Commits [(reference, data), ...] as one batch of updates; returns how many were written
+
+    One recipe deleted since the build fails the whole batch, so the batch is
+    then written one update at a time, skipping the missing recipes.
+    """
+    batch = db.batch()
+    for ref, data in updates:
+        batch.update(ref, data)
+    try:
+        batch.commit()
+        return len(updates)
+    except NotFound:
+        written = 0
+        for ref, data in updates:
+            try:
+                ref.update(data)
+                written += 1
+            except NotFound:
+                print(f"⚠️ Recipe {ref.id} no longer exists; skipped")
+        return written
+
+def write_neighbours(db, similar, k=NEIGHBOURS):
+    """Stores each recipe's neighbour ids in its SimilarRecipes field, 500 updates per batch"""
+    updates = []
+    written = 0
+    for recipe_id in similar.rows:
+        neighbours = [rid for rid, _ in similar.similar(recipe_id, k)]
+        updates.append((db.collection('recipes').document(recipe_id), {'SimilarRecipes': neighbours}))
+        if len(updates) == BATCH_SIZE:
+            written += _commit_updates(db, updates)
+            print(f"✅ Wrote neighbours for {written} recipes")
+            updates = []
+    if updates:
+        written += _commit_updates(db, updates)
+    print(f"🎉 Neighbour lists written for {written} recipes.")
+
+if __name__ == '__main__':
+    cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
+    firebase_admin.initialize_app(cred)
+    db = firestore.client()
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'build'
+    index = RecipeIndex.load()
+    print(f"Refreshed {index.refresh(db)} recipes in the local index")
+    index.save()
+    build(index)
+    if command == 'write':
+        write_neighbours(db, SimilarRecipes())
@@ -2,21 +2,23 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 from collections import defaultdict
 from datetime import datetime
+import sys
 
-# 🔒 Replace this with your actual UID
-USER_ID = 'C6tmjf2PVJSQFlyBKsat0SJqBUu1'
+from doc_cache import DocumentCache
 
 # 🔑 Firebase service account path
 cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
 firebase_admin.initialize_app(cred)
 
 db = firestore.client()
+# Interacted recipes are read from disk after the first run, and only the fields the keywords need
+recipe_cache = DocumentCache(db, 'recipes', field_paths=['Keywords', 'RecipeIngredientParts'])
 
-def get_interaction_keywords():
+def get_interaction_keywords(user_id):
     interaction_keywords = defaultdict(int)
 
-    viewed_ref = db.collection(f'users/{USER_ID}/recipes/viewed/items')
-    reviewed_ref = db.collection(f'users/{USER_ID}/recipes/reviewed/items')
+    viewed_ref = db.collection(f'users/{user_id}/recipes/viewed/items')
+    reviewed_ref = db.collection(f'users/{user_id}/recipes/reviewed/items')
 
     viewed_ids = [doc.id for doc in viewed_ref.stream()]
     reviewed_ids = [doc.id for doc in reviewed_ref.stream()]
@@ -24,12 +26,7 @@ def get_interaction_keywords():
     all_ids = set(viewed_ids + reviewed_ids)
     print(f"Total unique interacted recipes: {len(all_ids)}")
 
-    for recipe_id in all_ids:
-        doc = db.collection('recipes').document(recipe_id).get()
-        if not doc.exists:
-            continue
-        data = doc.to_dict()
-
+    for data in recipe_cache.get_many(all_ids).values():
         for kw in data.get("Keywords", []):
             interaction_keywords[kw] += 1
 
@@ -51,12 +48,12 @@ def get_recommendations_by_keywords(keywords_dict):
 
     return list(recommended_ids)
 
-def store_recommendations(recommended_ids):
+def store_recommendations(user_id, recommended_ids):
     print("\n💾 Storing recommendations to Firestore...")
     batch = db.batch()
 
     for rid in recommended_ids:
-        rec_doc_ref = db.document(f'users/{USER_ID}/recipes/recommended/items/{rid}')
+        rec_doc_ref = db.document(f'users/{user_id}/recipes/recommended/items/{rid}')
         batch.set(rec_doc_ref, {
             'recipeId': rid,
             'timestamp': firestore.SERVER_TIMESTAMP
@@ -65,9 +62,9 @@ def store_recommendations(recommended_ids):
     batch.commit()
     print(f"✅ Stored {len(recommended_ids)} recommendations.")
 
-if __name__ == '__main__':
-    print("📥 Fetching user interaction keywords...")
-    keywords_dict = get_interaction_keywords()
+def refresh_user(user_id):
+    print(f"📥 Fetching interaction keywords for {user_id}...")
+    keywords_dict = get_interaction_keywords(user_id)
 
     print("\n📊 Keyword frequencies from user interactions:")
     for kw, count in keywords_dict.items():
@@ -80,4 +77,11 @@ if __name__ == '__main__':
     for rid in recommended:
         print(rid)
 
-    store_recommendations(recommended)
+    store_recommendations(user_id, recommended)
+
+if __name__ == '__main__':
+    # Pass one or more UIDs, or none to refresh every user under users/
+    user_ids = sys.argv[1:] or [ref.id for ref in db.collection('users').list_documents()]
+    for user_id in user_ids:
+        refresh_user(user_id)
+    print(f"\n📦 Recipe cache: {dict(recipe_cache.stats)}, hit rate {recipe_cache.hit_rate():.0%}")
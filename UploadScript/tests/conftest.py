@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The scripts are flat modules in UploadScript/, imported as the services import each other
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
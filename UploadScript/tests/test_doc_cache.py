@@ -0,0 +1,60 @@
+"""DocumentCache revalidation against the in-memory Firestore."""
+from doc_cache import DocumentCache
+from fake_firestore import FakeFirestore
+
+def cache_of(db, tmp_path, **options):
+    return DocumentCache(db, 'ingredients_list', str(tmp_path / 'cache.db'), **options)
+
+def test_expired_entries_are_revalidated_by_update_time(tmp_path):
+    db = FakeFirestore()
+    db._write('ingredients_list/butter', {'name': 'Butter', 'calories': 700.0})
+    db._write('ingredients_list/salt', {'name': 'Salt', 'calories': 0.0})
+    cache = cache_of(db, tmp_path, max_age=0)
+    cache.get_many(['butter', 'salt'])
+
+    db._write('ingredients_list/butter', {'name': 'Butter', 'calories': 500.0})
+    assert cache.get('butter')['calories'] == 500.0
+    assert cache.get('salt')['calories'] == 0.0
+    assert cache.stats['changed'] == 1 and cache.stats['revalidated'] == 1
+    cache.close()
+
+def test_missing_documents_are_forgotten_sooner(tmp_path):
+    db = FakeFirestore()
+    cache = cache_of(db, tmp_path, negative_max_age=0)
+    assert cache.get('saffron') is None
+    db._write('ingredients_list/saffron', {'name': 'Saffron'})
+    assert cache.get('saffron') == {'name': 'Saffron'}
+    cache.close()
+
+def test_scan_downloads_only_changed_documents(tmp_path):
+    db = FakeFirestore()
+    for i in range(20):
+        db._write(f'ingredients_list/i{i:02d}', {'name': f'Ingredient {i}'})
+    cache = cache_of(db, tmp_path)
+    assert len(cache.scan()) == 20
+
+    db._write('ingredients_list/i03', {'name': 'Renamed'})
+    db._write('ingredients_list/new', {'name': 'New'})
+    db._delete('ingredients_list/i04')
+    cache.stats.clear()
+    docs = cache.scan()
+    assert cache.stats['misses'] == 2 and cache.stats['revalidated'] == 18
+    assert docs['i03'] == {'name': 'Renamed'} and 'new' in docs and 'i04' not in docs
+    assert list(docs) == sorted(docs)
+    cache.close()
+
+def test_masked_cache_holds_only_its_fields(tmp_path):
+    db = FakeFirestore()
+    db._write('recipes/soup', {'Name': 'Soup', 'Keywords': ['Easy'], 'RecipeInstructions': ['Boil.'] * 50})
+    path = str(tmp_path / 'cache.db')
+    masked = DocumentCache(db, 'recipes', path, field_paths=['Keywords', 'RecipeIngredientParts'])
+    full = DocumentCache(db, 'recipes', path)
+    assert masked.get('soup') == {'Keywords': ['Easy']}
+    assert full.get('soup')['Name'] == 'Soup'
+
+    db._write('recipes/soup', {'Name': 'Soup', 'Keywords': ['Quick']})
+    full.invalidate(['soup'])       # A rewrite through the full-document cache drops the masked copy too
+    restarted = DocumentCache(db, 'recipes', path, field_paths=['Keywords', 'RecipeIngredientParts'])
+    assert restarted.get('soup') == {'Keywords': ['Quick']}
+    for cache in (masked, full, restarted):
+        cache.close()
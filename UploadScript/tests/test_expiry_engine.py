@@ -0,0 +1,68 @@
+"""ExpiryEngine alerts against the in-memory Firestore."""
+import datetime
+import time
+
+from expiry_engine import DAY, ExpiryEngine
+from fake_firestore import FakeFirestore
+
+def seed(db, now):
+    past_due = datetime.datetime.fromtimestamp(now - DAY, datetime.timezone.utc)
+    later = datetime.datetime.fromtimestamp(now + 30 * DAY, datetime.timezone.utc)
+    db._write('users/u1/inventory/milk', {'name': 'Milk', 'expiry_date': past_due})
+    db._write('users/u1/inventory/rice', {'name': 'Rice', 'expiry_date': later})
+    db._write('users/u2/inventory/eggs', {'name': 'Eggs', 'date_added': past_due})
+
+def alerts(db, user_id):
+    return {doc.id: doc.to_dict() for doc in db.collection(f'users/{user_id}/alerts').stream()}
+
+def test_listener_reads_nothing_and_restart_does_not_realert(tmp_path):
+    db = FakeFirestore()
+    now = time.time()
+    seed(db, now)
+    sent_path = str(tmp_path / 'sent.db')
+
+    engine = ExpiryEngine(db, sent_path=sent_path)
+    db.reads = 0
+    watch = db.collection_group('inventory').on_snapshot(engine.on_snapshot)
+    assert db.reads == 3                # The initial snapshot only; no preference reads in the callback
+    assert engine.tick(now) == 1        # Milk; eggs keep DEFAULT_SHELF_LIFE_DAYS
+    watch.unsubscribe()
+    engine.close()
+
+    alert_id, = alerts(db, 'u1')
+    db._write(f'users/u1/alerts/{alert_id}', {'read': True}, merge=True)
+
+    engine = ExpiryEngine(db, sent_path=sent_path)
+    watch = db.collection_group('inventory').on_snapshot(engine.on_snapshot)
+    assert engine.tick(now) == 0
+    assert alerts(db, 'u1')[alert_id]['read'] is True
+
+    # A new projected expiry alerts again
+    db._write('users/u1/inventory/milk', {'expiry_date': datetime.datetime.fromtimestamp(
+        now - 2 * DAY, datetime.timezone.utc)}, merge=True)
+    assert engine.tick(now) == 1
+    assert len(alerts(db, 'u1')) == 2
+    watch.unsubscribe()
+    engine.close()
+
+def test_failed_projection_is_retried(tmp_path):
+    db = FakeFirestore()
+    now = time.time()
+    seed(db, now)
+    engine = ExpiryEngine(db, sent_path=None)
+    shelf_life = engine.shelf_life
+    failing = {'u1'}
+
+    def flaky_shelf_life(user_id, name):
+        if user_id in failing:
+            raise RuntimeError('preferences unavailable')
+        return shelf_life(user_id, name)
+
+    engine.shelf_life = flaky_shelf_life
+    watch = db.collection_group('inventory').on_snapshot(engine.on_snapshot)
+    assert engine.tick(now) == 0        # The milk's projection failed
+    failing.clear()
+    assert engine.tick(now) == 1        # The milk, retried
+    assert len(alerts(db, 'u1')) == 1
+    watch.unsubscribe()
+    engine.close()
@@ -0,0 +1,29 @@
+"""IngredientResolver loads through the document cache against the in-memory Firestore."""
+from fake_firestore import FakeFirestore
+from ingredient_resolver import IngredientResolver
+
+def test_edited_values_are_seen(tmp_path):
+    db = FakeFirestore()
+    db._write('ingredients_list/a1', {'name': 'Salt', 'name_lower': 'salt', 'calories': 0.0})
+    db._write('ingredients_list/a2', {'name': 'Sugar', 'name_lower': 'sugar', 'calories': 387.0})
+    path = str(tmp_path / 'cache.db')
+    IngredientResolver.load(db, path)
+
+    db._write('ingredients_list/a1', {'name': 'Salt', 'name_lower': 'salt', 'calories': 717.0})
+    db.reads = 0
+    resolver = IngredientResolver.load(db, path)
+    assert resolver.exact('salt')[1]['calories'] == 717.0
+    assert resolver.exact('sugar')[1]['calories'] == 387.0
+    assert db.reads == 2 + 1            # The names-only listing, then the edited ingredient
+
+def test_ingredients_added_elsewhere_are_not_created_again(tmp_path):
+    db = FakeFirestore()
+    db._write('ingredients_list/a1', {'name': 'Salt', 'name_lower': 'salt'})
+    path = str(tmp_path / 'cache.db')
+    IngredientResolver.load(db, path)
+
+    db._write('ingredients_list/random-id', {'name': 'Butter', 'name_lower': 'butter'})
+    resolver = IngredientResolver.load(db, path)
+    doc_id, _ = resolver.create(db, {'name': 'Butter', 'name_lower': 'butter'})
+    assert doc_id == 'random-id'        # Not a content-id duplicate
+    assert resolver.flush(db) == 0
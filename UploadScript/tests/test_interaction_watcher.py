@@ -0,0 +1,89 @@
+"""InteractionWatcher and RecommendationScheduler against the in-memory Firestore."""
+import time
+
+import recommendation_system
+from fake_firestore import FakeFirestore
+from recipe_index import RecipeIndex
+from recipe_scoring import ScoringEngine
+
+NUM_USERS = 6
+MIN_INTERVAL = 0.5  # No periodic refresh falls due during the idle cycles
+
+def seed(db):
+    for i in range(50):
+        db._write(f'recipes/{i}', {'Keywords': [f'k{i % 7}'], 'RecipeIngredientParts': [f'i{i % 11}']})
+    for u in range(NUM_USERS):
+        for rid in range(u, u + 5):
+            db._write(f'users/user{u}/recipes/viewed/items/{rid}', {'recipeId': str(rid)})
+        db._write(f'users/user{u}', {'name': f'user{u}'})
+
+def start_service(db, watermark_path):
+    index = RecipeIndex()
+    index.refresh(db)
+    engine = ScoringEngine(index)
+    refreshed = []
+
+    def refresh(db, user_ids):
+        refreshed.extend(user_ids)
+        recommendation_system.update_recommendations(db, user_ids, engine)
+
+    scheduler = recommendation_system.RecommendationScheduler(db, refresh, max_workers=2,
+                                                               min_interval=MIN_INTERVAL)
+    watcher = recommendation_system.InteractionWatcher(db, scheduler.mark_dirty, watermark_path)
+    scheduler.watcher = watcher
+    watcher.start()
+    return scheduler, watcher, refreshed
+
+def idle(scheduler, cycles=10):
+    for _ in range(cycles):
+        scheduler.run_pending(timeout=0.01)
+        scheduler.wait_idle()
+
+def drain(scheduler, refreshed, count):
+    deadline = time.time() + 5 * MIN_INTERVAL
+    while len(refreshed) < count and time.time() < deadline:
+        idle(scheduler, 1)
+
+def test_idle_cycles_read_nothing(tmp_path):
+    db = FakeFirestore()
+    seed(db)
+    scheduler, watcher, refreshed = start_service(db, str(tmp_path / 'watermark.json'))
+    try:
+        drain(scheduler, refreshed, NUM_USERS)
+        assert sorted(refreshed) == [f'user{u}' for u in range(NUM_USERS)]
+        # Their first refresh had interactions, so the next comes after MIN_INTERVAL; idle, the one after
+        # that backs off to twice as long, leaving room for user3's interaction to be handled first
+        refreshed.clear()
+        drain(scheduler, refreshed, NUM_USERS)
+
+        db.reads = 0
+        refreshed.clear()
+        idle(scheduler)
+        assert refreshed == []
+        assert db.reads == 0
+
+        db._write('users/user3/recipes/viewed/items/40', {'recipeId': '40'})
+        drain(scheduler, refreshed, 1)
+        assert refreshed == ['user3']
+        # The listener's change plus one user's interaction streams, nobody else's
+        assert db.reads <= 10
+    finally:
+        watcher.stop()
+        scheduler.shutdown()
+
+def test_restart_skips_handled_interactions(tmp_path):
+    db = FakeFirestore()
+    seed(db)
+    watermark_path = str(tmp_path / 'watermark.json')
+    scheduler, watcher, refreshed = start_service(db, watermark_path)
+    drain(scheduler, refreshed, NUM_USERS)
+    watcher.stop()
+    scheduler.shutdown()
+    time.sleep(0.001)   # update_time of the next write must be later than the watermark
+
+    db._write('users/user1/recipes/viewed/items/30', {'recipeId': '30'})
+    stale = []
+    watcher = recommendation_system.InteractionWatcher(db, stale.append, watermark_path)
+    watcher.start()
+    watcher.stop()
+    assert stale == ['user1']
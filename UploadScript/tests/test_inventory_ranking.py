@@ -0,0 +1,26 @@
+"""InventoryRanker postings and rebuilds over a RecipeIndex."""
+from inventory_ranking import InventoryRanker
+from recipe_index import RecipeIndex
+
+def make_index():
+    index = RecipeIndex()
+    index.upsert('pancakes', {'Keywords': ['Breakfast'], 'RecipeIngredientParts': ['eggs', 'flour', 'milk']}, 1.0)
+    index.upsert('omelette', {'Keywords': ['Breakfast'], 'RecipeIngredientParts': ['eggs', 'butter']}, 1.0)
+    index.upsert('salad', {'Keywords': ['Healthy'], 'RecipeIngredientParts': ['lettuce']}, 1.0)
+    return index
+
+def test_ranks_by_missing_ingredients():
+    ranker = InventoryRanker(make_index(), {'eggs': 'ing-eggs', 'large eggs': 'ing-eggs'})
+    ranking = ranker.rank([('Large Eggs', None), ('Butter', None), ('flour', None)])
+    assert [(r['id'], r['missing']) for r in ranking] == [('omelette', 0), ('pancakes', 1)]
+
+def test_rebuilds_once_per_interval_and_keys_new_ingredients():
+    index = make_index()
+    ranker = InventoryRanker(index, {}, rebuild_interval=3600)
+    assert ranker.rank([('saffron', None)]) == []
+    index.upsert('paella', {'RecipeIngredientParts': ['rice', 'saffron']}, 1.0)
+    assert ranker.rank([('saffron', None)]) == []   # Still the previous build
+    ranker.rebuild_interval = 0
+    assert [r['id'] for r in ranker.rank([('saffron', None)])] == ['paella']
+    index.remove('paella')
+    assert ranker.rank([('saffron', None)]) == []
@@ -0,0 +1,59 @@
+"""IngredientUsage reloads against the in-memory Firestore."""
+import os
+import time
+
+from firebase_admin import firestore
+
+from fake_firestore import FakeFirestore
+from nutrition import SUMMED_FIELD
+from nutrition_delta import IngredientUsage, apply_changes, changed_ingredients
+
+BUTTER = {'name': 'Butter', 'name_lower': 'butter', 'calories': 700.0}
+
+def seed(db):
+    db._write('ingredients_list/butter', dict(BUTTER))
+    db._write('recipes/cake', {'RecipeIngredientParts': ['butter'], 'RecipeIngredientQuantities': [100],
+                               'Calories': 700.0})
+
+def calories(db, recipe_id):
+    return db.collection('recipes').document(recipe_id).get().get('Calories')
+
+def run(db, path, tmp_path):
+    usage = IngredientUsage.load(db, path=path)
+    apply_changes(db, usage, changed_ingredients(db, usage), failed_path=str(tmp_path / 'failed.json'))
+    usage.save(path)
+
+def test_expired_index_keeps_the_baseline(tmp_path):
+    db = FakeFirestore()
+    seed(db)
+    path = str(tmp_path / 'usage.pkl')
+    IngredientUsage.load(db, path=path)
+
+    db._write('ingredients_list/butter', {**BUTTER, 'calories': 500.0})
+    old = time.time() - 2 * 24 * 3600
+    os.utime(path, (old, old))
+    run(db, path, tmp_path)
+    assert calories(db, 'cake') == 500.0
+
+def upload(db, recipe_id, grams, calories):
+    db.collection('recipes').document(recipe_id).set({
+        'RecipeIngredientParts': ['butter'], 'RecipeIngredientQuantities': [grams],
+        'Calories': calories, SUMMED_FIELD: firestore.SERVER_TIMESTAMP})
+
+def test_recipes_uploaded_while_the_index_is_fresh_get_deltas_only_for_older_values(tmp_path):
+    db = FakeFirestore()
+    seed(db)
+    path = str(tmp_path / 'usage.pkl')
+    IngredientUsage.load(db, path=path)
+
+    upload(db, 'cookies', 50, 350.0)         # Summed with butter at 700
+    db._write('ingredients_list/butter', {**BUTTER, 'calories': 800.0})
+    upload(db, 'shortbread', 50, 400.0)      # Summed with butter at 800 already
+    run(db, path, tmp_path)
+    assert calories(db, 'cake') == 800.0
+    assert calories(db, 'cookies') == 400.0
+    assert calories(db, 'shortbread') == 400.0
+
+    db.reads = 0
+    IngredientUsage.load(db, path=path)
+    assert db.reads == 1    # The count aggregation only
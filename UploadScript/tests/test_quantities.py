@@ -0,0 +1,21 @@
+"""Amount strings the recipe dumps use."""
+import pytest
+
+from quantities import parse_amount
+
+@pytest.mark.parametrize('text, expected', [
+    ('1-1/2', (1.5, None)),
+    ('1 - 1/2 cups', (1.5, 'cup')),
+    ('1 1/2-2', (1.75, None)),
+    ('1-2', (1.5, None)),
+    ('1/2-3/4', (0.625, None)),
+])
+def test_int_dash_fraction_is_a_mixed_number(text, expected):
+    assert parse_amount(text) == expected
+
+@pytest.mark.parametrize('text, unit', [
+    ('2 T', 'tbsp'), ('2 T.', 'tbsp'), ('1 t', 'tsp'), ('1 t. salt', 'tsp'),
+    ('2 Tbsp', 'tbsp'), ('1 TSP', 'tsp'), ('2 C', 'cup'), ('About 2 Cups', 'cup'),
+])
+def test_units_keep_their_case(text, unit):
+    assert parse_amount(text)[1] == unit
@@ -0,0 +1,29 @@
+"""parse_r_vector against the shared corpus that bench_r_vectors also checks."""
+import json
+import os
+
+import pytest
+
+from r_vectors import parse_r_column, parse_r_vector
+
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'r_vector_corpus.json')
+
+with open(CORPUS_FILE, encoding='utf-8') as f:
+    CORPUS = json.load(f)
+
+def case_input(case):
+    return float('nan') if case.get('input_is_nan') else case['input']
+
+@pytest.mark.parametrize('case', CORPUS, ids=[repr(case['input'])[:40] for case in CORPUS])
+def test_corpus(case):
+    value = case_input(case)
+    if case.get('error'):
+        with pytest.raises(ValueError):
+            parse_r_vector(value, case.get('drop_na', False), case.get('strict', False))
+    else:
+        assert parse_r_vector(value, case.get('drop_na', False), case.get('strict', False)) == case['expected']
+
+def test_column_matches_rows():
+    plain = [case for case in CORPUS if not case.get('error') and not case.get('drop_na')]
+    values = [case_input(case) for case in plain] * 2     # Repeats come from the column cache
+    assert parse_r_column(values) == [case['expected'] for case in plain] * 2
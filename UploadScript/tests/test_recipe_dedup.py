@@ -0,0 +1,34 @@
+"""RecipeKeys cache revalidation against the in-memory Firestore."""
+from fake_firestore import FakeFirestore
+from recipe_dedup import RecipeKeys
+
+def test_cache_is_reread_when_recipes_were_added_elsewhere(tmp_path):
+    db = FakeFirestore()
+    for i in range(10):
+        db._write(f'recipes/{i}', {'Name': f'Recipe {i}'})
+    path = str(tmp_path / 'keys.npz')
+    RecipeKeys.load(db, path=path)
+
+    db.reads = 0
+    keys = RecipeKeys.load(db, path=path)
+    assert db.reads == 1                # The count aggregation only
+    assert len(keys) == 10
+
+    db._write('recipes/other', {'Name': 'Banana Bread'})    # Uploaded from another machine
+    keys = RecipeKeys.load(db, path=path)
+    assert list(keys.filter([{'name': 'banana  bread!'}])) == []
+
+def test_own_uploads_keep_the_cache_valid(tmp_path):
+    db = FakeFirestore()
+    db._write('recipes/0', {'Name': 'Soup'})
+    path = str(tmp_path / 'keys.npz')
+    keys = RecipeKeys.load(db, path=path)
+    fresh = list(keys.filter([{'name': 'Stew'}, {'name': 'soup'}]))
+    for i, recipe in enumerate(fresh):
+        db._write(f'recipes/new{i}', {'Name': recipe['name']})
+    keys.uploaded(len(fresh))
+    keys.save(path)
+
+    db.reads = 0
+    assert len(RecipeKeys.load(db, path=path)) == 2
+    assert db.reads == 1
@@ -0,0 +1,68 @@
+"""RecipeIndex listener resume and batched version bumps against the in-memory Firestore."""
+import datetime
+
+from fake_firestore import FakeFirestore
+from recipe_index import UPDATED_FIELD, RecipeIndex
+from recipe_scoring import ScoringEngine
+
+LAST_WEEK = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=7)
+
+def now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+def seed(db, count=100):
+    for i in range(count):
+        db._write(f'recipes/{i}', {'Name': f'recipe {i}', 'Keywords': [f'k{i % 7}'],
+                                   'RecipeIngredientParts': [f'i{i % 11}'], UPDATED_FIELD: LAST_WEEK})
+
+def test_restart_reads_only_changed_recipes(tmp_path):
+    db = FakeFirestore()
+    seed(db)
+    index = RecipeIndex()
+    index.listen(db)
+    assert len(index) == 100
+    index.stop()
+    path = str(tmp_path / 'index.pkl')
+    index.save(path)
+
+    db._write('recipes/5', {'Keywords': ['new'], UPDATED_FIELD: now()}, merge=True)
+    db._write('recipes/100', {'Keywords': ['added'], UPDATED_FIELD: now()})
+    db.reads = 0
+    index = RecipeIndex.load(path)
+    index.listen(db)
+    assert db.reads == 2
+    assert len(index) == 101
+    assert index.vocab['k:new'] in index.features[index.rows['5']]
+
+    db._write('recipes/7', {'Keywords': ['edited'], UPDATED_FIELD: now()}, merge=True)
+    assert db.reads == 3
+    assert index.vocab['k:edited'] in index.features[index.rows['7']]
+    index.stop()
+
+def test_changes_bump_version_once_per_batch():
+    db = FakeFirestore()
+    seed(db, 20)
+    index = RecipeIndex()
+    index.listen(db)
+    version = index.version
+    index.fetch_missing(db, ['1', '2', '3'])
+    assert index.version == version     # Already indexed: nothing changed
+    for i in range(20, 25):
+        db._write(f'recipes/{i}', {'Keywords': ['x'], UPDATED_FIELD: LAST_WEEK})
+    index.fetch_missing(db, [str(i) for i in range(20, 25)])
+    assert index.version == version + 1
+    index.stop()
+
+def test_matrix_rebuilds_at_most_once_per_interval():
+    index = RecipeIndex()
+    for i in range(10):
+        index.upsert(str(i), {'Keywords': [f'k{i}']}, 1.0)
+    engine = ScoringEngine(index, rebuild_interval=3600)
+    matrix, _ = engine.matrix()
+    index.upsert('10', {'Keywords': ['k1']}, 1.0)
+    index.upsert('3', {'Keywords': ['k1']}, 2.0)
+    assert engine.matrix()[0] is matrix
+    # Scored from the previous build; excluding a recipe added since then is harmless
+    assert engine.score_batch([index.profile(['1'])], [{'1', '10'}], k=5) == [[]]
+    engine.rebuild_interval = 0
+    assert engine.matrix()[0].shape[0] == 11
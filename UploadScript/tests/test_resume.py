@@ -0,0 +1,64 @@
+"""Bulk jobs crashed partway through and resumed, against the in-memory Firestore."""
+import json
+
+import pytest
+
+import update_reviews
+import upload_recipes_batch
+from bench_upload_pipeline import seeded_db, synthetic_recipes
+from fake_firestore import Crash, FaultyFirestore
+from ingest_pipeline import BATCH_SIZE
+
+NUM_RECIPES = 2000
+
+def crash_then_resume(db, job, **fault):
+    """Writes before the crash, and the writes and RPCs of the resumed run"""
+    db.fail_at, db.fail_after_writes = fault.get('fail_at'), fault.get('fail_after_writes')
+    with pytest.raises(Crash):
+        job(resume=False)
+    first = db.writes
+    db.writes = db.rpcs = 0
+    job(resume=True)
+    return first, db.writes, db.rpcs
+
+def test_upload_resumes_with_only_the_remaining_recipes(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)     # Checkpoints and key caches
+    path = str(tmp_path / 'recipes.json')
+    with open(path, 'w') as f:
+        json.dump(synthetic_recipes(NUM_RECIPES), f)
+
+    clean = FaultyFirestore(source=seeded_db(0))
+    upload_recipes_batch.upload_recipes(clean, path, progress=False, checkpoint_path=str(tmp_path / 'clean.db'))
+    for name in ('recipe_keys_name.npz', 'doc_cache.db', 'doc_cache.db-wal', 'doc_cache.db-shm'):
+        (tmp_path / name).unlink(missing_ok=True)
+
+    db = FaultyFirestore(source=seeded_db(0))
+    job = lambda resume: upload_recipes_batch.upload_recipes(db, path, progress=False, resume=resume,
+                                                             checkpoint_path=str(tmp_path / 'jobs.db'))
+    first, second, rpcs = crash_then_resume(db, job, fail_after_writes=int(clean.writes * 0.8))
+
+    assert set(db._docs('recipes')) == set(clean._docs('recipes'))
+    assert first + second - clean.writes <= BATCH_SIZE     # At most the batch the crash interrupted
+    assert 0 < second <= 0.3 * clean.writes
+    assert rpcs < clean.rpcs
+
+def test_reviews_resume_without_counting_twice(tmp_path):
+    num_reviews = 400
+    path = str(tmp_path / 'reviews.json')
+    with open(path, 'w') as f:
+        json.dump([{'Name': f'Recipe {i % 30}', 'AuthorId': 1000 + i, 'AuthorName': f'Author {i}',
+                    'Rating': 1 + i % 5, 'Review': 'Tasty.', 'DateSubmitted': '2020-01-02T03:04:05Z',
+                    'DateModified': '2020-01-02T03:04:05Z'} for i in range(num_reviews)], f)
+    db = FaultyFirestore()
+    for i in range(30):
+        db._write(f'recipes/r{i}', {'Name': f'Recipe {i}'})
+    db.writes = 0
+    failed = str(tmp_path / 'failed.json')
+    checkpoint = str(tmp_path / 'jobs.db')
+    job = lambda resume: update_reviews.upload_reviews(db, path, failed, resume, checkpoint_path=checkpoint)
+    # A query, two reads and a commit per review
+    first, second, _ = crash_then_resume(db, job, fail_at=int(4 * num_reviews * 0.8))
+
+    assert sum(len(db._docs(f'recipes/r{i}/reviews')) for i in range(30)) == num_reviews
+    assert sum(data['ReviewCount'] for data, _ in db._docs('recipes').values()) == num_reviews
+    assert second <= 0.3 * 2 * num_reviews      # The review and its recipe per remaining line
@@ -0,0 +1,53 @@
+"""RecommendationScheduler retries and back-off, without a watcher."""
+import pytest
+
+import recommendation_system
+from fake_firestore import FakeFirestore
+
+MIN_INTERVAL = 10
+MAX_INTERVAL = 1000
+
+def scheduler_with(refresh):
+    return recommendation_system.RecommendationScheduler(FakeFirestore(), refresh, max_workers=1,
+                                                         min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL)
+
+def run_due(scheduler, user_id):
+    """Makes user_id due now and runs its refresh to completion"""
+    state = scheduler._users[user_id]
+    with scheduler._cond:
+        state['due'] = None
+        scheduler._schedule(user_id, 0)
+    assert scheduler.run_pending() == 1
+    scheduler.wait_idle()
+    return state
+
+def test_failed_refresh_of_an_active_user_is_retried_after_min_interval():
+    calls = []
+
+    def refresh(db, user_ids):
+        calls.append(user_ids)
+        if len(calls) == 1:
+            raise RuntimeError('Firestore unavailable')
+
+    scheduler = scheduler_with(refresh)
+    scheduler.add_user('alice')     # New users have interactions to refresh
+    state = run_due(scheduler, 'alice')
+    assert scheduler.errors == 1
+    assert state['due'] - state['last_run'] == pytest.approx(MIN_INTERVAL)
+    assert state['interval'] == MIN_INTERVAL
+    scheduler.shutdown()
+
+def test_active_user_interval_resets():
+    scheduler = scheduler_with(lambda db, user_ids: None)
+    scheduler.add_user('bob')
+    state = run_due(scheduler, 'bob')
+    assert state['interval'] == MIN_INTERVAL     # It had interactions, so no back-off yet
+    for _ in range(3):
+        state = run_due(scheduler, 'bob')       # Idle refreshes back off
+    assert state['interval'] == 8 * MIN_INTERVAL
+
+    scheduler.mark_dirty('bob')
+    state = run_due(scheduler, 'bob')
+    assert state['interval'] == MIN_INTERVAL
+    assert state['due'] - state['last_run'] == pytest.approx(MIN_INTERVAL)
+    scheduler.shutdown()
@@ -0,0 +1,15 @@
+"""The nutrition backfill against the in-memory Firestore."""
+from fake_firestore import FakeFirestore
+from update_recipes import backfill
+
+def test_recipes_without_ingredient_fields_do_not_stop_the_backfill(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)     # The document cache
+    db = FakeFirestore()
+    db._write('ingredients_list/butter', {'name': 'Butter', 'name_lower': 'butter', 'calories': 700.0})
+    db._write('recipes/cake', {'Name': 'Cake', 'RecipeIngredientParts': ['Butter'],
+                               'RecipeIngredientQuantities': [100], 'Calories': 0.0})
+    db._write('recipes/water', {'Name': 'Water', 'Calories': 0.0})
+
+    assert backfill(db, page_size=1) == 2
+    assert db.collection('recipes').document('cake').get().get('Calories') == 700.0
+    assert db.collection('recipes').document('water').get().get('Calories') == 0.0
@@ -0,0 +1,31 @@
+"""Bulk review import against the in-memory Firestore."""
+import datetime
+import json
+
+from fake_firestore import FakeFirestore
+from rating_aggregates import submit_review
+from update_reviews import upload_reviews_bulk
+
+def review(name, author, rating):
+    return {'Name': name, 'AuthorId': author, 'AuthorName': f'Author {author}', 'Rating': rating,
+            'Review': 'Tasty.', 'DateSubmitted': '2020-01-02T03:04:05Z', 'DateModified': '2020-01-02T03:04:05Z'}
+
+def test_bulk_import_keeps_reviews_already_stored(tmp_path):
+    db = FakeFirestore()
+    db._write('recipes/soup', {'Name': 'Soup'})
+    db._write('recipes/draft', {'Keywords': []})       # No Name yet
+    submit_review(db, 'soup', 'app-user', {'Rating': 1.0, 'Review': 'From the app',
+                                           'DateSubmitted': datetime.datetime.now(datetime.timezone.utc)})
+    path = str(tmp_path / 'reviews.json')
+    with open(path, 'w') as f:
+        json.dump([review('Soup', 1, 5), review('Soup', 2, 3), review('Soup', 1, 4)], f)
+
+    options = dict(failed_path=str(tmp_path / 'failed.json'), checkpoint_path=str(tmp_path / 'jobs.db'))
+    upload_reviews_bulk(db, path, **options)
+    soup = db.collection('recipes').document('soup').get()
+    assert soup.get('ReviewCount') == 3       # The app review and one per author in the file
+    assert soup.get('RatingSum') == 1 + 4 + 3
+    assert soup.get('AggregatedRating') == 8 / 3
+
+    upload_reviews_bulk(db, path, resume=True, **options)
+    assert db.collection('recipes').document('soup').get().get('ReviewCount') == 3
@@ -1,21 +1,29 @@
-import pandas as pd
+import json
+
+from record_stream import iter_csv_chunks, write_json_array
 
 # File paths
 TRIMMED_RECIPES_FILE = 'meals_trimmed.csv'
 REVIEWS_FILE = 'reviews_names.csv'
 OUTPUT_FILE = 'filtered_reviews.json'
 
-# Load data
-trimmed_df = pd.read_csv(TRIMMED_RECIPES_FILE)
-reviews_df = pd.read_csv(REVIEWS_FILE)
+def require_name(chunk, path):
+    # Ensure 'Name' column exists
+    if 'Name' not in chunk.columns:
+        raise ValueError(f"Missing 'Name' column in {path}.")
+    return chunk
 
-# Ensure 'Name' column exists
-if 'Name' not in trimmed_df.columns or 'Name' not in reviews_df.columns:
-    raise ValueError("Missing 'Name' column in one of the input CSVs.")
+# Only the recipe names are held in memory; reviews are filtered chunk by chunk
+valid_names = set()
+for chunk in iter_csv_chunks(TRIMMED_RECIPES_FILE, usecols=['Name']):
+    valid_names.update(chunk['Name'].str.strip())
 
-# Filter reviews
-valid_names = set(trimmed_df['Name'].str.strip())
-filtered_reviews_df = reviews_df[reviews_df['Name'].str.strip().isin(valid_names)]
+def filtered_reviews():
+    for chunk in iter_csv_chunks(REVIEWS_FILE):
+        chunk = require_name(chunk, REVIEWS_FILE)
+        matching = chunk[chunk['Name'].str.strip().isin(valid_names)]
+        # Through to_json so NaN and dates come out exactly as before
+        yield from json.loads(matching.to_json(orient='records'))
 
-filtered_reviews_df.to_json(OUTPUT_FILE, orient='records', indent=2)
-print(f"✅ Filtered reviews saved to {OUTPUT_FILE} ({len(filtered_reviews_df)} records)")
+count = write_json_array(OUTPUT_FILE, filtered_reviews())
+print(f"✅ Filtered reviews saved to {OUTPUT_FILE} ({count} records)")
@@ -1,130 +1,119 @@
+"""Recompute recipe nutrition totals from ingredients_list.
+
+The backfill reads every ingredient once, pages through the recipes with a
+cursor (fetching only their parts and quantities) and writes the totals in
+500-op batches with several commits in flight. An AdaptiveLimit sets how many
+commits are in flight from the errors and latency Firestore reports, instead
+of sleeping between batches. Progress and an ETA are logged every few seconds.
+The ingredients are read through the shared document cache, which downloads
+only those changed since the last run (see DocumentCache.scan). Each
+rewritten recipe is dropped from the cache once its batch commits.
+
+Usage:
+  python update_recipes.py                  # Recipes whose Calories are 0
+  python update_recipes.py --all            # Every recipe
+  python update_recipes.py --concurrency=N  # Commits in flight to start with
+"""
 import firebase_admin
 from firebase_admin import credentials, firestore
-import time
-from tqdm import tqdm
-
-# Initialize Firebase
-cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
-firebase_admin.initialize_app(cred)
-db = firestore.client()
-
-def fetch_ingredient_data(ingredient_id):
-    doc = db.collection('ingredients_list').document(ingredient_id).get()
-    return doc.to_dict() if doc.exists else None
-
-def calculate_totals(ingredients):
-    totals = {
-        "Calories": 0.0,
-        "ProteinContent": 0.0,
-        "CarbohydrateContent": 0.0,
-        "FatContent": 0.0,
-        "SaturatedFatContent": 0.0,
-        "CholesterolContent": 0.0,
-        "SodiumContent": 0.0,
-        "FiberContent": 0.0,
-        "SugarContent": 0.0
-    }
-
-    for ing in ingredients:
-        weight = ing['weight']
-        factor = weight / 100.0
-        data = ing['data']
-
-        totals["Calories"] += (data.get("calories") or 0) * factor
-        totals["ProteinContent"] += (data.get("protein") or 0) * factor
-        totals["CarbohydrateContent"] += (data.get("carbohydrate") or 0) * factor
-        totals["FatContent"] += (data.get("fat") or 0) * factor
-        totals["SaturatedFatContent"] += (data.get("saturatedfat") or 0) * factor
-        totals["SodiumContent"] += (data.get("sodium") or 0) * factor
-        totals["FiberContent"] += (data.get("fiber") or 0) * factor
-        totals["SugarContent"] += (data.get("sugar") or 0) * factor
-
-    if totals["CholesterolContent"] == 0:
-        totals["CholesterolContent"] = None
-    if totals["SodiumContent"] == 0:
-        totals["SodiumContent"] = None
-
-    return totals
-
-def fetch_zero_calorie_recipes():
-    query = db.collection('recipes').where('Calories', '==', 0.0).limit(500)
-    recipes = []
-    docs = query.stream()
-    last_doc = None
 
+from doc_cache import DocumentCache
+from ingest_pipeline import CONCURRENCY, AdaptiveLimit, BatchWriter, stage
+from ingredient_resolver import IngredientResolver
+from nutrition import SUMMED_FIELD, NutritionTable, recipe_fields
+from upload_logging import Progress, get_logger, setup_logging
+
+PAGE_SIZE = 1000            # Recipes per cursor page
+FIELDS = ['RecipeIngredientParts', 'RecipeIngredientQuantities']
+
+log = get_logger('update_recipes')
+
+def recipe_query(db, only_zero=True):
+    query = db.collection('recipes')
+    if only_zero:
+        query = query.where('Calories', '==', 0.0)
+    return query
+
+def count_recipes(query):
+    """Number of matching recipes from a count aggregation, or None if the server can't say"""
+    try:
+        return query.count().get()[0][0].value
+    except Exception as e:
+        log.warning("Couldn't count recipes (%s); progress will have no ETA", e)
+        return None
+
+def page_recipes(query, page_size=PAGE_SIZE, fields=FIELDS):
+    """Yields pages of recipe snapshots holding only fields, following a document cursor"""
+    query = query.select(fields).limit(page_size)
+    last = None
     while True:
-        batch = list(docs)
-        if not batch:
-            break
-        recipes.extend(batch)
-        last_doc = batch[-1]
-        docs = db.collection('recipes').where('Calories', '==', 0.0).start_after(last_doc).limit(500).stream()
-
-    return recipes
-
-def update_recipe_nutrition_batch():
-    recipe_docs = fetch_zero_calorie_recipes()
-    print(f"Total recipes to update: {len(recipe_docs)}")
-
-    batch_size = 25
-    total_batches = (len(recipe_docs) + batch_size - 1) // batch_size
-
-    for batch_num in range(total_batches):
-        batch_writer = db.batch()
-        start_idx = batch_num * batch_size
-        end_idx = min(start_idx + batch_size, len(recipe_docs))
-        batch = recipe_docs[start_idx:end_idx]
-
-        for doc in tqdm(batch, desc=f"Batch {batch_num + 1}/{total_batches}"):
-            recipe = doc.to_dict()
-            ingredient_names = recipe.get('RecipeIngredientParts', [])
-            ingredient_weights = recipe.get('RecipeIngredientQuantities', [])
-
-            if len(ingredient_names) != len(ingredient_weights):
-                print(f"⚠️ Skipping {recipe.get('Name')} — mismatched ingredients & weights.")
-                continue
-
-            ingredients = []
-            for i in range(len(ingredient_names)):
-                name = ingredient_names[i]
-                weight = ingredient_weights[i]
-
-                # Reverse lookup: name match
-                query = db.collection('ingredients_list').where('name', '==', name).limit(1).get()
-                if query:
-                    ingredient_data = query[0].to_dict()
-                    ingredients.append({
-                        'weight': weight,
-                        'data': ingredient_data
-                    })
-                else:
-                    print(f"❗ Ingredient '{name}' not found for recipe '{recipe.get('Name')}'. Skipping.")
-                    break  # skip incomplete recipes
-
-            if len(ingredients) != len(ingredient_names):
-                continue  # skip update for incomplete recipes
-
-            totals = calculate_totals(ingredients)
-
-            update_data = {
-                "Calories": totals["Calories"],
-                "ProteinContent": totals["ProteinContent"],
-                "CarbohydrateContent": totals["CarbohydrateContent"],
-                "FatContent": totals["FatContent"],
-                "SaturatedFatContent": totals["SaturatedFatContent"],
-                "CholesterolContent": totals["CholesterolContent"],
-                "SodiumContent": totals["SodiumContent"],
-                "FiberContent": totals["FiberContent"],
-                "SugarContent": totals["SugarContent"]
-            }
-
-            batch_writer.update(doc.reference, update_data)
-
-        batch_writer.commit()
-        print(f"✅ Batch {batch_num + 1}/{total_batches} committed.")
-        time.sleep(2)  # Small pause for Firestore breathing room
-
-    print("\n🎯 All recipe updates complete!")
+        page = list((query.start_after(last) if last else query).stream())
+        if page:
+            yield page
+        if len(page) < page_size:
+            return
+        last = page[-1]
+
+def resolve_page(page, resolver, table):
+    """(references, [(row, weight), ...] lists, skipped) for one page of recipes
+
+    A recipe is skipped when its parts and quantities differ in length or
+    any ingredient is not in ingredients_list.
+    """
+    refs, recipes, skipped = [], [], 0
+    for doc in page:
+        data = doc.to_dict() or {}       # get() raises KeyError for a missing field
+        names = data.get('RecipeIngredientParts') or []
+        weights = data.get('RecipeIngredientQuantities') or []
+        if len(names) != len(weights):
+            log.debug("Skipping %s: mismatched ingredients & weights", doc.id)
+            skipped += 1
+            continue
+        rows = []
+        for name, weight in zip(names, weights):
+            found = resolver.exact(name.strip().lower())
+            if not found:
+                log.debug("Skipping %s: ingredient %r not found", doc.id, name)
+                break
+            rows.append((table.row(*found), weight))
+        if len(rows) != len(names):
+            skipped += 1
+            continue
+        refs.append(doc.reference)
+        recipes.append(rows)
+    return refs, recipes, skipped
+
+def backfill(db, only_zero=True, concurrency=CONCURRENCY, page_size=PAGE_SIZE):
+    """Rewrites the nutrition totals of every matching recipe; returns how many were written"""
+    resolver = IngredientResolver.load(db)
+    recipe_cache = DocumentCache(db, 'recipes')
+    table = NutritionTable.from_resolver(resolver)
+    log.info("Loaded %d ingredients", len(resolver))
+
+    query = recipe_query(db, only_zero)
+    limiter = AdaptiveLimit(start=concurrency, maximum=concurrency * 4)
+    pages = stage(lambda q: page_recipes(q, page_size), query, maxsize=4, name='pages')
+    with Progress(log, 'recipes', count_recipes(query)) as progress:
+        with BatchWriter(db, limiter=limiter) as writer:
+            for page in pages:
+                refs, recipes, skipped = resolve_page(page, resolver, table)
+                for ref, totals in zip(refs, table.totals(recipes)):
+                    fields = {**recipe_fields(totals), SUMMED_FIELD: firestore.SERVER_TIMESTAMP}
+                    recipe_cache.invalidate_after(writer.set(ref, fields, merge=True), ref.id)
+                progress.update(len(page), queued=len(refs), skipped=skipped)
+        progress.counts['written'] = writer.committed
+    log.info("Commits in flight settled at %.1f; %d throttled commits retried", limiter.limit, limiter.throttles)
+    return writer.committed
 
 if __name__ == "__main__":
-    update_recipe_nutrition_batch()
+    argv = setup_logging()
+    cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
+    firebase_admin.initialize_app(cred)
+    db = firestore.client()
+
+    concurrency = CONCURRENCY
+    for arg in argv[1:]:
+        if arg.startswith('--concurrency='):
+            concurrency = int(arg.split('=', 1)[1])
+    updated = backfill(db, only_zero='--all' not in argv, concurrency=concurrency)
+    log.info("🎯 Nutrition totals updated on %d recipes", updated)
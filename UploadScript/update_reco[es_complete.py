@@ -1,61 +1,156 @@
-import json
+"""Merge the fields of cleaned_recipes.json onto the recipes already in Firestore.
+
+Each cleaned recipe is joined to its document on the id upload_recipes_batch
+gives it (see recipe_doc_id). Recipes uploaded before those ids existed are
+joined on their Name instead, the lowest id winning as the old query did.
+The recipes are read in one paged scan of the merged fields. Each match is
+diffed field by field against what is stored, and only the fields that
+differ are written, with merge, in 500-op batches with several in flight.
+Each rewritten recipe is dropped from the shared document cache once its
+batch commits (see doc_cache). A change to a field the recipe index holds
+also stamps UpdatedAt, which the index listeners follow (see recipe_index).
+
+A rerun diffs again, so whatever already landed is not written twice and no
+checkpoint is needed to resume. --dry-run writes nothing and reports how many
+recipes and fields would change.
+
+Ingredients are left out: their parts and quantities go through
+upload_recipes_batch, which resolves them against ingredients_list.
+The nutrition totals (Calories, FatContent, ...) are left out as well: they
+are summed from the ingredients at upload and nutrition_delta moves them by
+increments from there, so a value copied from the file would be counted
+twice by the next delta. AggregatedRating and ReviewCount are left out too;
+the reviews keep those (see rating_aggregates).
+
+Usage: python "update_reco[es_complete.py" [cleaned_recipes.json] [--dry-run] [--concurrency=8]
+                                           [--debug | --quiet] [--log-json]
+"""
+import math
+from collections import Counter
+
 import firebase_admin
 from firebase_admin import credentials, firestore
-import time
 
-# Initialize Firebase Admin
-cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+from doc_cache import DocumentCache
+from ingest_pipeline import BATCH_SIZE, CONCURRENCY, BatchWriter
+from recipe_index import INDEXED_FIELDS, UPDATED_FIELD
+from record_stream import iter_records
+from update_recipes import page_recipes
+from upload_logging import Progress, get_logger, setup_logging
+from upload_recipes_batch import parse_total_time, recipe_doc_id
+
+log = get_logger('update_recipes_complete')
 
 # File path
 JSON_FILE = 'cleaned_recipes.json'
 
-# Load recipes
-with open(JSON_FILE, 'r') as f:
-    recipes = json.load(f)
-
-# Firestore collection
-collection_ref = db.collection('recipes')
-
-# Fields to update in Firestore
-ALLOWED_FIELDS = {
-    'instructions', 'ingredients', 'images', 'AggregatedRating', 'ReviewCount',
-    'calories', 'proteinContent', 'carbohydrateContent', 'fatContent',
-    'saturatedFatContent', 'cholesterolContent', 'sodiumContent', 'fiberContent', 'sugarContent'
+# cleaned_recipes.json key -> Firestore field, as upload_recipes_batch names them
+FIELD_MAP = {
+    'prepTime': 'PrepTime',
+    'cookTime': 'CookTime',
+    'expiryDate': 'ExpiryDate',
+    'category': 'RecipeCategory',
+    'keywords': 'Keywords',
+    'servings': 'RecipeServings',
+    'yield': 'RecipeYield',
+    'instructions': 'RecipeInstructions',
+    'images': 'Images',
 }
+FIELDS = sorted({*FIELD_MAP.values(), 'TotalTime'})
+
+def recipe_update(recipe):
+    """The Firestore fields a cleaned recipe sets"""
+    data = {field: recipe[key] for key, field in FIELD_MAP.items() if key in recipe}
+    if 'PrepTime' in data or 'CookTime' in data:
+        data['TotalTime'] = parse_total_time(recipe.get('prepTime'), recipe.get('cookTime'))
+    return data
 
-updated_count = 0
+def _same(stored, value):
+    if isinstance(stored, (int, float)) and isinstance(value, (int, float)) \
+            and not isinstance(stored, bool) and not isinstance(value, bool):
+        return math.isclose(stored, value, rel_tol=1e-9, abs_tol=1e-9)
+    return stored == value
 
-for recipe in recipes:
-    try:
-        docs = collection_ref.where('Name', '==', recipe['name']).limit(1).stream()
-        doc_list = list(docs)
+def field_diff(stored, update):
+    """The fields of update whose values differ from (or are missing in) stored"""
+    return {field: value for field, value in update.items()
+            if field not in stored or not _same(stored[field], value)}
 
-        if not doc_list:
-            print(f"❌ Not found: {recipe['name']}")
-            continue
+def load_recipes(db):
+    """(document id -> stored merge fields, Name -> lowest document id) from one paged scan"""
+    stored, ids = {}, {}
+    with Progress(log, 'scanned') as progress:
+        for page in page_recipes(db.collection('recipes'), fields=['Name', *FIELDS]):
+            for doc in page:
+                data = doc.to_dict()
+                stored[doc.id] = data
+                name = data.get('Name')
+                if name is not None and (name not in ids or doc.id < ids[name]):
+                    ids[name] = doc.id
+            progress.update(len(page))
+    return stored, ids
 
-        doc_ref = doc_list[0].reference
+def merge_recipes(db, path=JSON_FILE, dry_run=False, concurrency=CONCURRENCY):
+    """Writes the changed fields of every matched recipe; returns the Counter of changes per field"""
+    stored, ids = load_recipes(db)
+    log.info("Loaded %d recipes", len(stored))
+    collection = db.collection('recipes')
+    cache = DocumentCache(db, 'recipes')
+    changed_fields = Counter()
+    seen = set()
+    with Progress(log, 'recipes') as progress, \
+            BatchWriter(db, concurrency=concurrency) as writer:
+        for recipe in iter_records(path):
+            progress.update()
+            recipe_id = recipe_doc_id(recipe)
+            if recipe_id in stored:
+                progress.counts['by id'] += 1
+            else:
+                recipe_id = ids.get(recipe['name'])
+                if recipe_id is None:
+                    log.debug("❌ Not found: %s", recipe['name'])
+                    progress.counts['not found'] += 1
+                    continue
+                progress.counts['by name'] += 1
+            if recipe_id in seen:
+                log.debug("⚠️ %s matches recipe %s again; keeping the first", recipe['name'], recipe_id)
+                progress.counts['duplicate'] += 1
+                continue
+            seen.add(recipe_id)
 
-        # Prepare update dictionary using correct Firestore field names
-        update_data = {}
-        for key in ALLOWED_FIELDS:
-            # Handle case sensitivity between input JSON and Firestore fields
-            json_key = key[0].lower() + key[1:] if key in ['AggregatedRating', 'ReviewCount'] else key
-            if json_key in recipe:
-                update_data[key] = recipe[json_key]
+            diff = field_diff(stored[recipe_id], recipe_update(recipe))
+            if not diff:
+                progress.counts['unchanged'] += 1
+                continue
+            changed_fields.update(diff.keys())
+            progress.counts['changed'] += 1
+            log.debug("✏️ %s (%s): %s", recipe['name'], recipe_id, sorted(diff))
+            if not dry_run:
+                if not diff.keys().isdisjoint(INDEXED_FIELDS):
+                    diff[UPDATED_FIELD] = firestore.SERVER_TIMESTAMP  # The recipe index listeners pick it up
+                cache.invalidate_after(writer.set(collection.document(recipe_id), diff, merge=True), recipe_id)
 
-        if update_data:
-            doc_ref.update(update_data)
-            updated_count += 1
-            print(f"✅ Updated ({updated_count}): {recipe['name']} -> {list(update_data.keys())}")
-        else:
-            print(f"⚠️ Skipped (no matching fields): {recipe['name']}")
+    recipes_changed = progress.counts['changed']
+    log.info("%s %d recipes, %d fields%s", 'Would update' if dry_run else 'Updated', recipes_changed,
+             sum(changed_fields.values()),
+             f" in {-(-recipes_changed // BATCH_SIZE)} batches" if dry_run else '')
+    for field, count in changed_fields.most_common():
+        log.info("  %-22s %d", field, count)
+    return changed_fields
 
-        time.sleep(0.05)
+if __name__ == "__main__":
+    argv = setup_logging()  # --debug logs every recipe, --quiet only problems, --log-json for JSON lines
 
-    except Exception as e:
-        print(f"🔥 Error updating '{recipe['name']}': {e}")
+    # Initialize Firebase Admin
+    cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
+    firebase_admin.initialize_app(cred)
+    db = firestore.client()
 
-print(f"🎉 Done! Total recipes updated: {updated_count}")
+    path, concurrency = JSON_FILE, CONCURRENCY
+    for arg in argv[1:]:
+        if arg.startswith('--concurrency='):
+            concurrency = int(arg.split('=', 1)[1])
+        elif not arg.startswith('--'):
+            path = arg
+    changed = merge_recipes(db, path, dry_run='--dry-run' in argv, concurrency=concurrency)
+    log.info("🎉 Done! %d fields changed", sum(changed.values()))
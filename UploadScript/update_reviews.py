@@ -1,68 +1,192 @@
+"""Upload the Food.com reviews into each recipe's reviews subcollection.
+
+Reviews are keyed by AuthorId, so writing one again replaces it. Each
+review goes through rating_aggregates.submit_review, which keeps the
+recipe's rating sums and averages current in the same transaction. Every
+uploaded review is recorded in the local checkpoint (see checkpoint); after
+a crash, --resume carries on from where the run stopped. Reviews that fail
+are saved to FAILED_FILE.
+
+--bulk resolves recipe names from one map instead of one query per review.
+The map is built from a recipe export (--recipes=export.json, records with
+Id and Name) or from one paged scan of the Name field. Reviews then go out in
+500-op batches, several in flight. Once they have all landed, every recipe
+the file reviews gets its rating aggregates recounted from its reviews
+subcollection (see rating_aggregates.recount), so reviews already there,
+from an earlier import or the app, still count. The recount covers the whole
+file on every run, resumed or not, so running it twice gives the same values.
+The recount reads each recipe's reviews and then overwrites its aggregates
+outside a transaction, so a review the app submits in between is counted
+out again until the next recount or reconcile: run --bulk while the app
+takes no reviews, as for rating_aggregates.reconcile.
+
+Usage: python update_reviews.py [--bulk [--recipes=export.json] [--concurrency=8]] [--resume]
+                                [--debug | --quiet] [--log-json]
+  --bulk overwrites the aggregates of every recipe the file reviews at the
+  end; run it while the app takes no reviews.
+"""
 import json
 import firebase_admin
 from firebase_admin import credentials, firestore
 from datetime import datetime
 
-# Initialize Firebase Admin
-cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+from checkpoint import CHECKPOINT_FILE, RESUME_FLAG, Checkpoint, file_fingerprint
+from ingest_pipeline import CONCURRENCY, BatchWriter
+from rating_aggregates import recount, submit_review
+from record_stream import iter_records
+from update_recipes import page_recipes
+from upload_logging import Progress, get_logger, setup_logging
+
+log = get_logger('update_reviews')
 
 # Load reviews from JSON file
 INPUT_FILE = 'filtered_reviews.json'
 FAILED_FILE = 'failed_reviews.json'
 
-with open(INPUT_FILE, 'r') as f:
-    reviews = json.load(f)
+def review_doc(review):
+    """(review document id, review document) of one input review"""
+    # Parse dates
+    submitted = datetime.fromisoformat(review['DateSubmitted'].replace('Z', '+00:00'))
+    modified = datetime.fromisoformat(review['DateModified'].replace('Z', '+00:00'))
+
+    # Build review data without ID fields; AuthorId is the document ID
+    return str(review['AuthorId']), {
+        'AuthorName': review['AuthorName'],
+        'Rating': float(review['Rating']),
+        'Review': review['Review'],
+        'DateSubmitted': submitted,
+        'DateModified': modified
+    }
+
+def save_failed(failed_reviews, failed_path):
+    # Save failed reviews to retry later
+    if failed_reviews:
+        with open(failed_path, 'w') as f:
+            json.dump(failed_reviews, f, indent=2)
+        log.warning("⚠️ %d reviews failed. Saved to %s", len(failed_reviews), failed_path)
+
+def upload_reviews(db, path=INPUT_FILE, failed_path=FAILED_FILE, resume=False, checkpoint_path=CHECKPOINT_FILE):
+    """Uploads every review not already recorded as done, one query and one transaction each; returns how many"""
+    uploaded = 0
+    failed_reviews = []
+    with Checkpoint('update_reviews', file_fingerprint(path), resume, checkpoint_path) as checkpoint, \
+            Progress(log, 'reviews') as progress:
+        if checkpoint.resumed:
+            log.info("Resuming: %d reviews already uploaded", len(checkpoint))
+
+        # Streamed one review at a time rather than loading the whole file
+        for offset, review in checkpoint.pending(iter_records(path)):
+            index = offset + 1
+            progress.update()
+            try:
+                recipe_name = review['Name']
+
+                # Look up the recipe by name
+                recipe_docs = db.collection('recipes').where('Name', '==', recipe_name).limit(1).stream()
+                recipe_doc_list = list(recipe_docs)
 
-total = len(reviews)
-failed_reviews = []
+                if not recipe_doc_list:
+                    log.debug("[%d] ❌ Recipe not found: '%s'", index, recipe_name)
+                    failed_reviews.append(review)
+                    progress.counts['not found'] += 1
+                    continue
 
-for index, review in enumerate(reviews, 1):
-    try:
-        recipe_name = review['Name']
+                review_doc_id, review_data = review_doc(review)
 
-        # Look up the recipe by name
-        recipe_docs = db.collection('recipes').where('Name', '==', recipe_name).limit(1).stream()
-        recipe_doc_list = list(recipe_docs)
+                # Upload to Firestore, with the recipe's rating aggregates
+                submit_review(db, recipe_doc_list[0].id, review_doc_id, review_data)
+                checkpoint.mark([offset])
+                uploaded += 1
+                log.debug("[%d] ✅ Uploaded review by Author %s for '%s'", index, review_doc_id, recipe_name)
 
-        if not recipe_doc_list:
-            print(f"[{index}/{total}] ❌ Recipe not found: '{recipe_name}'")
-            failed_reviews.append(review)
-            continue
+            except Exception as e:
+                log.warning("[%d] 🔥 Error for review '%s' by %s: %s", index, review.get('Name'), review.get('AuthorId'), e)
+                failed_reviews.append(review)
+                progress.counts['errors'] += 1
 
-        recipe_doc = recipe_doc_list[0]
-        recipe_id = recipe_doc.id
-        recipe_ref = db.collection('recipes').document(recipe_id)
+    save_failed(failed_reviews, failed_path)
+    return uploaded
 
-        # Parse dates
-        submitted = datetime.fromisoformat(review['DateSubmitted'].replace('Z', '+00:00'))
-        modified = datetime.fromisoformat(review['DateModified'].replace('Z', '+00:00'))
+def recipe_ids_by_name(db, export=None):
+    """Recipe name -> document id, from a recipe export or one paged scan; the lowest id wins, as the query did"""
+    ids = {}
+    if export:
+        for recipe in iter_records(export):
+            recipe_id = str(recipe['Id'])
+            if recipe['Name'] not in ids or recipe_id < ids[recipe['Name']]:
+                ids[recipe['Name']] = recipe_id
+        return ids
+    for page in page_recipes(db.collection('recipes'), fields=['Name']):
+        for doc in page:
+            name = (doc.to_dict() or {}).get('Name')
+            if name is not None:
+                ids.setdefault(name, doc.id)
+    return ids
 
-        # Build review data without ID fields
-        review_data = {
-            'AuthorName': review['AuthorName'],
-            'Rating': float(review['Rating']),
-            'Review': review['Review'],
-            'DateSubmitted': submitted,
-            'DateModified': modified
-        }
+def upload_reviews_bulk(db, path=INPUT_FILE, failed_path=FAILED_FILE, resume=False,
+                        checkpoint_path=CHECKPOINT_FILE, export=None, concurrency=CONCURRENCY):
+    """Uploads the reviews in concurrent batches, then recounts each reviewed recipe's aggregates; returns how many
 
-        # Use AuthorId as document ID
-        review_doc_id = str(review['AuthorId'])
+    Reviews the app submits during the recount can be counted out of the
+    aggregates (see rating_aggregates.recount).
+    """
+    ids = recipe_ids_by_name(db, export)
+    log.info("Mapped %d recipe names", len(ids))
+    recipes = db.collection('recipes')
+    reviewed = set()
+    failed_reviews = []
+    queued = 0
+    with Checkpoint('update_reviews_bulk', file_fingerprint(path), resume, checkpoint_path) as checkpoint, \
+            Progress(log, 'reviews') as progress, \
+            BatchWriter(db, concurrency=concurrency) as writer:
+        if checkpoint.resumed:
+            log.info("Resuming: %d reviews already uploaded", len(checkpoint))
+        # Every review's recipe is recounted, done or not, so the aggregates cover the whole file
+        for offset, review in enumerate(iter_records(path)):
+            progress.update()
+            try:
+                recipe_id = ids.get(review['Name'])
+                if recipe_id is None:
+                    log.debug("[%d] ❌ Recipe not found: '%s'", offset + 1, review['Name'])
+                    failed_reviews.append(review)
+                    progress.counts['not found'] += 1
+                    continue
+                review_doc_id, review_data = review_doc(review)
+            except Exception as e:
+                log.warning("[%d] 🔥 Error for review '%s' by %s: %s",
+                            offset + 1, review.get('Name'), review.get('AuthorId'), e)
+                failed_reviews.append(review)
+                progress.counts['errors'] += 1
+                continue
+            reviewed.add(recipe_id)
+            if offset in checkpoint:
+                continue
+            ref = recipes.document(recipe_id).collection('reviews').document(review_doc_id)
+            checkpoint.track(writer.set(ref, review_data), offset)
+            queued += 1
 
-        # Upload to Firestore
-        recipe_ref.collection('reviews').document(review_doc_id).set(review_data)
-        print(f"[{index}/{total}] ✅ Uploaded review by Author {review_doc_id} for '{recipe_name}'")
+    # After the writer has closed, so every review it queued is counted
+    log.info("Recounted the rating aggregates of %d recipes", recount(db, reviewed))
+    save_failed(failed_reviews, failed_path)
+    return queued
 
-    except Exception as e:
-        print(f"[{index}/{total}] 🔥 Error for review '{review.get('Name')}' by {review.get('AuthorId')}: {e}")
-        failed_reviews.append(review)
+if __name__ == "__main__":
+    argv = setup_logging()  # --debug logs every review, --quiet only problems, --log-json for JSON lines
 
-# Save failed reviews to retry later
-if failed_reviews:
-    with open(FAILED_FILE, 'w') as f:
-        json.dump(failed_reviews, f, indent=2)
-    print(f"\n⚠️ {len(failed_reviews)} reviews failed. Saved to {FAILED_FILE}")
+    # Initialize Firebase Admin
+    cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
+    firebase_admin.initialize_app(cred)
+    db = firestore.client()
 
-print(f"\n🎉 Upload complete. {total - len(failed_reviews)} reviews uploaded successfully.")
+    resume = RESUME_FLAG in argv
+    if '--bulk' in argv:
+        options = {}
+        for arg in argv[1:]:
+            if arg.startswith('--recipes='):
+                options['export'] = arg.split('=', 1)[1]
+            elif arg.startswith('--concurrency='):
+                options['concurrency'] = int(arg.split('=', 1)[1])
+        uploaded = upload_reviews_bulk(db, resume=resume, **options)
+    else:
+        uploaded = upload_reviews(db, resume=resume)
+    log.info("🎉 Upload complete. %d reviews uploaded successfully.", uploaded)
@@ -0,0 +1,115 @@
+"""Leveled logging and progress summaries for the UploadScript tools.
+
+    log = get_logger('new')
+    log.debug("Part: %s", part)         # %-style args: nothing is formatted unless DEBUG is on
+    with Progress(log, 'recipes') as progress:
+        progress.update(uploaded=1)     # At most one INFO summary per PROGRESS_INTERVAL seconds
+
+setup_logging() configures a run once, from --debug / --quiet / --log-json
+on the command line or the LOG_LEVEL / LOG_FORMAT=json environment
+variables. With --log-json every record is one JSON object per line
+(timestamp, level, logger, message and any extra fields) for jq or a log
+store; otherwise records are plain lines on stderr.
+"""
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+
+ROOT = 'uploadscript'
+PROGRESS_INTERVAL = 5.0     # Seconds between progress summaries
+FLAGS = {'--debug', '--quiet', '--log-json'}
+
+# Attributes every LogRecord has; anything else on a record came in through extra=
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        entry.update((k, v) for k, v in vars(record).items() if k not in _RECORD_FIELDS)
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+def get_logger(name):
+    return logging.getLogger(f'{ROOT}.{name}')
+
+def setup_logging(argv=None, level=None, json_output=None, stream=None):
+    """Configures the tool loggers; returns argv (default sys.argv) without the logging flags"""
+    argv = sys.argv if argv is None else argv
+    if level is None:
+        if '--debug' in argv:
+            level = logging.DEBUG
+        elif '--quiet' in argv:
+            level = logging.WARNING
+        else:
+            level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    if json_output is None:
+        json_output = '--log-json' in argv or os.environ.get('LOG_FORMAT', '').lower() == 'json'
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    if json_output:
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)-7s %(message)s', '%H:%M:%S'))
+    root = logging.getLogger(ROOT)
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(level)
+    root.propagate = False
+    return [arg for arg in argv if arg not in FLAGS]
+
+class Progress:
+    """Counts work items and logs a rate-limited summary, plus a final one on close()"""
+
+    def __init__(self, logger, label, total=None, interval=PROGRESS_INTERVAL, level=logging.INFO):
+        self.logger = logger
+        self.label = label
+        self.total = total
+        self.interval = interval
+        self.level = level
+        self.done = 0
+        self.counts = Counter()
+        self._start = time.monotonic()
+        self._next = self._start + interval
+
+    def update(self, n=1, **counts):
+        self.done += n
+        if counts:
+            self.counts.update(counts)
+        if time.monotonic() >= self._next:
+            self._next = time.monotonic() + self.interval
+            self._log('progress')
+
+    def _log(self, event):
+        if not self.logger.isEnabledFor(self.level):
+            return
+        elapsed = time.monotonic() - self._start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        text = f"{self.label}: {self.done:,}" + (f"/{self.total:,}" if self.total else '') + f" ({rate:,.0f}/s"
+        if self.total and rate and event == 'progress':
+            text += f", ETA {(self.total - self.done) / rate:,.0f}s"
+        text += ')' + ''.join(f", {key} {value:,}" for key, value in sorted(self.counts.items()))
+        if event == 'done':
+            text += f" in {elapsed:,.1f}s"
+        self.logger.log(self.level, text, extra={
+            'event': event, 'label': self.label, 'done': self.done, 'total': self.total,
+            'rate': round(rate, 1), 'elapsed': round(elapsed, 2), 'counts': dict(self.counts),
+        })
+
+    def close(self):
+        self._log('done')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -2,9 +2,11 @@ import pandas as pd
 import firebase_admin
 from firebase_admin import credentials, firestore
 import uuid
-import re
 from tqdm import tqdm
 
+from r_vectors import parse_r_vector
+from recipe_index import UPDATED_FIELD
+
 # Initialize Firebase Admin SDK
 cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
 firebase_admin.initialize_app(cred)
@@ -14,10 +16,8 @@ db = firestore.client()
 df = pd.read_csv('meals_trimmed_5.csv')
 
 # Parse c("ingredient1", "ingredient2") format
-def parse_r_style_list(s):
-    if pd.isna(s):
-        return []
-    return re.findall(r'"(.*?)"', s)
+def parse_r_style_list(s, drop_na=True):
+    return parse_r_vector(s, drop_na=drop_na)
 
 # Helper to get or create an ingredient document
 def get_or_create_ingredient(name):
@@ -47,7 +47,7 @@ def get_or_create_ingredient(name):
 # Process each recipe
 for _, row in tqdm(df.iterrows(), total=len(df), desc="Uploading Recipes"):
     ingredient_names = parse_r_style_list(row.get('RecipeIngredientParts', ''))
-    ingredient_quantities = parse_r_style_list(row.get('RecipeIngredientQuantities', ''))
+    ingredient_quantities = parse_r_style_list(row.get('RecipeIngredientQuantities', ''), drop_na=False)
 
     if len(ingredient_names) == 0 or len(ingredient_names) != len(ingredient_quantities):
         continue  # skip invalid rows
@@ -88,7 +88,8 @@ for _, row in tqdm(df.iterrows(), total=len(df), desc="Uploading Recipes"):
         "RecipeServings": str(row.get("RecipeServings", "")),
         "RecipeYield": str(row.get("RecipeYield", "")),
         "RecipeInstructions": row.get("RecipeInstructions", ""),
-        "ingredients": ingredients
+        "ingredients": ingredients,
+        UPDATED_FIELD: firestore.SERVER_TIMESTAMP,  # The recipe index listeners pick it up
     }
 
     db.collection("recipes").document(recipe_doc["Id"]).set(recipe_doc)
@@ -3,19 +3,25 @@ from firebase_admin import credentials, firestore
 import json
 import uuid
 import re
+import sys
+import time
 from tqdm import tqdm
 
+from ingredient_resolver import IngredientResolver
+from nutrition import SUMMED_FIELD, NutritionTable, recipe_fields
+from recipe_dedup import RecipeKeys
+from recipe_index import UPDATED_FIELD
+
 # Initialize Firebase
 cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
 firebase_admin.initialize_app(cred)
 db = firestore.client()
 
+resolver = IngredientResolver.load(db)
+nutrition_table = NutritionTable.from_resolver(resolver)
+
 def get_existing_ingredient_by_name(name):
-    name_lower = name.lower()
-    results = db.collection('ingredients_list') \
-        .where('name_lower', '==', name_lower) \
-        .get()
-    return results[0] if results else None
+    return resolver.exact(name.lower())
 
 def add_ingredient(name):
     name_lower = name.lower()
@@ -32,43 +38,7 @@ def add_ingredient(name):
         "cholesterol": None,
         "sodium": None,
     }
-    doc_ref = db.collection('ingredients_list').document()
-    doc_ref.set(ingredient_data)
-    return doc_ref.id, ingredient_data
-
-def calculate_nutrition(ingredients):
-    totals = {
-        "Calories": 0.0,
-        "ProteinContent": 0.0,
-        "CarbohydrateContent": 0.0,
-        "FatContent": 0.0,
-        "SaturatedFatContent": 0.0,
-        "CholesterolContent": 0.0,
-        "SodiumContent": 0.0,
-        "FiberContent": 0.0,
-        "SugarContent": 0.0
-    }
-
-    for ingredient in ingredients:
-        weight = ingredient["weight"]
-        factor = weight / 100.0
-        nutrition = ingredient["nutrition"]
-
-        totals["Calories"] += (nutrition.get("calories") or 0) * factor
-        totals["ProteinContent"] += (nutrition.get("protein") or 0) * factor
-        totals["CarbohydrateContent"] += (nutrition.get("carbohydrate") or 0) * factor
-        totals["FatContent"] += (nutrition.get("fat") or 0) * factor
-        totals["SaturatedFatContent"] += (nutrition.get("saturatedfat") or 0) * factor
-        totals["SodiumContent"] += (nutrition.get("sodium") or 0) * factor
-        totals["FiberContent"] += (nutrition.get("fiber") or 0) * factor
-        totals["SugarContent"] += (nutrition.get("sugar") or 0) * factor
-
-    if totals["CholesterolContent"] == 0:
-        totals["CholesterolContent"] = None
-    if totals["SodiumContent"] == 0:
-        totals["SodiumContent"] = None
-
-    return totals
+    return resolver.create(db, ingredient_data)
 
 def parse_total_time(prep, cook):
     def get_minutes(t):
@@ -84,84 +54,79 @@ def parse_total_time(prep, cook):
     total_minutes = get_minutes(prep) + get_minutes(cook)
     return f"PT{total_minutes}M" if total_minutes > 0 else None
 
-def upload_recipes(filepath):
+def upload_recipes(filepath, dedup='name'):
     with open(filepath, 'r') as f:
         recipes = json.load(f)
 
-    for recipe in tqdm(recipes):
-        # Check for duplicates by Name
-        existing = db.collection('recipes').where('Name', '==', recipe['name']).limit(1).get()
+    # One read of the existing recipes (or the local cache) instead of a query per recipe
+    start = time.perf_counter()
+    existing_recipes = RecipeKeys.load(db, dedup)
+    known = len(existing_recipes)
+    total = len(recipes)
+    recipes = list(existing_recipes.filter(
+        recipes, lambda recipe: print(f"Skipped duplicate recipe: {recipe['name']}")))
+    print(f"Checked {total} recipes against {known} existing in "
+          f"{time.perf_counter() - start:.1f}s; {len(recipes)} to upload")
+
+    try:
+        for recipe in tqdm(recipes):
+            upload_recipe(recipe)
+    except BaseException:
+        existing_recipes.invalidate()
+        raise
+    finally:
+        resolver.flush(db)
+    existing_recipes.uploaded(len(recipes))
+    existing_recipes.save()
+
+def upload_recipe(recipe):
+    rows = []
+    ingredient_quantities = []
+    ingredient_parts = []
+
+    for ing in recipe['ingredients']:
+        name = ing['name'].strip()
+        weight = ing['weight']
+        existing = get_existing_ingredient_by_name(name)
+
         if existing:
-            print(f"Skipped duplicate recipe: {recipe['name']}")
-            continue
-
-        ingredients = []
-        ingredient_quantities = []
-        ingredient_parts = []
-
-        for ing in recipe['ingredients']:
-            name = ing['name'].strip()
-            weight = ing['weight']
-            existing = get_existing_ingredient_by_name(name)
-
-            if existing:
-                ing_id = existing.id
-                ing_data = existing.to_dict()
-            else:
-                ing_id, ing_data = add_ingredient(name)
-
-            ingredients.append({
-                'id': ing_id,
-                'name': name,
-                'weight': weight,
-                'nutrition': {
-                    'calories': ing_data.get('calories', 0.0),
-                    'carbohydrate': ing_data.get('carbohydrate', 0.0),
-                    'fat': ing_data.get('fat', 0.0),
-                    'fiber': ing_data.get('fiber', 0.0),
-                    'protein': ing_data.get('protein', 0.0),
-                    'saturatedfat': ing_data.get('saturatedfat', 0.0),
-                    'sugar': ing_data.get('sugar', 0.0),
-                    'cholesterol': ing_data.get('cholesterol', 0.0),
-                    'sodium': ing_data.get('sodium', 0.0),
-                }
-            })
-            ingredient_quantities.append(weight)
-            ingredient_parts.append(name)
-
-        nutrition_totals = calculate_nutrition(ingredients)
-
-        recipe_id = str(uuid.uuid4())
-        recipe_doc = {
-            "Id": recipe_id,
-            "Name": recipe['name'],
-            "CookTime": recipe['cookTime'],
-            "PrepTime": recipe['prepTime'],
-            "TotalTime": parse_total_time(recipe['prepTime'], recipe['cookTime']),
-            "Images": [],
-            "ExpiryDate": recipe['expiryDate'],
-            "RecipeCategory": recipe['category'],
-            "Keywords": recipe['keywords'],
-            "RecipeIngredientQuantities": ingredient_quantities,
-            "RecipeIngredientParts": ingredient_parts,
-            "AggregatedRating": 0,
-            "ReviewCount": 0,
-            "Calories": nutrition_totals["Calories"],
-            "ProteinContent": nutrition_totals["ProteinContent"],
-            "CarbohydrateContent": nutrition_totals["CarbohydrateContent"],
-            "FatContent": nutrition_totals["FatContent"],
-            "SaturatedFatContent": nutrition_totals["SaturatedFatContent"],
-            "CholesterolContent": nutrition_totals["CholesterolContent"],
-            "SodiumContent": nutrition_totals["SodiumContent"],
-            "FiberContent": nutrition_totals["FiberContent"],
-            "SugarContent": nutrition_totals["SugarContent"],
-            "RecipeServings": recipe['servings'],
-            "RecipeYield": recipe['yield'],
-            "RecipeInstructions": recipe['instructions']
-        }
-
-        db.collection('recipes').document(recipe_id).set(recipe_doc)
-        print(f"Uploaded recipe: {recipe['name']}")
+            ing_id, ing_data = existing
+        else:
+            ing_id, ing_data = add_ingredient(name)
+
+        rows.append((nutrition_table.row(ing_id, ing_data), weight))
+        ingredient_quantities.append(weight)
+        ingredient_parts.append(name)
+
+    nutrition_totals = recipe_fields(nutrition_table.recipe_totals(rows))
+
+    recipe_id = str(uuid.uuid4())
+    recipe_doc = {
+        "Id": recipe_id,
+        "Name": recipe['name'],
+        "CookTime": recipe['cookTime'],
+        "PrepTime": recipe['prepTime'],
+        "TotalTime": parse_total_time(recipe['prepTime'], recipe['cookTime']),
+        "Images": [],
+        "ExpiryDate": recipe['expiryDate'],
+        "RecipeCategory": recipe['category'],
+        "Keywords": recipe['keywords'],
+        "RecipeIngredientQuantities": ingredient_quantities,
+        "RecipeIngredientParts": ingredient_parts,
+        "AggregatedRating": 0,
+        "ReviewCount": 0,
+        **nutrition_totals,
+        SUMMED_FIELD: firestore.SERVER_TIMESTAMP,
+        "RecipeServings": recipe['servings'],
+        "RecipeYield": recipe['yield'],
+        "RecipeInstructions": recipe['instructions'],
+        UPDATED_FIELD: firestore.SERVER_TIMESTAMP,  # The recipe index listeners pick it up
+    }
+
+    # New ingredients go in the same commit, so the recipe never points at a missing doc
+    resolver.set_with_pending(db, db.collection('recipes').document(recipe_id), recipe_doc)
+    print(f"Uploaded recipe: {recipe['name']}")
 
 if __name__ == "__main__":
-    upload_recipes("cleaned_recipes.json")
+    dedup = next((arg.split('=', 1)[1] for arg in sys.argv[1:] if arg.startswith('--dedup=')), 'name')
+    upload_recipes("cleaned_recipes.json", dedup)
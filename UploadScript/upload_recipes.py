@@ -3,33 +3,33 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 from tqdm import tqdm
 import uuid
-import ast
+
+from r_vectors import parse_r_column
+from recipe_index import UPDATED_FIELD
+from record_stream import iter_csv_chunks
 
 # Initialize Firebase
 cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
 firebase_admin.initialize_app(cred)
 db = firestore.client()
 
-# Load the dataset
-df = pd.read_csv('meals_trimmed_5.csv')
-
-# Handle nested stringified lists
-def parse_column(value):
-    try:
-        if isinstance(value, str) and value.startswith('c('):
-            return ast.literal_eval(value[1:].replace('c', '').strip())
-        elif isinstance(value, str):
-            return ast.literal_eval(value)
-        else:
-            return value
-    except:
-        return []
+# Drop NA parts together with the quantities at the same positions
+def drop_na_parts(parts, quantities):
+    keep = [i for i, part in enumerate(parts) if part is not None]
+    return [parts[i] for i in keep], [quantities[i] for i in keep if i < len(quantities)]
 
-# Preprocess certain columns
-df['Keywords'] = df['Keywords'].apply(parse_column)
-df['RecipeIngredientQuantities'] = df['RecipeIngredientQuantities'].apply(parse_column)
-df['RecipeIngredientParts'] = df['RecipeIngredientParts'].apply(parse_column)
-df['Images'] = df['Images'].apply(lambda x: [] if pd.isna(x) or 'character' in str(x) else [x])
+# Stream the dataset in chunks, preprocessing certain columns chunk by chunk
+def load_rows(path):
+    for df in iter_csv_chunks(path):
+        df['Keywords'] = parse_r_column(df['Keywords'], drop_na=True)
+        # NA stays as None until here so each quantity lines up with its part
+        pairs = [drop_na_parts(parts, quantities) for parts, quantities in
+                 zip(parse_r_column(df['RecipeIngredientParts']), parse_r_column(df['RecipeIngredientQuantities']))]
+        df['RecipeIngredientParts'] = [parts for parts, _ in pairs]
+        df['RecipeIngredientQuantities'] = [quantities for _, quantities in pairs]
+        df['Images'] = df['Images'].apply(lambda x: [] if pd.isna(x) or 'character' in str(x) else [x])
+        for _, row in df.iterrows():
+            yield row
 
 # Load ingredient collection
 ingredient_collection = db.collection('ingredient_list')
@@ -49,7 +49,7 @@ default_nutrition = {
 }
 
 # Upload recipes
-for _, row in tqdm(df.iterrows(), total=len(df)):
+for row in tqdm(load_rows('meals_trimmed_5.csv'), unit=' recipes'):
     recipe_id = str(uuid.uuid4())
     ingredient_names = row['RecipeIngredientParts']
     ingredient_quantities = row['RecipeIngredientQuantities']
@@ -90,7 +90,8 @@ for _, row in tqdm(df.iterrows(), total=len(df)):
         "SugarContent": float(row.get("SugarContent", 0)),
         "RecipeServings": str(row.get("RecipeServings", "")),
         "RecipeYield": str(row.get("RecipeYield", "")),
-        "RecipeInstructions": str(row.get("RecipeInstructions", ""))
+        "RecipeInstructions": str(row.get("RecipeInstructions", "")),
+        UPDATED_FIELD: firestore.SERVER_TIMESTAMP,  # The recipe index listeners pick it up
     }
 
     db.collection("recipes").document(recipe_id).set(recipe_doc)
@@ -1,44 +1,47 @@
+"""Upload cleaned recipes to Firestore through a staged pipeline.
+
+parse -> drop duplicates -> resolve ingredients -> compute nutrition -> write.
+Each stage runs in its own thread behind a bounded queue (see ingest_pipeline),
+and several 500-document batches are committed at once. Nutrition totals are
+computed for 500 recipes at a time as one matrix product (see nutrition). Duplicates are
+checked in memory against the cached keys of existing recipes (see
+recipe_dedup).
+
+Recipe ids are derived from the name and ingredients, and each committed
+recipe is recorded in a local checkpoint (see checkpoint). After a crash,
+--resume skips what was committed. Anything in flight is written again, to
+the same documents.
+
+Usage: python upload_recipes_batch.py [cleaned_recipes.json] [--concurrency=8] [--dedup=name|content] [--resume]
+"""
 import firebase_admin
 from firebase_admin import credentials, firestore
-import json
-import uuid
+import sys
 import re
 import time
 from tqdm import tqdm
 
-# Initialize Firebase
-cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
-firebase_admin.initialize_app(cred)
-db = firestore.client()
+from checkpoint import CHECKPOINT_FILE, RESUME_FLAG, Checkpoint, content_id, file_fingerprint
+from ingest_pipeline import BATCH_SIZE, CONCURRENCY, BatchWriter, chunked, stage
+from ingredient_resolver import IngredientResolver
+from nutrition import SUMMED_FIELD, NutritionTable, recipe_fields
+from recipe_dedup import RecipeKeys, normalize_name
+from recipe_index import UPDATED_FIELD
+from record_stream import iter_records
 
-def preload_existing_ingredients(retries=5):
+def preload_existing_ingredients(db, retries=5):
     for attempt in range(retries):
         try:
-            ingredient_docs = db.collection('ingredients_list').stream()
-            ingredients = {}
-            for doc in ingredient_docs:
-                data = doc.to_dict()
-                if 'name_lower' not in data:
-                    if 'name' in data:
-                        name_lower = data['name'].lower()
-                        doc.reference.update({'name_lower': name_lower})
-                        data['name_lower'] = name_lower
-                        print(f"Fixed missing name_lower for: {data['name']}")
-                    else:
-                        print(f"Skipping doc {doc.id} — no name field.")
-                        continue
-                ingredients[data['name_lower']] = {'id': doc.id, 'data': data}
-            return ingredients
+            return IngredientResolver.load(db)
         except Exception as e:
             print(f"Error loading ingredients (Attempt {attempt + 1}/{retries}): {e}")
             time.sleep(5)
     raise Exception("Failed to preload ingredients after multiple attempts.")
 
-def add_ingredient(name):
-    name_lower = name.lower()
+def add_ingredient(db, resolver, name):
     ingredient_data = {
         "name": name,
-        "name_lower": name_lower,
+        "name_lower": name.lower(),
         "calories": 0.0,
         "carbohydrate": 0.0,
         "fat": 0.0,
@@ -49,45 +52,8 @@ def add_ingredient(name):
         "cholesterol": None,
         "sodium": None,
     }
-    doc_ref = db.collection('ingredients_list').document()
-    doc_ref.set(ingredient_data)
     print(f"Added new ingredient: {name}")
-    return doc_ref.id, ingredient_data
-
-def calculate_nutrition(ingredients):
-    totals = {
-        "Calories": 0.0,
-        "ProteinContent": 0.0,
-        "CarbohydrateContent": 0.0,
-        "FatContent": 0.0,
-        "SaturatedFatContent": 0.0,
-        "CholesterolContent": 0.0,
-        "SodiumContent": 0.0,
-        "FiberContent": 0.0,
-        "SugarContent": 0.0
-    }
-
-    for ingredient in ingredients:
-        weight = ingredient["weight"]
-        factor = weight / 100.0
-        nutrition = ingredient["nutrition"]
-
-        totals["Calories"] += (nutrition.get("calories") or 0) * factor
-        totals["ProteinContent"] += (nutrition.get("protein") or 0) * factor
-        totals["CarbohydrateContent"] += (nutrition.get("carbohydrate") or 0) * factor
-        totals["FatContent"] += (nutrition.get("fat") or 0) * factor
-        totals["SaturatedFatContent"] += (nutrition.get("saturatedfat") or 0) * factor
-        totals["SodiumContent"] += (nutrition.get("sodium") or 0) * factor
-        totals["FiberContent"] += (nutrition.get("fiber") or 0) * factor
-        totals["SugarContent"] += (nutrition.get("sugar") or 0) * factor
-
-    # Optional: Treat cholesterol and sodium as None if 0
-    if totals["CholesterolContent"] == 0:
-        totals["CholesterolContent"] = None
-    if totals["SodiumContent"] == 0:
-        totals["SodiumContent"] = None
-
-    return totals
+    return resolver.create(db, ingredient_data)
 
 def parse_total_time(prep, cook):
     def get_minutes(t):
@@ -103,105 +69,124 @@ def parse_total_time(prep, cook):
     total_minutes = get_minutes(prep) + get_minutes(cook)
     return f"PT{total_minutes}M" if total_minutes > 0 else None
 
-def upload_recipes(filepath):
-    existing_ingredients = preload_existing_ingredients()
-
-    with open(filepath, 'r') as f:
-        recipes = json.load(f)
+def read_recipes(filepath):
+    yield from iter_records(filepath)
 
-    # Filter out duplicates first
-    unique_recipes = []
+def resolve_ingredients(db, recipes, resolver, table):
+    """Pairs each recipe with its ingredients, registering unknown ones with the resolver"""
     for recipe in recipes:
-        existing = db.collection('recipes').where('Name', '==', recipe['name']).limit(1).get()
-        if not existing:
-            unique_recipes.append(recipe)
-        else:
-            print(f"Skipped duplicate recipe: {recipe['name']}")
-
-    print(f"\nTotal new recipes to upload: {len(unique_recipes)}")
-
-    batch_size = 500
-    total_batches = (len(unique_recipes) + batch_size - 1) // batch_size
-
-    for batch_num in tqdm(range(total_batches), desc="Uploading batches"):
-        batch = db.batch()
-        batch_recipes = unique_recipes[batch_num * batch_size:(batch_num + 1) * batch_size]
-
-        for recipe in tqdm(batch_recipes, desc=f"Batch {batch_num + 1}/{total_batches}", leave=False):
-            ingredients = []
-            ingredient_quantities = []
-            ingredient_parts = []
-
-            for ing in recipe['ingredients']:
-                name = ing['name'].strip()
-                weight = ing['weight']
-                name_lower = name.lower()
-
-                if name_lower in existing_ingredients:
-                    ing_id = existing_ingredients[name_lower]['id']
-                    ing_data = existing_ingredients[name_lower]['data']
-                else:
-                    ing_id, ing_data = add_ingredient(name)
-                    existing_ingredients[name_lower] = {'id': ing_id, 'data': ing_data}
-
-                ingredients.append({
-                    'id': ing_id,
-                    'name': name,
-                    'weight': weight,
-                    'nutrition': {
-                        'calories': ing_data.get('calories', 0.0),
-                        'carbohydrate': ing_data.get('carbohydrate', 0.0),
-                        'fat': ing_data.get('fat', 0.0),
-                        'fiber': ing_data.get('fiber', 0.0),
-                        'protein': ing_data.get('protein', 0.0),
-                        'saturatedfat': ing_data.get('saturatedfat', 0.0),
-                        'sugar': ing_data.get('sugar', 0.0),
-                        'cholesterol': ing_data.get('cholesterol', 0.0),
-                        'sodium': ing_data.get('sodium', 0.0),
-                    }
-                })
-                ingredient_quantities.append(weight)
-                ingredient_parts.append(name)
-
-            nutrition_totals = calculate_nutrition(ingredients)
-
-            recipe_id = str(uuid.uuid4())
-            recipe_doc = {
-                "Id": recipe_id,
-                "Name": recipe['name'],
-                "CookTime": recipe['cookTime'],
-                "PrepTime": recipe['prepTime'],
-                "TotalTime": parse_total_time(recipe['prepTime'], recipe['cookTime']),
-                "Images": [],
-                "ExpiryDate": recipe['expiryDate'],
-                "RecipeCategory": recipe['category'],
-                "Keywords": recipe['keywords'],
-                "RecipeIngredientQuantities": ingredient_quantities,
-                "RecipeIngredientParts": ingredient_parts,
-                "AggregatedRating": 0,
-                "ReviewCount": 0,
-                "Calories": nutrition_totals["Calories"],
-                "ProteinContent": nutrition_totals["ProteinContent"],
-                "CarbohydrateContent": nutrition_totals["CarbohydrateContent"],
-                "FatContent": nutrition_totals["FatContent"],
-                "SaturatedFatContent": nutrition_totals["SaturatedFatContent"],
-                "CholesterolContent": nutrition_totals["CholesterolContent"],
-                "SodiumContent": nutrition_totals["SodiumContent"],
-                "FiberContent": nutrition_totals["FiberContent"],
-                "SugarContent": nutrition_totals["SugarContent"],
-                "RecipeServings": recipe['servings'],
-                "RecipeYield": recipe['yield'],
-                "RecipeInstructions": recipe['instructions']
-            }
-
-            doc_ref = db.collection('recipes').document(recipe_id)
-            batch.set(doc_ref, recipe_doc)
-
-        batch.commit()
-        print(f"✅ Batch {batch_num + 1}/{total_batches} uploaded ({len(batch_recipes)} recipes).")
-
-    print("\n🎉 All recipes uploaded successfully!")
+        ingredients = []
+        for ing in recipe['ingredients']:
+            name = ing['name'].strip()
+            found = resolver.exact(name.lower())
+            ing_id, ing_data = found if found else add_ingredient(db, resolver, name)
+
+            ingredients.append({
+                'id': ing_id,
+                'name': name,
+                'weight': ing['weight'],
+                'row': table.row(ing_id, ing_data),
+            })
+        yield recipe, ingredients
+
+def build_recipe_docs(resolved, table):
+    """Yields (recipe id, recipe doc, ids of the ingredients it uses)"""
+    for chunk in chunked(resolved, BATCH_SIZE):
+        totals = table.totals([[(ing['row'], ing['weight']) for ing in ingredients]
+                               for _, ingredients in chunk])
+        for (recipe, ingredients), recipe_totals in zip(chunk, totals):
+            yield build_recipe_doc(recipe, ingredients, recipe_fields(recipe_totals))
+
+def recipe_doc_id(recipe):
+    """Document id from the normalized name and ingredient names, the same on every run"""
+    parts = sorted(normalize_name(ing['name']) for ing in recipe['ingredients'])
+    return content_id('recipe', normalize_name(recipe['name']), *parts)
+
+def build_recipe_doc(recipe, ingredients, nutrition_totals):
+    """(recipe id, recipe doc, ids of the ingredients it uses)"""
+    recipe_id = recipe_doc_id(recipe)
+    return recipe_id, {
+        "Id": recipe_id,
+        "Name": recipe['name'],
+        "CookTime": recipe['cookTime'],
+        "PrepTime": recipe['prepTime'],
+        "TotalTime": parse_total_time(recipe['prepTime'], recipe['cookTime']),
+        "Images": [],
+        "ExpiryDate": recipe['expiryDate'],
+        "RecipeCategory": recipe['category'],
+        "Keywords": recipe['keywords'],
+        "RecipeIngredientQuantities": [ing['weight'] for ing in ingredients],
+        "RecipeIngredientParts": [ing['name'] for ing in ingredients],
+        "AggregatedRating": 0,
+        "ReviewCount": 0,
+        **nutrition_totals,
+        SUMMED_FIELD: firestore.SERVER_TIMESTAMP,
+        "RecipeServings": recipe['servings'],
+        "RecipeYield": recipe['yield'],
+        "RecipeInstructions": recipe['instructions'],
+        UPDATED_FIELD: firestore.SERVER_TIMESTAMP,
+    }, [ing['id'] for ing in ingredients]
+
+def skip_duplicate(recipe):
+    print(f"Skipped duplicate recipe: {recipe['name']}")
+
+def upload_recipes(db, filepath, concurrency=CONCURRENCY, progress=True, dedup='name', resume=False,
+                   checkpoint_path=CHECKPOINT_FILE):
+    checkpoint = Checkpoint('upload_recipes_batch', file_fingerprint(filepath), resume, checkpoint_path)
+    if checkpoint.resumed:
+        print(f"Resuming: {len(checkpoint)} recipes already committed")
+    resolver = preload_existing_ingredients(db)
+    table = NutritionTable.from_resolver(resolver)
+    start = time.perf_counter()
+    existing_recipes = RecipeKeys.load(db, dedup)
+    print(f"Loaded {len(existing_recipes)} existing recipe keys in {time.perf_counter() - start:.1f}s")
+
+    recipes = stage(lambda path: (recipe for _, recipe in checkpoint.pending(read_recipes(path), recipe_doc_id)),
+                    filepath, name='parse')
+    recipes = stage(lambda items: existing_recipes.filter(items, skip_duplicate), recipes, name='dedup')
+    resolved = stage(lambda items: resolve_ingredients(db, items, resolver, table), recipes,
+                     name='resolve')
+    docs = stage(lambda items: build_recipe_docs(items, table), resolved, name='nutrition')
+
+    uploaded = 0
+    bar = tqdm(desc="Uploading documents", unit=" docs", disable=not progress)
+    try:
+        with BatchWriter(db, concurrency=concurrency, on_commit=bar.update) as writer:
+            for recipe_id, recipe_doc, ingredient_ids in docs:
+                # New ingredients go in this batch or an earlier one; wait for those still in flight
+                resolver.write_pending(writer)
+                future = writer.set(db.collection('recipes').document(recipe_id), recipe_doc,
+                                    after=resolver.after(ingredient_ids))
+                checkpoint.track(future, recipe_id)
+                uploaded += 1
+            resolver.write_pending(writer)
+    except BaseException:
+        # Some batches may have landed, so the cached keys no longer match Firestore
+        existing_recipes.invalidate()
+        checkpoint.close()
+        raise
+    finally:
+        bar.close()
+    existing_recipes.uploaded(uploaded)
+    existing_recipes.save()
+    checkpoint.close(finished=True)
+
+    print(f"\n🎉 {uploaded} recipes uploaded successfully!")
+    return uploaded
 
 
 if __name__ == "__main__":
-    upload_recipes("cleaned_recipes.json")
+    cred = credentials.Certificate('smartkitchen-sk-firebase-adminsdk-fbsvc-863c6d1b25.json')
+    firebase_admin.initialize_app(cred)
+    db = firestore.client()
+
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    concurrency = CONCURRENCY
+    dedup = 'name'
+    for arg in sys.argv[1:]:
+        if arg.startswith('--concurrency='):
+            concurrency = int(arg.split('=', 1)[1])
+        elif arg.startswith('--dedup='):
+            dedup = arg.split('=', 1)[1]
+    upload_recipes(db, args[0] if args else "cleaned_recipes.json", concurrency, dedup=dedup,
+                   resume=RESUME_FLAG in sys.argv)